@@ -0,0 +1,38 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts.
+
+With ML_WARMUP=True the application is loaded once in the master
+(preload_app), and `ml_stack.warm_up` imports the ML libraries of the served
+runtime and loads the MODEL_PRELOAD_SEQUENCE_LENGTHS models there before the
+workers are forked. Workers then start serving at once and share those pages
+copy-on-write instead of each importing torch and loading the models itself.
+As with any preloaded app, code changes need a restart rather than a HUP.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get("ML_WARMUP", "False") == "True"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from ml_app import ml_stack
+
+    for name, info in ml_stack.warm_up().items():
+        if info["loaded"]:
+            server.log.info("Warm-up: imported %s in %.2fs", name, info["seconds"])
+        else:
+            server.log.info("Warm-up: %s not available (%s)", name, info["error"])
+    # Keep the collector from touching (and so copying) the pages of everything loaded so far
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from ml_app import ml_stack
+
+    # Models the master could not share (CUDA, ONNX Runtime sessions); the others are already loaded
+    ml_stack.preload_models()
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class MlAppConfig(AppConfig):
+    name = 'ml_app'
+
+    def ready(self):
+        # Optionally load models at startup so the first request doesn't pay for it. With
+        # ML_WARMUP, gunicorn.conf.py does it once in the master instead, before forking
+        if not getattr(settings, "MODEL_PRELOAD_SEQUENCE_LENGTHS", []) or getattr(settings, "ML_WARMUP", False):
+            return
+
+        from .ml_stack import preload_models
+
+        preload_models()
@@ -0,0 +1,228 @@
+"""
+Rotating, multi-process safe JSONL audit logs.
+
+Detections and feedback are appended to `logs/*.jsonl` by several gunicorn
+workers at once. Every append here is one `os.write` on an `O_APPEND`
+descriptor, taken under an exclusive `flock` on a `.lock` file next to the
+log. That lock also serialises rotation. The active file is rotated when it
+would grow past `max_bytes`, or when its last write falls in an earlier
+`rotate_seconds` period. Rotated segments are named `<log>.<UTC timestamp>`
+(optionally gzipped), so sorting their names gives the order they were
+written in.
+
+In buffered mode, entries are collected in memory and written in batches of
+`buffer_size` (or every `flush_interval` seconds, and at exit). This trades
+a few seconds of durability for fewer syscalls and lock round-trips.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+_SEGMENT_RE = re.compile(r"^\d{8}-\d{12}(\.gz)?$")
+
+
+class AuditLog:
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_seconds=0, compress=True,
+                 backup_count=0, buffer_size=0, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flusher = None
+
+    # ----------------------------- writing ----------------------------- #
+    def append(self, payload):
+        line = json.dumps(payload, default=str) + "\n"
+        if self.buffer_size <= 1:
+            self._write(line.encode("utf-8"))
+            return
+
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.buffer_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self._write("".join(lines).encode("utf-8"))
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        rotated = None
+        with self._lock:
+            with self.locked():
+                rotated = self._maybe_rotate(len(data))
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view):]
+                finally:
+                    os.close(fd)
+        if rotated:
+            self._finish_rotation(rotated)
+
+    def locked(self):
+        """Context manager holding the cross-process lock; no rotation happens while held."""
+        return FileLock(self.path + ".lock")
+
+    def _maybe_rotate(self, incoming):
+        """Rename the active file to a segment if it is full or from an earlier period."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        if st.st_size == 0:
+            return None
+
+        too_big = self.max_bytes and st.st_size + incoming > self.max_bytes
+        stale = self.rotate_seconds and int(st.st_mtime // self.rotate_seconds) != int(time.time() // self.rotate_seconds)
+        if not (too_big or stale):
+            return None
+
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S%f")
+        segment = f"{self.path}.{stamp}"
+        os.rename(self.path, segment)
+        return segment
+
+    def _finish_rotation(self, segment):
+        if self.compress:
+            tmp_path = segment + ".gz.tmp"
+            with open(segment, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, segment + ".gz")
+            os.remove(segment)
+
+        if self.backup_count:
+            for old in self.segments()[:-self.backup_count]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    # ----------------------------- reading ----------------------------- #
+    def segments(self):
+        """Rotated segments, oldest first (the active file is not included)."""
+        directory, base = os.path.split(self.path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+
+        found = {}
+        for name in names:
+            if not name.startswith(base + "."):
+                continue
+            match = _SEGMENT_RE.match(name[len(base) + 1:])
+            if not match:
+                continue
+            stem = name[:-3] if match.group(1) else name
+            # While a segment is being compressed both files exist; the plain one is complete
+            if stem not in found or not match.group(1):
+                found[stem] = os.path.join(directory, name)
+        return [found[stem] for stem in sorted(found)]
+
+    @staticmethod
+    def segment_name(path):
+        """Name of a segment without its directory or `.gz` suffix, for ordering."""
+        name = os.path.basename(path)
+        return name[:-3] if name.endswith(".gz") else name
+
+    @staticmethod
+    def read_bytes(path, offset=0, limit=None):
+        """Raw bytes of a segment or the active file from `offset` on."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            f.seek(offset)
+            return f.read() if limit is None else f.read(limit)
+
+    def iter_records(self):
+        """Yield every entry of every segment and then the active file, in order."""
+        for path in self.segments() + [self.path]:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            pass
+            except OSError:
+                continue
+
+
+class FileLock:
+    """Exclusive advisory lock shared by all processes writing one log."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_audit_log(path):
+    """Return the process-wide writer for the audit log at `path`."""
+    log = _logs.get(path)
+    if log is None:
+        with _logs_lock:
+            log = _logs.get(path)
+            if log is None:
+                log = AuditLog(
+                    path,
+                    max_bytes=getattr(settings, "AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024),
+                    rotate_seconds=getattr(settings, "AUDIT_LOG_ROTATE_SECONDS", 0),
+                    compress=getattr(settings, "AUDIT_LOG_COMPRESS", True),
+                    backup_count=getattr(settings, "AUDIT_LOG_BACKUP_COUNT", 0),
+                    buffer_size=getattr(settings, "AUDIT_LOG_BUFFER_SIZE", 0),
+                    flush_interval=getattr(settings, "AUDIT_LOG_FLUSH_SECONDS", 1.0),
+                )
+                _logs[path] = log
+    return log
@@ -0,0 +1,188 @@
+"""
+Dynamic micro-batching of model forward passes across concurrent requests.
+
+Every analysis thread submits its clip tensor `(clips, seq, c, h, w)` to one
+scheduler per process instead of calling the model itself. The scheduler
+waits up to `INFERENCE_BATCH_WINDOW_MS` after the first pending request, or
+until `INFERENCE_MAX_BATCH_SIZE` clips for the same model and shape are
+waiting. It then runs one forward pass and returns each caller its own rows of
+logits. Queue wait times, batch sizes and throughput are recorded for
+monitoring.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from . import ml_stack
+
+
+# Upper bounds (ms) of the queue wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def run_model(model, batch, device):
+    """Plain forward pass returning the logits of a batch of clips."""
+    with ml_stack.get_torch().no_grad():
+        _, logits = model(batch.to(device))
+    return logits
+
+
+class _Request:
+    __slots__ = ("model", "batch", "key", "rows", "future", "enqueued_at")
+
+    def __init__(self, model, batch):
+        self.model = model
+        self.batch = batch
+        self.key = (id(model), tuple(batch.shape[1:]))
+        self.rows = batch.shape[0]
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class InferenceScheduler:
+    """Collects pending clip batches and runs them through the model together."""
+
+    def __init__(self, device, max_batch_size=8, window_ms=20):
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, window_ms / 1000.0)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._started_at = time.monotonic()
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.batch_size_histogram = {}
+        self.wait_histogram = {bound: 0 for bound in WAIT_BUCKETS_MS + (float("inf"),)}
+
+    def infer(self, model, batch):
+        """Block until the logits for `batch` are available and return them."""
+        request = _Request(model, batch)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="inference-scheduler", daemon=True)
+                self._thread.start()
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future.result()
+
+    def _next_group(self):
+        """Wait for the batching window of the oldest request and take its group."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            first = self._pending[0]
+            deadline = first.enqueued_at + self.window
+            while True:
+                rows = sum(r.rows for r in self._pending if r.key == first.key)
+                remaining = deadline - time.monotonic()
+                if rows >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            group, rows = [], 0
+            for request in self._pending:
+                if request.key != first.key:
+                    continue
+                if group and rows + request.rows > self.max_batch_size:
+                    break
+                group.append(request)
+                rows += request.rows
+            for request in group:
+                self._pending.remove(request)
+            return group
+
+    def _loop(self):
+        while True:
+            group = self._next_group()
+            started = time.monotonic()
+            try:
+                batch = group[0].batch if len(group) == 1 else ml_stack.get_torch().cat([r.batch for r in group])
+                logits = run_model(group[0].model, batch, self.device)
+            except Exception as e:
+                for request in group:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in group:
+                request.future.set_result(logits[offset:offset + request.rows])
+                offset += request.rows
+            self._record(group, started, time.monotonic())
+
+    def _record(self, group, started, finished):
+        rows = sum(r.rows for r in group)
+        with self._stats_lock:
+            self.requests += len(group)
+            self.batches += 1
+            self.rows += rows
+            self.busy_seconds += finished - started
+            self.batch_size_histogram[rows] = self.batch_size_histogram.get(rows, 0) + 1
+            for request in group:
+                wait = started - request.enqueued_at
+                self.wait_seconds_total += wait
+                self.wait_seconds_max = max(self.wait_seconds_max, wait)
+                for bound in self.wait_histogram:
+                    if wait * 1000 <= bound:
+                        self.wait_histogram[bound] += 1
+                        break
+
+    def stats(self):
+        with self._stats_lock:
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "rows": self.rows,
+                "pending": len(self._pending),
+                "avg_batch_size": round(self.rows / self.batches, 3) if self.batches else 0,
+                "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+                "avg_queue_wait_ms": round(1000 * self.wait_seconds_total / self.requests, 3) if self.requests else 0,
+                "max_queue_wait_ms": round(1000 * self.wait_seconds_max, 3),
+                "queue_wait_histogram_ms": {
+                    ("+Inf" if bound == float("inf") else str(bound)): count
+                    for bound, count in self.wait_histogram.items()
+                },
+                "rows_per_second": round(self.rows / elapsed, 3) if elapsed else 0,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(device):
+    """Return the scheduler shared by all analysis threads of this process."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = InferenceScheduler(
+                    device,
+                    max_batch_size=getattr(settings, "INFERENCE_MAX_BATCH_SIZE", 8),
+                    window_ms=getattr(settings, "INFERENCE_BATCH_WINDOW_MS", 20),
+                )
+    return _scheduler
+
+
+def scheduler_stats():
+    """Stats of this process's scheduler; empty ones, without importing torch, before the first forward pass."""
+    return (_scheduler or InferenceScheduler(None)).stats()
+
+
+def infer(model, batch, device):
+    """Return the logits of `batch`, micro-batched with other requests when enabled."""
+    if getattr(settings, "INFERENCE_BATCHING", False):
+        return get_scheduler(device).infer(model, batch)
+    return run_model(model, batch, device)
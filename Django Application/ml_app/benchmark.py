@@ -0,0 +1,410 @@
+"""
+End-to-end benchmark of the detection pipeline on synthetic videos.
+
+`manage.py benchmark_pipeline` writes deterministic clips with
+cv2.VideoWriter (a moving face-like figure on a textured background, from a
+seeded generator) for every combination of resolution, length and codec,
+and times each stage of the pipeline on them separately:
+
+* decode          - sampling `sequence_length` frames (frame_sampling)
+* face_detection  - detect_faces with the FACE_DETECTION_* settings
+* transform       - face crops -> model input (train_transforms, or the
+                    numpy preprocessing of the ONNX runtime)
+* forward         - one forward pass of the served model (a randomly
+                    initialised DeepfakeModel when no checkpoint is available)
+* heuristic       - demo_analysis.analyze, the demo-mode scoring
+* jpeg            - demo_analysis.render_images of the analysed frames
+* request         - upload + prediction page through Django's test client
+
+Stages whose dependency is missing are reported as skipped. Each stage runs
+`warmup` untimed and `repeats` timed times; the median is what is compared.
+The request stage runs synchronously, with the result cache off and uploads,
+logs and sessions kept out of the real project directory.
+
+The results are a JSON document. `compare` checks them against a stored
+baseline: a stage regresses when its median is more than `tolerance` slower
+and at least `min_delta_ms` slower (so that noise on fast stages doesn't fail
+the run).
+"""
+
+import contextlib
+import importlib.metadata
+import io
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+from . import demo_analysis, ml_stack, models, views
+from .batching import run_model
+from .checkpoints import get_catalog
+from .face_detection import crop_faces, detect_faces
+from .frame_sampling import sample_frames
+from .model_registry import get_registry
+from .preprocessing import FacePreprocessor
+
+cv2 = ml_stack.lazy_module("cv2")
+np = ml_stack.lazy_module("numpy")
+
+FORMAT_VERSION = 1
+STAGES = ("decode", "face_detection", "transform", "forward", "heuristic", "jpeg", "request")
+CODEC_EXTENSIONS = {"mp4v": ".mp4", "MJPG": ".avi", "XVID": ".avi", "VP80": ".webm"}
+DEFAULT_RESOLUTIONS = ((320, 240), (1280, 720))
+DEFAULT_LENGTHS = (60, 300)
+DEFAULT_CODECS = ("mp4v", "MJPG")
+FPS = 30
+
+
+class Skipped(Exception):
+    """A stage can't run in this environment (missing dependency or model)."""
+
+
+def clip_name(width, height, frames, codec):
+    return f"synthetic_{width}x{height}_{frames}f_{codec}{CODEC_EXTENSIONS[codec]}"
+
+
+def write_synthetic_clip(path, width, height, frames, codec, fps=FPS):
+    """
+    Write a deterministic clip: the same arguments always give the same frames.
+    Raises ValueError if this OpenCV build can't encode `codec`.
+    """
+    rng = np.random.default_rng(width * 100003 + height * 1009 + frames)
+    background = cv2.resize(rng.integers(40, 120, (9, 16, 3), dtype=np.uint8), (width, height),
+                            interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(0, 12, (8, height, width, 3), dtype=np.uint8)
+    face_h = max(8, height // 3)
+    face_w = max(6, face_h * 3 // 4)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+    if not writer.isOpened():
+        raise ValueError(f"OpenCV cannot write {codec} video")
+    try:
+        for i in range(frames):
+            frame = cv2.add(background, noise[i % len(noise)])
+            cx = width // 2 + int(width * 0.1 * np.sin(i / 15))
+            cy = height // 2 + int(height * 0.05 * np.cos(i / 20))
+            cv2.ellipse(frame, (cx, cy), (face_w // 2, face_h // 2), 0, 0, 360, (140, 170, 210), -1)
+            for dx in (-face_w // 5, face_w // 5):
+                cv2.circle(frame, (cx + dx, cy - face_h // 8), max(1, face_w // 14), (40, 30, 30), -1)
+            cv2.ellipse(frame, (cx, cy + face_h // 5), (face_w // 5, max(1, face_h // 16)), 0, 0, 180,
+                        (60, 60, 150), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def ensure_clips(directory, resolutions=DEFAULT_RESOLUTIONS, lengths=DEFAULT_LENGTHS, codecs=DEFAULT_CODECS):
+    """
+    Write the clips missing from `directory`. Returns `(clips, unsupported)`:
+    a list of clip dicts (name, path, width, height, frames, codec) and the
+    codecs this OpenCV build can't write.
+    """
+    os.makedirs(directory, exist_ok=True)
+    clips, unsupported = [], []
+    for codec in codecs:
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown codec {codec!r}; choose from {', '.join(CODEC_EXTENSIONS)}")
+        try:
+            for width, height in resolutions:
+                for frames in lengths:
+                    name = clip_name(width, height, frames, codec)
+                    path = os.path.join(directory, name)
+                    if not os.path.exists(path):
+                        tmp_path = os.path.join(directory, "tmp_" + name)
+                        write_synthetic_clip(tmp_path, width, height, frames, codec)
+                        os.replace(tmp_path, path)
+                    clips.append({"name": name, "path": path, "width": width, "height": height,
+                                  "frames": frames, "codec": codec})
+        except ValueError:
+            unsupported.append(codec)
+    return clips, unsupported
+
+
+def _stats(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        "runs": len(ms),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "min_ms": round(min(ms), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def time_stage(fn, repeats=3, warmup=1):
+    """Run `fn` `warmup` + `repeats` times; returns `(stats, last result)`."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return _stats(samples), result
+
+
+class Pipeline:
+    """The served runtime's model and transform, loaded once for all clips."""
+
+    def __init__(self, sequence_length):
+        self.sequence_length = sequence_length
+        self.runtime = views.model_runtime()
+        self.model = None
+        self.model_name = None
+        if self.runtime == "demo":
+            return
+        self.preprocess = FacePreprocessor(sequence_length, backend="numpy" if self.runtime == "onnx" else "torch")
+        entry = get_catalog().best_for(sequence_length, self.runtime)
+        if entry is not None:
+            self.model = get_registry(self.runtime).get(entry["path"], ml_stack.get_device())
+            self.model_name = entry["filename"]
+        elif self.runtime == "torch":
+            # No checkpoint: same architecture with random weights, which costs the same to run
+            self.model = models.DeepfakeModel(num_classes=2, pretrained=False).to(ml_stack.get_device()).eval()
+            self.model_name = "random-init"
+
+    def transform(self, faces):
+        return self.preprocess(faces)[None]
+
+    def forward(self, clip):
+        if self.model is None:
+            raise Skipped(f"no {self.runtime} model")
+        if self.runtime == "torch":
+            # Straight through the model: the micro-batching window would only add waiting time
+            return run_model(self.model, clip, ml_stack.get_device())
+        return self.model(clip)
+
+
+def _detection_settings():
+    return {
+        "scale": settings.FACE_DETECTION_SCALE,
+        "batch_size": settings.FACE_DETECTION_BATCH_SIZE,
+        "stride": settings.FACE_DETECTION_STRIDE,
+        "model": settings.FACE_DETECTION_MODEL,
+    }
+
+
+@contextlib.contextmanager
+def _sandbox():
+    """Settings for the request stage: synchronous, uncached and away from the real uploads, logs and DB."""
+    from django.test.utils import override_settings
+
+    directory = tempfile.mkdtemp(prefix="benchmark_")
+    overrides = override_settings(
+        PROJECT_DIR=directory,
+        UPLOAD_INDEX_PATH=os.path.join(directory, "logs", "uploads.sqlite3"),
+        JOB_DB_PATH=os.path.join(directory, "logs", "jobs.sqlite3"),
+        DEMO_ARTIFACTS_DIR=os.path.join(directory, "cache", "demo"),
+        ANALYSIS_ASYNC=False,
+        RESULT_CACHE_ENABLED=False,
+        SESSION_ENGINE="django.contrib.sessions.backends.cache",
+        ALLOWED_HOSTS=["*"],
+    )
+    try:
+        os.makedirs(os.path.join(directory, "uploaded_videos"))
+        with overrides:
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _request(client, path, sequence_length):
+    """Upload a video and load the prediction page; returns the verdict in the session."""
+    with open(path, "rb") as f:
+        response = client.post("/", {"upload_video_file": f, "sequence_length": sequence_length})
+    if response.status_code != 302:
+        raise RuntimeError(f"upload returned {response.status_code}")
+    response = client.get("/predict/")
+    if response.status_code != 200:
+        raise RuntimeError(f"predict page returned {response.status_code}")
+    return client.session.get("last_result")
+
+
+def benchmark_clip(clip, pipeline, stages=STAGES, repeats=3, warmup=1, client=None):
+    """Time the `stages` on one clip; returns a dict of stage -> stats (or {"skipped": reason})."""
+    seq_len = pipeline.sequence_length
+    results = {}
+    frames = boxes = tensor = analysis = None
+
+    def record(stage, fn):
+        if stage not in stages:
+            return None
+        try:
+            stats, result = time_stage(fn, repeats, warmup)
+        except Skipped as e:
+            results[stage] = {"skipped": str(e)}
+            return None
+        results[stage] = stats
+        return result
+
+    def decode():
+        decoded = []
+        for _, frame in sample_frames(clip["path"], seq_len, settings.FRAME_SAMPLING_STRATEGY):
+            decoded.append(frame)
+            if len(decoded) == seq_len:
+                break
+        return decoded
+
+    def detect():
+        if ml_stack.get_face_recognition() is None:
+            raise Skipped("face_recognition is not installed")
+        return detect_faces(frames, **_detection_settings())
+
+    def transform():
+        if pipeline.runtime == "demo":
+            raise Skipped("demo mode has no model input")
+        return pipeline.transform(crop_faces(frames, boxes))
+
+    def forward():
+        if tensor is None:
+            raise Skipped("no model input")
+        return pipeline.forward(tensor)
+
+    def heuristic():
+        return demo_analysis.analyze(clip["path"], 6, settings.DEMO_FRAME_SAMPLING_STRATEGY,
+                                     settings.DEMO_ANALYSIS_WIDTH, keep_frames=True)
+
+    def jpeg():
+        return demo_analysis.render_images(analysis["frames"])
+
+    def request():
+        if client is None:
+            raise Skipped("no test client")
+        if pipeline.runtime != "demo" and pipeline.model_name in (None, "random-init"):
+            raise Skipped(f"no servable model for sequence length {seq_len}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            return _request(client, clip["path"], seq_len)
+
+    frames = record("decode", decode)
+    if frames is None:
+        frames = decode()
+    boxes = record("face_detection", detect)
+    if boxes is None:
+        boxes = [None] * len(frames)
+    tensor = record("transform", transform)
+    if tensor is None and "forward" in stages and pipeline.runtime != "demo":
+        tensor = transform()
+    record("forward", forward)
+    analysis = record("heuristic", heuristic)
+    if analysis is None and "jpeg" in stages:
+        analysis = heuristic()
+    record("jpeg", jpeg)
+    verdict = record("request", request)
+    if verdict:
+        results["request"]["verdict"] = verdict.get("verdict")
+        results["request"]["mode"] = verdict.get("mode")
+    return results
+
+
+def _version(package):
+    # From the package metadata, so reporting a version does not import the library
+    if not ml_stack.installed(package):
+        return None
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def environment(pipeline):
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "torch": _version("torch"),
+        "onnxruntime": _version("onnxruntime"),
+        "face_recognition": ml_stack.installed("face_recognition"),
+        "runtime": pipeline.runtime,
+        "model": pipeline.model_name,
+    }
+
+
+def run(clips, sequence_length=20, stages=STAGES, repeats=3, warmup=1, log=None):
+    """Benchmark every clip; returns the results document."""
+    pipeline = Pipeline(sequence_length)
+    document = {
+        "version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "environment": environment(pipeline),
+        "config": {
+            "sequence_length": sequence_length,
+            "repeats": repeats,
+            "warmup": warmup,
+            "stages": list(stages),
+            "frame_sampling": settings.FRAME_SAMPLING_STRATEGY,
+            "face_detection": _detection_settings(),
+            "demo_analysis_width": settings.DEMO_ANALYSIS_WIDTH,
+        },
+        "clips": {},
+    }
+
+    client = None
+    with contextlib.ExitStack() as stack:
+        if "request" in stages:
+            from django.test import Client
+
+            stack.enter_context(_sandbox())
+            client = Client()
+        for i, clip in enumerate(clips, 1):
+            started = time.perf_counter()
+            results = benchmark_clip(clip, pipeline, stages, repeats, warmup, client)
+            document["clips"][clip["name"]] = dict(
+                {key: clip[key] for key in ("width", "height", "frames", "codec")}, stages=results)
+            if log:
+                log(f"[{i}/{len(clips)}] {clip['name']} ({time.perf_counter() - started:.1f}s)")
+    return document
+
+
+def compare(current, baseline, tolerance=0.25, min_delta_ms=5.0):
+    """
+    Compare stage medians with a baseline document. Returns a list of rows
+    `{clip, stage, baseline_ms, current_ms, ratio, regression}` for every stage
+    timed in both.
+    """
+    rows = []
+    for name, clip in current["clips"].items():
+        before = baseline.get("clips", {}).get(name)
+        if before is None:
+            continue
+        for stage, stats in clip["stages"].items():
+            old = before["stages"].get(stage, {})
+            if "median_ms" not in stats or "median_ms" not in old:
+                continue
+            ratio = stats["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+            rows.append({
+                "clip": name,
+                "stage": stage,
+                "baseline_ms": old["median_ms"],
+                "current_ms": stats["median_ms"],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + tolerance and stats["median_ms"] - old["median_ms"] >= min_delta_ms,
+            })
+    return rows
+
+
+def environment_differences(current, baseline):
+    """Environment keys that differ from the baseline, which make timings less comparable."""
+    now, then = current.get("environment", {}), baseline.get("environment", {})
+    return {key: (then.get(key), now.get(key)) for key in now if then.get(key) != now.get(key)}
+
+
+def summary(document):
+    """One line per clip and stage, for the console."""
+    width = max((len(name) for name in document["clips"]), default=10)
+    lines = []
+    for name, clip in document["clips"].items():
+        cells = []
+        for stage in STAGES:
+            stats = clip["stages"].get(stage)
+            if stats is None:
+                continue
+            cells.append(f"{stage} {stats['median_ms']:.1f}ms" if "median_ms" in stats else f"{stage} -")
+        lines.append(f"{name:<{width}}  " + ", ".join(cells))
+    return lines
@@ -0,0 +1,287 @@
+"""
+Indexed catalog of the model checkpoints available for serving.
+
+Checkpoints are named `model_<acc>_acc_<seq>_frames_<name>.pt`. Instead of
+re-listing the models directory and parsing every filename on each request,
+the catalog keeps a JSON index (`catalog.json` next to the checkpoints) with
+sha256, size, accuracy, sequence length and tensor metadata per file, and a
+sequence length -> best checkpoint map for O(1) lookups. Only new or changed
+files are re-hashed when the directory changes. Expected hashes from
+`sync_models.py`'s `model_manifest.json` are checked when available; a file
+whose hash does not match the manifest is never served, and neither is a
+`.pt` file that is not a state dict of tensors (e.g. a pickled model or saved
+validation clips): it is indexed with its error, the rest of the catalog is
+unaffected.
+
+ONNX exports (`<checkpoint>.onnx`, written by `manage.py export_onnx`) are
+indexed too, with the runtime "onnx" instead of "torch". An export is only
+served while its `.onnx.json` sidecar records a passed parity check and, if
+the source checkpoint is still present, the hash of that same checkpoint.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import ml_stack
+
+
+CATALOG_FILENAME = "catalog.json"
+CATALOG_VERSION = 2
+
+# Runtime that serves each kind of model file
+RUNTIMES = {".pt": "torch", ".onnx": "onnx"}
+
+
+def parse_checkpoint_name(filename):
+    """Return (accuracy, sequence_length) parsed from a checkpoint filename, or None."""
+    parts = os.path.splitext(os.path.basename(filename))[0].split("_")
+    try:
+        return float(parts[1]), int(parts[3])
+    except (IndexError, ValueError):
+        return None
+
+
+def compute_sha256(path):
+    hash_obj = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def read_tensor_metadata(path):
+    """
+    Summarise the tensors stored in a checkpoint, or None if torch is unavailable
+    or the file is not a state dict (a dict of tensors).
+    """
+    torch = ml_stack.get_torch()
+    if torch is None:
+        return None
+    try:
+        state = torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+    except Exception:
+        try:
+            state = torch.load(path, map_location="cpu", weights_only=True)
+        except Exception:
+            return None
+    if not isinstance(state, dict) or not all(isinstance(t, torch.Tensor) for t in state.values()):
+        return None
+
+    dtypes = sorted({str(t.dtype).replace("torch.", "") for t in state.values()})
+    metadata = {
+        "tensors": len(state),
+        "parameters": int(sum(t.numel() for t in state.values())),
+        "dtypes": dtypes,
+    }
+    hidden = state.get("lstm.weight_hh_l0")
+    if hidden is not None:
+        metadata["lstm_hidden_dim"] = int(hidden.shape[1])
+    linear = state.get("linear1.weight")
+    if linear is not None:
+        metadata["num_classes"] = int(linear.shape[0])
+    return metadata
+
+
+def read_export_metadata(path):
+    """The sidecar the ONNX exporter writes next to `path`, or None."""
+    try:
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_manifest_hashes(manifest_path):
+    """Map checkpoint filename -> expected sha256 from a sync_models manifest."""
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("models", [])
+    except (OSError, ValueError):
+        return {}
+    hashes = {}
+    for entry in entries:
+        filename = (entry.get("filename") or "").strip()
+        expected = (entry.get("sha256") or "").strip().lower()
+        if filename and expected:
+            hashes[filename] = expected
+    return hashes
+
+
+class CheckpointCatalog:
+    """JSON-backed index of the checkpoints in a models directory."""
+
+    def __init__(self, models_dir, manifest_path=None, refresh_interval=60):
+        self.models_dir = models_dir
+        self.manifest_path = manifest_path
+        self.refresh_interval = refresh_interval
+        self.index_path = os.path.join(models_dir, CATALOG_FILENAME)
+        self._entries = {}
+        self._best = {}
+        self._dir_stamp = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CATALOG_VERSION:
+            return
+        self._entries = data.get("checkpoints", {})
+        self._rebuild_best()
+
+    def _save_index(self):
+        data = {"version": CATALOG_VERSION, "checkpoints": self._entries}
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # A read-only models directory still works, it just isn't persisted
+            pass
+
+    def _rebuild_best(self):
+        best = {runtime: {} for runtime in RUNTIMES.values()}
+        for filename, entry in self._entries.items():
+            if not entry.get("servable"):
+                continue
+            seq = entry["sequence_length"]
+            current = best[entry["runtime"]].get(seq)
+            if current is None or (entry["accuracy"], filename) > (current["accuracy"], current["filename"]):
+                best[entry["runtime"]][seq] = entry
+        self._best = best
+
+    def _scan(self):
+        expected_hashes = load_manifest_hashes(self.manifest_path)
+        entries = {}
+        changed = False
+
+        for filename in os.listdir(self.models_dir):
+            runtime = RUNTIMES.get(os.path.splitext(filename)[1])
+            if runtime is None:
+                continue
+            path = os.path.join(self.models_dir, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            entry = self._entries.get(filename)
+            if entry is None or entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size:
+                parsed = parse_checkpoint_name(filename)
+                entry = {
+                    "filename": filename,
+                    "runtime": runtime,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "sha256": None,
+                    "accuracy": parsed[0] if parsed else None,
+                    "sequence_length": parsed[1] if parsed else None,
+                    "tensors": None,
+                    "error": None,
+                }
+                try:
+                    entry["sha256"] = compute_sha256(path)
+                    if runtime == "torch":
+                        entry["tensors"] = read_tensor_metadata(path)
+                        if entry["tensors"] is None and ml_stack.get_torch() is not None:
+                            entry["error"] = "Not a state dict of tensors"
+                except Exception as e:
+                    # A file that cannot be indexed is left unservable instead of failing the whole scan
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                changed = True
+            else:
+                entry = dict(entry)
+
+            expected = expected_hashes.get(filename)
+            entry["manifest_sha256"] = expected
+            entry["servable"] = (
+                entry["sequence_length"] is not None
+                and not entry.get("error")
+                and (expected is None or expected == entry["sha256"])
+            )
+            entries[filename] = entry
+
+        # The sidecar is small and may be rewritten without the export changing, so it is read on every scan
+        for entry in entries.values():
+            if entry["runtime"] != "onnx":
+                continue
+            export = read_export_metadata(os.path.join(self.models_dir, entry["filename"])) or {}
+            source = entries.get(export.get("source"))
+            entry["source_sha256"] = export.get("source_sha256")
+            entry["parity"] = export.get("parity")
+            entry["servable"] = (
+                entry["servable"]
+                and bool(export.get("parity", {}).get("passed"))
+                and (source is None or source["sha256"] == export.get("source_sha256"))
+            )
+
+        if changed or entries != self._entries:
+            self._entries = entries
+            self._rebuild_best()
+            self._save_index()
+
+    def refresh(self, force=False):
+        """Re-index the directory if it changed or the refresh interval elapsed."""
+        try:
+            dir_stamp = os.stat(self.models_dir).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._entries, self._best, self._dir_stamp = {}, {}, None
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if (not force and dir_stamp == self._dir_stamp
+                    and now - self._last_refresh < self.refresh_interval):
+                return
+            self._scan()
+            # Saving the index touches the directory, so take the stamp afterwards
+            try:
+                self._dir_stamp = os.stat(self.models_dir).st_mtime_ns
+            except OSError:
+                self._dir_stamp = dir_stamp
+            self._last_refresh = now
+
+    def best_for(self, sequence_length, runtime="torch"):
+        """Return the catalog entry of the most accurate model for a sequence length and runtime."""
+        self.refresh()
+        entry = self._best.get(runtime, {}).get(sequence_length)
+        return dict(entry, path=os.path.join(self.models_dir, entry["filename"])) if entry else None
+
+    def servable_sequence_lengths(self, runtime="torch"):
+        self.refresh()
+        return sorted(self._best.get(runtime, {}))
+
+    def entries(self):
+        self.refresh()
+        return [dict(entry) for entry in self._entries.values()]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the catalog for `settings.MODELS_DIR`, shared by the whole process."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CheckpointCatalog(
+                    settings.MODELS_DIR,
+                    manifest_path=getattr(settings, "MODEL_MANIFEST_PATH", None),
+                    refresh_interval=getattr(settings, "CHECKPOINT_CATALOG_REFRESH_SECONDS", 60),
+                )
+    return _catalog
@@ -0,0 +1,162 @@
+"""
+Multi-clip inference for long videos.
+
+Scoring only the first `sequence_length` frames judges a five minute upload on
+its first two seconds. Here the video is split into `num_clips` windows of
+`sequence_length` consecutive frames spread over its whole duration. The
+windows are decoded in one forward pass and scored by DeepfakeModel in
+batches of `batch_size` clips. Their logits are then combined into a single
+verdict, and a per-clip timeline is kept. Only the clips of the batch being
+built are held in memory, so memory use does not grow with video length.
+
+Scoring is pluggable (`score_batch`), so the same code serves the torch model
+and the ONNX Runtime session (onnx_backend.py); the aggregation is numpy.
+"""
+
+from . import metrics, ml_stack
+from .batching import infer
+from .face_detection import crop_faces, detect_faces
+from .frame_sampling import read_frames_at
+
+cv2 = ml_stack.lazy_module("cv2")
+np = ml_stack.lazy_module("numpy")
+
+
+AGGREGATIONS = ("mean", "max", "attention")
+
+# Label index of the FAKE class in the model output (REAL is 1)
+FAKE = 0
+
+
+def clip_starts(total_frames, sequence_length, num_clips):
+    """First frame of each clip, spread evenly so the last clip ends at the last frame."""
+    last_start = max(0, total_frames - sequence_length)
+    if num_clips <= 1 or last_start == 0:
+        return [0]
+    num_clips = min(num_clips, last_start + 1)
+    return [round(i * last_start / (num_clips - 1)) for i in range(num_clips)]
+
+
+def iter_clips(path, sequence_length, num_clips, seek_threshold=None):
+    """Yield `(start_frame, frames, fps)` for each clip, reading the video once."""
+    cap = cv2.VideoCapture(path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        starts = clip_starts(total_frames, sequence_length, num_clips)
+        indices = sorted({i for start in starts for i in range(start, start + sequence_length)})
+
+        # Clips may overlap on short videos, so a frame can belong to several of them
+        pending = list(starts)
+        active = {}
+        for idx, frame in read_frames_at(cap, indices, seek_threshold):
+            while pending and pending[0] <= idx:
+                active[pending.pop(0)] = []
+            for start in list(active):
+                active[start].append(frame)
+                if len(active[start]) == sequence_length:
+                    yield start, active.pop(start), fps
+
+        # The video ended early (frame count was wrong); score what was read
+        for start, frames in active.items():
+            if frames:
+                yield start, frames, fps
+    finally:
+        cap.release()
+
+
+def softmax(x, axis=-1):
+    x = np.asarray(x, dtype=np.float64)
+    e = np.exp(x - x.max(axis=axis, keepdims=True))
+    return e / e.sum(axis=axis, keepdims=True)
+
+
+def aggregate(logits, method="mean"):
+    """Combine per-clip logits of shape (clips, classes) into video-level probabilities."""
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown clip aggregation: {method!r}")
+
+    logits = np.asarray(logits, dtype=np.float64)
+    probs = softmax(logits, axis=1)
+    if method == "mean":
+        return softmax(logits.mean(axis=0))
+    if method == "max":
+        # A single clearly manipulated clip is enough to call the video fake
+        return probs[int(np.argmax(probs[:, FAKE]))]
+    # Attention: clips with a confident prediction weigh more than ambiguous ones
+    margin = np.abs(logits[:, 0] - logits[:, 1])
+    weights = softmax(margin)
+    return softmax((weights[:, None] * logits).sum(axis=0))
+
+
+def torch_scorer(model, device):
+    """`score_batch` for a torch model: runs the batch through the batching scheduler."""
+    def score_batch(batch):
+        return infer(model, batch, device).float().cpu().numpy()
+    return score_batch
+
+
+def predict_clips(model, path, sequence_length, preprocess, device, num_clips=4, batch_size=4,
+                  aggregation="mean", detection=None, seek_threshold=None, score_batch=None):
+    """
+    Score `num_clips` clips of a video and return the aggregated verdict:
+    `{"label", "confidence", "clips": [...]}` with one timeline entry per clip.
+    `preprocess` is a preprocessing.FacePreprocessor for the model's input
+    type; each clip is written straight into one batch buffer reused for every
+    batch. `score_batch` maps that `(clips, sequence_length, 3, h, w)` batch
+    to a `(clips, classes)` array of logits; by default `model` is a torch
+    model on `device`.
+    """
+    score_batch = score_batch or torch_scorer(model, device)
+
+    detection = detection or {}
+    timeline = []
+    clip_logits = []
+    batch = preprocess.empty(batch_size, sequence_length)
+    batch_meta = []
+
+    def run_batch():
+        with metrics.stage("forward"):
+            logits = np.asarray(score_batch(batch[:len(batch_meta)]), dtype=np.float64)
+        probs = softmax(logits, axis=1)
+        for (start, length, fps), row, p in zip(batch_meta, logits, probs):
+            label = int(np.argmax(p))
+            timeline.append({
+                "start_frame": start,
+                "end_frame": start + length - 1,
+                "start_time": round(start / fps, 2) if fps else None,
+                "end_time": round((start + length) / fps, 2) if fps else None,
+                "verdict": "REAL" if label == 1 else "FAKE",
+                "confidence": round(float(p[label]) * 100, 2),
+            })
+            clip_logits.append(row)
+        batch_meta.clear()
+
+    windows = iter_clips(path, sequence_length, num_clips, seek_threshold)
+    while True:
+        with metrics.stage("decode"):
+            item = next(windows, None)
+        if item is None:
+            break
+        start, frames, fps = item
+        with metrics.stage("face_detection"):
+            boxes = detect_faces(frames, **detection)
+        with metrics.stage("transform"):
+            # A short final clip is padded by repeating its last frame so it can share the batch
+            preprocess(crop_faces(frames, boxes), length=sequence_length, out=batch[len(batch_meta)])
+        batch_meta.append((start, len(frames), fps))
+        if len(batch_meta) == batch_size:
+            run_batch()
+    if batch_meta:
+        run_batch()
+
+    if not clip_logits:
+        raise ValueError("No frames could be read from the video")
+
+    probs = aggregate(np.stack(clip_logits), aggregation)
+    label = int(np.argmax(probs))
+    return {
+        "label": label,
+        "confidence": float(probs[label] * 100),
+        "clips": timeline,
+    }
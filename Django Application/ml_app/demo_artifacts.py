@@ -0,0 +1,265 @@
+"""
+Per-analysis storage of the demo mode preview images.
+
+Every analysis used to write `demo_frame_XX.jpg` / `demo_face_XX.jpg` into the
+shared `static/images/demo` directory, so concurrent requests overwrote each
+other's images. Here the images of an analysis live under a key derived from
+the uploaded video's content hash and the sampling settings:
+
+    <DEMO_ARTIFACTS_DIR>/<key>.json     spec: video path, frame indices, image names
+    <DEMO_ARTIFACTS_DIR>/<key>/*.jpg    the encoded images (disk mode only)
+
+A new directory is filled under a temporary name and renamed into place, so
+readers never see a partial set. A re-upload of the same video finds the
+existing set and skips decoding and encoding the frames. With
+`DEMO_ARTIFACTS_PERSIST=False` the JPEGs are only kept in a per-process LRU
+in memory. A worker that doesn't hold them re-renders them from the spec on
+first access. Entries expire after `ttl_seconds`, and the least recently
+used ones are dropped once the store grows past `max_bytes`.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import demo_analysis
+from .result_cache import make_key
+
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_NAME_RE = re.compile(r"^demo_(frame|face)_\d{2}\.jpg$")
+
+
+def artifact_key(video_hash, strategy, num_frames):
+    return make_key("demo-artifacts", video_hash, strategy, num_frames)
+
+
+def is_valid(key, name=None):
+    return bool(_KEY_RE.match(key)) and (name is None or bool(_NAME_RE.match(name)))
+
+
+class DemoArtifactStore:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, ttl_seconds=7 * 24 * 3600, persist=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._size = None
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def _spec_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _image_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _read_spec(self, key):
+        try:
+            with open(self._spec_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key):
+        """Return the image names stored under `key`, or None if they have to be rendered."""
+        spec = self._read_spec(key)
+        if spec is None:
+            return None
+        if self.ttl_seconds and time.time() - spec.get("created", 0) > self.ttl_seconds:
+            self._remove(key)
+            return None
+
+        if self.persist:
+            image_dir = self._image_dir(key)
+            if not all(os.path.exists(os.path.join(image_dir, name)) for name in spec["names"]):
+                return None
+        elif key not in self._memory:
+            return None
+        self._touch(key)
+        return spec["names"]
+
+    def put(self, key, images, video_path, frame_indices):
+        """Store `[(name, jpeg_bytes), ...]` rendered from `frame_indices` of `video_path`."""
+        os.makedirs(self.directory, exist_ok=True)
+        names = [name for name, _ in images]
+        size = sum(len(data) for _, data in images)
+
+        if self.persist:
+            tmp_dir = f"{self._image_dir(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            for name, data in images:
+                with open(os.path.join(tmp_dir, name), "wb") as f:
+                    f.write(data)
+            try:
+                os.rename(tmp_dir, self._image_dir(key))
+            except OSError:
+                # Another request published the same content first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            self._remember(key, dict(images))
+
+        spec = {
+            "created": time.time(),
+            "video_path": video_path,
+            "frame_indices": list(frame_indices),
+            "names": names,
+            "bytes": size,
+        }
+        tmp_path = f"{self._spec_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(spec, f)
+            os.replace(tmp_path, self._spec_path(key))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if self.persist:
+                self._size = self._disk_usage() if self._size is None else self._size + size
+            if (self.persist and self._size > self.max_bytes) or time.time() - self._last_cleanup > 3600:
+                self.cleanup()
+        return names
+
+    def open(self, key, name):
+        """
+        Return `(path, data)` for one image: a file path in disk mode, the bytes
+        in memory mode. Images missing here are re-rendered from the spec.
+        Returns None if neither works.
+        """
+        if self.persist:
+            path = os.path.join(self._image_dir(key), name)
+            if os.path.exists(path):
+                return path, None
+        else:
+            with self._lock:
+                images = self._memory.get(key)
+                if images is not None:
+                    self._memory.move_to_end(key)
+            if images is not None and name in images:
+                return None, images[name]
+
+        spec = self._read_spec(key)
+        if spec is None or name not in spec["names"] or not os.path.exists(spec["video_path"]):
+            return None
+        images = demo_analysis.render_images(demo_analysis.read_frames(spec["video_path"], spec["frame_indices"]))
+        self.put(key, images, spec["video_path"], spec["frame_indices"])
+        data = dict(images).get(name)
+        return (None, data) if data is not None else None
+
+    def _remember(self, key, images):
+        size = sum(len(data) for data in images.values())
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= sum(len(data) for data in old.values())
+            self._memory[key] = images
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_bytes -= sum(len(data) for data in dropped.values())
+
+    def _touch(self, key):
+        # Specs are touched on use so eviction drops the least recently used first
+        try:
+            os.utime(self._spec_path(key))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+
+    def _remove(self, key):
+        shutil.rmtree(self._image_dir(key), ignore_errors=True)
+        try:
+            os.remove(self._spec_path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            key, ext = os.path.splitext(name)
+            if ext != ".json" or not is_valid(key):
+                continue
+            try:
+                mtime = os.stat(self._spec_path(key)).st_mtime
+            except OSError:
+                continue
+            size = 0
+            image_dir = self._image_dir(key)
+            if os.path.isdir(image_dir):
+                for image in os.listdir(image_dir):
+                    try:
+                        size += os.path.getsize(os.path.join(image_dir, image))
+                    except OSError:
+                        pass
+            entries.append((mtime, size, key))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def cleanup(self):
+        """Drop expired entries, then the least recently used until under `max_bytes`."""
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, key in entries:
+            expired = self.ttl_seconds and now - mtime > self.ttl_seconds
+            if not expired and total <= self.max_bytes:
+                continue
+            self._remove(key)
+            total -= size
+
+        # Half-written image directories and specs left behind by a crashed worker
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if not name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) <= 3600:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+        self._size = total
+        self._last_cleanup = now
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_demo_artifacts():
+    """Return the process-wide demo artifact store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DemoArtifactStore(
+                    settings.DEMO_ARTIFACTS_DIR,
+                    max_bytes=settings.DEMO_ARTIFACTS_MAX_BYTES,
+                    ttl_seconds=settings.DEMO_ARTIFACTS_TTL_SECONDS,
+                    persist=settings.DEMO_ARTIFACTS_PERSIST,
+                )
+    return _store
@@ -0,0 +1,194 @@
+"""
+Running statistics over the detections audit log.
+
+Re-reading every line of `logs/detections.jsonl` on each dashboard visit gets
+slower as the log grows. Instead, running aggregates (totals, verdict counts,
+confidence sum, per-mode, per-model and per-day breakdowns) are kept together
+with the byte offset of the log they cover. Each refresh only parses the
+lines appended since that offset. The aggregates are checkpointed next to the
+log, so a restarted process resumes from the checkpoint instead of rescanning
+the whole file.
+
+The log is rotated by `audit_log.AuditLog`. The checkpoint records the newest
+rotated segment already folded in. When newer segments appear, the first of
+them is the file that was being tailed, so it is read from the saved offset
+and any later ones are read in full before the new active file.
+"""
+
+import json
+import os
+import threading
+
+from django.conf import settings
+
+from .audit_log import AuditLog, get_audit_log
+
+
+HIGH_CONFIDENCE = 80
+CHECKPOINT_VERSION = 2
+
+
+def _empty_aggregates():
+    return {
+        "total": 0,
+        "real": 0,
+        "fake": 0,
+        "confidence_sum": 0.0,
+        "confidence_count": 0,
+        "high_confidence_count": 0,
+        "by_mode": {},
+        "by_model": {},
+        "by_day": {},
+    }
+
+
+def _bump(buckets, key, verdict):
+    bucket = buckets.setdefault(key, {"total": 0, "real": 0, "fake": 0})
+    bucket["total"] += 1
+    bucket["real" if verdict == "REAL" else "fake"] += 1
+
+
+class DetectionStats:
+    """Aggregates over a JSONL detection log, refreshed by tailing new lines."""
+
+    def __init__(self, log_path, checkpoint_path=None):
+        self.log_path = log_path
+        self.checkpoint_path = checkpoint_path or log_path + ".stats.json"
+        self.log = get_audit_log(log_path)
+        self._lock = threading.Lock()
+        self._reset()
+        self._load_checkpoint()
+
+    def _reset(self):
+        self.offset = 0
+        self.last_segment = ""
+        self.aggregates = _empty_aggregates()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CHECKPOINT_VERSION:
+            return
+        self.offset = data["offset"]
+        self.last_segment = data["last_segment"]
+        self.aggregates = data["aggregates"]
+
+    def _save_checkpoint(self):
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "offset": self.offset,
+            "last_segment": self.last_segment,
+            "aggregates": self.aggregates,
+        }
+        tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.checkpoint_path)
+        except OSError:
+            pass
+
+    def add(self, entry):
+        """Fold one detection entry into the aggregates."""
+        agg = self.aggregates
+        verdict = entry.get("verdict")
+        agg["total"] += 1
+        agg["real" if verdict == "REAL" else "fake"] += 1
+        _bump(agg["by_mode"], entry.get("mode") or "unknown", verdict)
+        if entry.get("model_path"):
+            _bump(agg["by_model"], entry["model_path"], verdict)
+        day = str(entry.get("timestamp") or "")[:10]
+        if day:
+            _bump(agg["by_day"], day, verdict)
+
+        try:
+            conf = float(entry.get("confidence", 0))
+        except (TypeError, ValueError):
+            return
+        agg["confidence_sum"] += conf
+        agg["confidence_count"] += 1
+        if conf >= HIGH_CONFIDENCE:
+            agg["high_confidence_count"] += 1
+
+    def _fold(self, data):
+        """Fold the complete lines of `data` in and return how many bytes they span."""
+        # Leave a partially written last line for the next refresh
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self.add(json.loads(line))
+            except (ValueError, AttributeError):
+                pass
+        return end
+
+    def refresh(self):
+        """Fold in lines appended to the log since the last refresh."""
+        with self._lock, self.log.locked():
+            self._refresh()
+
+    def _refresh(self):
+        changed = False
+        try:
+            segments = [p for p in self.log.segments() if AuditLog.segment_name(p) > self.last_segment]
+            for i, path in enumerate(segments):
+                # The first new segment is the file we were tailing; it was complete when rotated
+                self._fold(AuditLog.read_bytes(path, self.offset if i == 0 else 0))
+                self.last_segment = AuditLog.segment_name(path)
+                self.offset = 0
+                changed = True
+        except OSError:
+            # A segment was being compressed or removed under us; retry on the next refresh
+            return
+
+        try:
+            size = os.path.getsize(self.log_path)
+        except OSError:
+            size = 0
+
+        # The log was truncated or replaced by hand: start over from all segments
+        if size < self.offset:
+            self._reset()
+            self._save_checkpoint()
+            return self._refresh()
+
+        if size > self.offset:
+            end = self._fold(AuditLog.read_bytes(self.log_path, self.offset, size - self.offset))
+            if end:
+                self.offset += end
+                changed = True
+        if changed:
+            self._save_checkpoint()
+
+    def snapshot(self):
+        """Dashboard statistics, including per-mode, per-model and per-day breakdowns."""
+        self.refresh()
+        with self._lock:
+            agg = self.aggregates
+            count = agg["confidence_count"]
+            return {
+                "total": agg["total"],
+                "real": agg["real"],
+                "fake": agg["fake"],
+                "avg_confidence": round(agg["confidence_sum"] / count, 1) if count else 0,
+                "high_confidence_count": agg["high_confidence_count"],
+                "by_mode": dict(agg["by_mode"]),
+                "by_model": dict(agg["by_model"]),
+                "by_day": dict(sorted(agg["by_day"].items())),
+            }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_detection_stats():
+    """Return the process-wide statistics for `logs/detections.jsonl`."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = DetectionStats(os.path.join(settings.PROJECT_DIR, "logs", "detections.jsonl"))
+    return _stats
@@ -0,0 +1,109 @@
+"""
+Batched face detection for the serving dataset.
+
+Running `face_recognition.face_locations` on every full-resolution frame
+dominates inference time. Here frames are downscaled before detection, boxes
+are mapped back to full resolution, and detection can run only on every
+`stride`-th frame with the boxes of the frames in between interpolated from
+their neighbours. With the `cnn` detector, frames are sent through
+`face_recognition.batch_face_locations` in groups of `batch_size`, like
+`create_face_videos` does in the preprocessing notebook; the `hog` detector
+has no batched API and is called per frame.
+"""
+
+from . import ml_stack
+
+cv2 = ml_stack.lazy_module("cv2")
+
+
+def _keyframe_indices(num_frames, stride):
+    indices = list(range(0, num_frames, stride))
+    # Always detect on the last frame so the tail can be interpolated too
+    if indices and indices[-1] != num_frames - 1:
+        indices.append(num_frames - 1)
+    return indices
+
+
+def _locate(small_frames, model, batch_size):
+    face_recognition = ml_stack.get_face_recognition()
+    if model == "cnn":
+        locations = []
+        for i in range(0, len(small_frames), batch_size):
+            locations.extend(face_recognition.batch_face_locations(
+                small_frames[i:i + batch_size], batch_size=batch_size
+            ))
+        return locations
+    return [face_recognition.face_locations(frame, model=model) for frame in small_frames]
+
+
+def _scale_box(box, scale, height, width):
+    top, right, bottom, left = box
+    return (
+        max(0, int(round(top / scale))),
+        min(width, int(round(right / scale))),
+        min(height, int(round(bottom / scale))),
+        max(0, int(round(left / scale))),
+    )
+
+
+def _interpolate(box_a, box_b, t):
+    return tuple(int(round(a + (b - a) * t)) for a, b in zip(box_a, box_b))
+
+
+def boxes_between(prev_box, next_box, gap):
+    """
+    Boxes of the `gap - 1` frames between two keyframes `gap` frames apart:
+    interpolated, or the box of whichever keyframe has one.
+    """
+    if prev_box is not None and next_box is not None:
+        return [_interpolate(prev_box, next_box, k / gap) for k in range(1, gap)]
+    return [prev_box if prev_box is not None else next_box] * (gap - 1)
+
+
+def locate_faces(frames, scale=1.0, batch_size=8, model="hog"):
+    """Search every frame; one full-resolution face box or None per frame."""
+    if scale != 1.0:
+        small_frames = [cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                        for frame in frames]
+    else:
+        small_frames = frames
+    boxes = []
+    for frame, faces in zip(frames, _locate(small_frames, model, batch_size)):
+        height, width = frame.shape[:2]
+        boxes.append(_scale_box(faces[0], scale, height, width) if faces else None)
+    return boxes
+
+
+def detect_faces(frames, scale=1.0, batch_size=8, stride=1, model="hog"):
+    """
+    Return one face box `(top, right, bottom, left)` per frame, in full-resolution
+    coordinates, or None for frames where no face was found.
+    """
+    if not frames or ml_stack.get_face_recognition() is None:
+        return [None] * len(frames)
+
+    stride = max(1, int(stride))
+    batch_size = max(1, int(batch_size))
+    keyframes = _keyframe_indices(len(frames), stride)
+
+    boxes = [None] * len(frames)
+    for idx, box in zip(keyframes, locate_faces([frames[i] for i in keyframes], scale, batch_size, model)):
+        boxes[idx] = box
+
+    if stride == 1:
+        return boxes
+
+    for prev_idx, next_idx in zip(keyframes, keyframes[1:]):
+        boxes[prev_idx + 1:next_idx] = boxes_between(boxes[prev_idx], boxes[next_idx], next_idx - prev_idx)
+    return boxes
+
+
+def crop_faces(frames, boxes):
+    """Crop each frame to its face box; frames without a face are kept whole."""
+    crops = []
+    for frame, box in zip(frames, boxes):
+        if box is not None:
+            top, right, bottom, left = box
+            frame = frame[top:bottom, left:right, :]
+        crops.append(frame)
+    return crops
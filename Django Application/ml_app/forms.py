@@ -0,0 +1,22 @@
+from django import forms
+
+class VideoUploadForm(forms.Form):
+
+    upload_video_file = forms.FileField(label="Select Video", required=True,widget=forms.FileInput(attrs={"accept": "video/*"}))
+    sequence_length = forms.IntegerField(label="Sequence Length", required=True)
+
+    def __init__(self, *args, sequence_lengths=None, **kwargs):
+        # Sequence lengths that have a trained checkpoint; None accepts any positive value
+        self.sequence_lengths = sequence_lengths
+        super().__init__(*args, **kwargs)
+
+    def clean_sequence_length(self):
+        seq_len = self.cleaned_data['sequence_length']
+        if seq_len <= 0:
+            raise forms.ValidationError("Sequence length must be > 0")
+        if self.sequence_lengths is not None and seq_len not in self.sequence_lengths:
+            supported = ", ".join(str(s) for s in self.sequence_lengths) or "none"
+            raise forms.ValidationError(
+                f"No model is available for sequence length {seq_len} (supported: {supported})"
+            )
+        return seq_len
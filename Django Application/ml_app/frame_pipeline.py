@@ -0,0 +1,295 @@
+"""
+Streaming decode -> face detection -> assembly of the frames of one clip.
+
+Decoding the sampled frames, searching them for faces and cropping and
+resizing the faces used to run one after the other on the request thread,
+with the CPU mostly idle while cv2 decoded. cv2 releases the GIL while it
+decodes and resizes, so `collect_faces` overlaps the steps:
+
+    decoder thread  ->  face detection workers  ->  assembler
+    (one frame at a       (frames in any order;       (calling thread; frame
+     time, read ahead)     `cnn` takes batches)        order restored)
+
+* the decoder reads the sampled frames and queues them for detection;
+* each worker takes the next waiting frame (with the `cnn` model, up to
+  `batch_size` waiting frames at once) and searches it for a face;
+* the assembler puts the results back in frame order, fills in the boxes of
+  the frames between two searched keyframes, crops each frame and hands the
+  face to `on_face` (which resizes it into the preprocessing buffer), after
+  which the full frame is dropped.
+
+The boxes are those `face_detection.detect_faces` finds on the same frames:
+with FACE_DETECTION_STRIDE, every `stride`-th frame and the last one are
+searched and the others interpolated. A frame without a face is kept whole,
+so each frame gives one face and decoding stops once `count` faces are
+assembled, or as soon as any stage fails.
+
+Back-pressure: at most `max_in_flight` frames are decoded but not yet
+assembled; the decoder waits for a free slot before it reads the next frame.
+This bounds the queue, the reorder buffer and so the memory held per clip,
+whatever the resolution of the video. The time the decoder waits is reported
+as back-pressure.
+
+Each run measures the busy time of the stages; busy time / (run time x
+threads) is a stage's utilisation. The numbers go to the metrics
+(`deepfake_pipeline_*`, and the decode / face_detection stage timings) and to
+`stats()`, shown at `/inference/stats/`. A decoder with low and workers with
+high utilisation means more workers would help. FACE_PIPELINE_WORKERS is 0 by
+default, which runs the steps one after the other on the calling thread: the
+workers only overlap if the face detector releases the GIL while it runs.
+"""
+
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics, ml_stack
+from .face_detection import boxes_between, crop_faces, detect_faces, locate_faces
+
+
+STAGES = ("decode", "face_detection", "assemble")
+
+# How often a waiting decoder checks whether the run was stopped
+POLL_SECONDS = 0.1
+
+_END = object()
+
+_lock = threading.Lock()
+_totals = {"runs": 0, "frames": 0, "seconds": 0.0, "backpressure_seconds": 0.0}
+_stages = {stage: {"busy": 0.0, "capacity": 0.0} for stage in STAGES}
+
+
+class _Failed:
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+class FacePipeline:
+    """Runs decode, face detection and assembly of a clip's frames concurrently; see the module docstring."""
+
+    def __init__(self, workers=2, max_in_flight=16, scale=1.0, batch_size=8, stride=1, model="hog"):
+        self.workers = max(1, int(workers))
+        self.stride = max(1, int(stride))
+        # hog has no batched API; cnn searches the frames already waiting together
+        self.batch_size = max(1, int(batch_size)) if model == "cnn" else 1
+        # The frames between two keyframes stay in flight until the second one is searched
+        self.max_in_flight = max(int(max_in_flight), self.stride + 1)
+        self.scale = scale
+        self.model = model
+
+    def run(self, frames, count, on_face):
+        """
+        Decode up to `count` frames from the iterable `frames`, call
+        `on_face(i, face)` with each cropped face in frame order and return the
+        number of faces. `frames` is consumed (and closed) on the decoder thread.
+        """
+        detect = ml_stack.get_face_recognition() is not None
+        slots = threading.Semaphore(self.max_in_flight)
+        stop = threading.Event()
+        work = queue.SimpleQueue()
+        done = queue.SimpleQueue()
+        busy = {stage: 0.0 for stage in STAGES}
+        waited = [0.0]
+        busy_lock = threading.Lock()
+
+        def decoder():
+            iterator = iter(frames)
+            pending = None
+            read = 0
+            try:
+                while read < count:
+                    started = time.perf_counter()
+                    while not slots.acquire(timeout=POLL_SECONDS):
+                        if stop.is_set():
+                            return
+                    waited[0] += time.perf_counter() - started
+                    if stop.is_set():
+                        return
+                    started = time.perf_counter()
+                    frame = next(iterator, None)
+                    busy["decode"] += time.perf_counter() - started
+                    if frame is None:
+                        slots.release()
+                        break
+                    # One frame of read-ahead tells whether the pending frame is the last one
+                    if pending is not None:
+                        work.put((read - 1, pending, (read - 1) % self.stride == 0))
+                    pending = frame
+                    read += 1
+                if pending is not None:
+                    # The last frame is always searched, so the boxes of the tail can be filled in
+                    work.put((read - 1, pending, True))
+            except Exception as e:
+                stop.set()
+                done.put(_Failed(e))
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+                for _ in range(self.workers):
+                    work.put(_END)
+
+        def worker():
+            spent = 0.0
+            try:
+                while True:
+                    item = work.get()
+                    if item is _END:
+                        break
+                    batch = [item]
+                    while len(batch) < self.batch_size:
+                        try:
+                            item = work.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is _END:
+                            work.put(_END)
+                            break
+                        batch.append(item)
+                    if stop.is_set():
+                        continue
+                    searched = [(index, frame) for index, frame, keyframe in batch if keyframe]
+                    started = time.perf_counter()
+                    try:
+                        if detect and searched:
+                            boxes = locate_faces([frame for _, frame in searched], self.scale,
+                                                 self.batch_size, self.model)
+                        else:
+                            boxes = [None] * len(searched)
+                    except Exception as e:
+                        stop.set()
+                        done.put(_Failed(e))
+                        continue
+                    spent += time.perf_counter() - started
+                    found = {index: box for (index, _), box in zip(searched, boxes)}
+                    for index, frame, keyframe in batch:
+                        done.put((index, frame, keyframe, found.get(index)))
+            finally:
+                with busy_lock:
+                    busy["face_detection"] += spent
+                done.put(_END)
+
+        threads = [threading.Thread(target=decoder, name="face-pipeline-decode", daemon=True)]
+        threads += [threading.Thread(target=worker, name=f"face-pipeline-detect-{i}", daemon=True)
+                    for i in range(self.workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        emitted = 0
+        reorder = {}
+        held = []
+        prev_box = None
+        next_index = 0
+        finished = 0
+
+        def emit(frame, box):
+            nonlocal emitted
+            on_face(emitted, crop_faces([frame], [box])[0])
+            emitted += 1
+            slots.release()
+
+        try:
+            while emitted < count and finished < self.workers:
+                item = done.get()
+                if item is _END:
+                    finished += 1
+                    continue
+                if isinstance(item, _Failed):
+                    raise item.error
+                assembling = time.perf_counter()
+                index, frame, keyframe, box = item
+                reorder[index] = (frame, keyframe, box)
+                while next_index in reorder and emitted < count:
+                    frame, keyframe, box = reorder.pop(next_index)
+                    next_index += 1
+                    if not keyframe:
+                        held.append(frame)
+                        continue
+                    for held_frame, held_box in zip(held, boxes_between(prev_box, box, len(held) + 1)):
+                        emit(held_frame, held_box)
+                    held.clear()
+                    emit(frame, box)
+                    prev_box = box
+                busy["assemble"] += time.perf_counter() - assembling
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        _record(time.perf_counter() - started, emitted, busy, {"decode": 1, "face_detection": self.workers,
+                                                               "assemble": 1}, waited[0])
+        return emitted
+
+
+def _record(seconds, frames, busy, threads, backpressure):
+    metrics.record_stage("decode", busy["decode"])
+    metrics.record_stage("face_detection", busy["face_detection"])
+    metrics.inc("deepfake_pipeline_backpressure_seconds_total", backpressure)
+    for stage in STAGES:
+        metrics.inc("deepfake_pipeline_busy_seconds_total", busy[stage], stage=stage)
+        metrics.inc("deepfake_pipeline_capacity_seconds_total", seconds * threads[stage], stage=stage)
+    with _lock:
+        _totals["runs"] += 1
+        _totals["frames"] += frames
+        _totals["seconds"] += seconds
+        _totals["backpressure_seconds"] += backpressure
+        for stage in STAGES:
+            _stages[stage]["busy"] += busy[stage]
+            _stages[stage]["capacity"] += seconds * threads[stage]
+
+
+def stats():
+    """Frame pipeline runs of this process: frames, time, back-pressure and per stage utilisation."""
+    with _lock:
+        runs = _totals["runs"]
+        return {
+            "workers": getattr(settings, "FACE_PIPELINE_WORKERS", 0),
+            "runs": runs,
+            "frames": _totals["frames"],
+            "avg_run_ms": round(1000 * _totals["seconds"] / runs, 3) if runs else 0,
+            "backpressure_seconds": round(_totals["backpressure_seconds"], 3),
+            "stages": {
+                stage: {
+                    "busy_seconds": round(totals["busy"], 3),
+                    "utilization": round(totals["busy"] / totals["capacity"], 3) if totals["capacity"] else 0,
+                }
+                for stage, totals in _stages.items()
+            },
+        }
+
+
+def collect_faces(frames, count, on_face, detection=None, workers=None, max_in_flight=None):
+    """
+    Call `on_face(i, face)` with the cropped faces of the first `count` frames
+    of the iterable `frames`, in order, and return how many there were.
+    `detection` holds the `detect_faces` options (scale, batch_size, stride,
+    model). `workers` and `max_in_flight` default to FACE_PIPELINE_WORKERS and
+    FACE_PIPELINE_MAX_FRAMES; with 0 workers the steps run one after the other.
+    """
+    detection = detection or {}
+    if workers is None:
+        workers = getattr(settings, "FACE_PIPELINE_WORKERS", 0)
+    if max_in_flight is None:
+        max_in_flight = getattr(settings, "FACE_PIPELINE_MAX_FRAMES", 16)
+
+    if workers > 0:
+        found = FacePipeline(workers, max_in_flight, **detection).run(frames, count, on_face)
+    else:
+        raw_frames = []
+        with metrics.stage("decode"):
+            for frame in frames:
+                raw_frames.append(frame)
+                if len(raw_frames) == count:
+                    break
+        with metrics.stage("face_detection"):
+            boxes = detect_faces(raw_frames, **detection)
+        for i, face in enumerate(crop_faces(raw_frames, boxes)):
+            on_face(i, face)
+        found = len(raw_frames)
+    if not found:
+        raise ValueError("No frames could be read from the video")
+    return found
@@ -0,0 +1,76 @@
+"""
+Frame sampling strategies shared by the model and demo analysis paths.
+
+All strategies read the container in a single forward pass. Frames that are
+not wanted are skipped with `VideoCapture.grab()`, which demuxes and decodes
+but skips the colour conversion and copy done by `read()`, instead of a
+`CAP_PROP_POS_FRAMES` seek per sample:
+
+* ``first``    - the first N consecutive frames (what the model was trained on)
+* ``stride``   - every `step`-th frame from the start
+* ``uniform``  - N frames spread evenly over the whole video
+* ``keyframe`` - like ``uniform``, but gaps longer than `seek_threshold`
+  frames are crossed with a seek, which jumps to the nearest keyframe and
+  decodes forward from there; short gaps are still grab()-skipped
+"""
+
+from . import ml_stack
+
+cv2 = ml_stack.lazy_module("cv2")
+
+
+STRATEGIES = ("first", "stride", "uniform", "keyframe")
+
+# Gaps shorter than this are cheaper to grab() through than to seek over. A seek costs
+# about 10-20 grabs (more grabs at low resolution, fewer at 720p and above)
+DEFAULT_SEEK_THRESHOLD = 30
+
+
+def sample_indices(total_frames, num_frames, strategy="first", step=1):
+    """Return the sorted frame indices a strategy picks from a video of `total_frames` frames."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown frame sampling strategy: {strategy!r}")
+
+    # Some containers don't report a frame count; fall back to reading from the start
+    if total_frames <= 0:
+        if strategy == "stride":
+            return list(range(0, num_frames * step, step))
+        return list(range(num_frames))
+
+    if strategy == "first":
+        return list(range(min(num_frames, total_frames)))
+    if strategy == "stride":
+        step = max(1, int(step))
+        return list(range(0, min(num_frames * step, total_frames), step))
+
+    interval = max(1, total_frames // num_frames)
+    return [k * interval for k in range(num_frames) if k * interval < total_frames]
+
+
+def read_frames_at(cap, indices, seek_threshold=None):
+    """Yield `(index, frame)` for the given sorted indices from an open capture."""
+    pos = 0
+    for idx in indices:
+        if seek_threshold is not None and idx - pos > seek_threshold:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            pos = idx
+        while pos < idx:
+            if not cap.grab():
+                return
+            pos += 1
+        success, frame = cap.read()
+        if not success:
+            return
+        pos += 1
+        yield idx, frame
+
+
+def sample_frames(path, num_frames, strategy="first", step=1, seek_threshold=DEFAULT_SEEK_THRESHOLD):
+    """Yield `(index, frame)` pairs for up to `num_frames` frames of the video at `path`."""
+    cap = cv2.VideoCapture(path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        indices = sample_indices(total_frames, num_frames, strategy, step)
+        yield from read_frames_at(cap, indices, seek_threshold if strategy == "keyframe" else None)
+    finally:
+        cap.release()
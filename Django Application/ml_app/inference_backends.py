@@ -0,0 +1,282 @@
+"""
+Optimised inference backends for the served DeepfakeModel.
+
+A backend is "eager" (the plain fp32 model) or a `+`-joined combination of:
+
+* trace          - torch.jit.trace + freeze of the whole model
+* script         - torch.jit.script + freeze (instead of trace)
+* channels_last  - NHWC memory format for the ResNeXt convolutions
+* bf16           - bfloat16 autocast on CPU (not combinable with trace/script)
+* int8           - dynamic int8 quantisation of the LSTM and Linear layers
+
+e.g. `INFERENCE_BACKEND=channels_last+int8+trace`. A checkpoint can get its
+own backend with `INFERENCE_BACKEND_OVERRIDES`.
+
+Before a converted model is served it is compared with the eager model on a
+fixed clip set: `validation_clips_<seq>.pt` in `INFERENCE_VALIDATION_DIR`
+(written by `manage.py compile_inference_backend --videos ...`), or seeded
+random clips when there is none. If the largest difference of the softmax
+probabilities exceeds `INFERENCE_BACKEND_MAX_DELTA`, or a predicted label
+changes, the eager model is served instead.
+
+The outcome is stored next to the checkpoint as `<checkpoint>.<backend>.json`.
+For trace/script backends the frozen graph is stored too, as
+`<checkpoint>.<backend>.ts`. Later starts load that directly, without building
+the eager model, converting or validating again. Both files are tied to the
+checkpoint's mtime and size, the torch version and the allowed delta.
+"""
+
+import copy
+import json
+import os
+import time
+
+from django.conf import settings
+
+from .audit_log import FileLock
+from .checkpoints import parse_checkpoint_name
+from .deepfake_model import DeepfakeModel
+
+try:
+    import torch
+    from torch import nn
+except Exception:
+    torch = None
+    nn = None
+
+
+OPTIONS = ("channels_last", "int8", "bf16", "trace", "script")
+GRAPH_OPTIONS = ("trace", "script")
+CPU_ONLY_OPTIONS = ("int8", "bf16")
+VALIDATION_CLIP_COUNT = 4
+
+
+def parse_backend(name):
+    """Normalise a backend name to a tuple of options in canonical order; () is eager."""
+    parts = {part.strip().lower() for part in (name or "").replace(",", "+").split("+") if part.strip()}
+    parts.discard("eager")
+    unknown = parts - set(OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown inference backend option(s): {', '.join(sorted(unknown))}")
+    if {"trace", "script"} <= parts:
+        raise ValueError("Choose either 'trace' or 'script', not both")
+    if "bf16" in parts and parts & set(GRAPH_OPTIONS):
+        raise ValueError("bf16 autocast cannot be combined with trace/script")
+    return tuple(option for option in OPTIONS if option in parts)
+
+
+def backend_name(options):
+    return "+".join(options) if options else "eager"
+
+
+def backend_for(model_path):
+    """The backend configured for a checkpoint: its override, else INFERENCE_BACKEND."""
+    overrides = getattr(settings, "INFERENCE_BACKEND_OVERRIDES", {})
+    return overrides.get(os.path.basename(model_path), getattr(settings, "INFERENCE_BACKEND", "eager"))
+
+
+def _artifact_paths(model_path, options):
+    base = f"{model_path}.{backend_name(options).replace('+', '-')}"
+    return base + ".ts", base + ".json"
+
+
+def load_eager(model_path, device):
+    """Build a DeepfakeModel from a checkpoint file and put it in eval mode."""
+    model = DeepfakeModel(num_classes=2, pretrained=False)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+class _Autocast(nn.Module if nn is not None else object):
+    """Runs the wrapped model under bfloat16 autocast and returns fp32 outputs."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            fmap, logits = self.model(x)
+        return fmap.float(), logits.float()
+
+
+def _lstm_with_bias(lstm):
+    """
+    An equivalent LSTM with zero biases. DeepfakeModel passes `bidirectional`
+    positionally into LSTM's `bias` slot, so the served LSTM has no biases,
+    and dynamic quantisation only handles LSTMs that have them.
+    """
+    replacement = nn.LSTM(lstm.input_size, lstm.hidden_size, lstm.num_layers, bias=True,
+                          batch_first=lstm.batch_first, bidirectional=lstm.bidirectional)
+    state = replacement.state_dict()
+    for name, value in lstm.state_dict().items():
+        state[name] = value
+    for name in state:
+        if name.startswith("bias_"):
+            state[name] = torch.zeros_like(state[name])
+    replacement.load_state_dict(state)
+    return replacement.to(next(lstm.parameters()).device).eval()
+
+
+def convert(model, options, example):
+    """Apply the backend `options` to a copy of the eager `model`; `example` is used for tracing."""
+    model = copy.deepcopy(model)
+    if "channels_last" in options:
+        model = model.to(memory_format=torch.channels_last)
+    if "int8" in options:
+        if not model.lstm.bias:
+            model.lstm = _lstm_with_bias(model.lstm)
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    if "bf16" in options:
+        model = _Autocast(model).eval()
+    if "trace" in options or "script" in options:
+        with torch.no_grad():
+            if "trace" in options:
+                graph = torch.jit.trace(model, example, check_trace=False)
+            else:
+                graph = torch.jit.script(model)
+        model = torch.jit.freeze(graph.eval())
+    return model
+
+
+def validation_clips(sequence_length, device):
+    """
+    The fixed clip set the backends are checked on: validation_clips_<seq>.pt
+    if it exists, else seeded random clips. Returns `(clips, synthetic)`.
+    """
+    directory = (getattr(settings, "INFERENCE_VALIDATION_DIR", None)
+                 or os.path.join(settings.PROJECT_DIR, "cache", "validation"))
+    path = os.path.join(directory, f"validation_clips_{sequence_length}.pt")
+    if os.path.exists(path):
+        return torch.load(path, map_location=device, weights_only=True), False
+    generator = torch.Generator().manual_seed(0)
+    clips = torch.randn((VALIDATION_CLIP_COUNT, sequence_length, 3, 112, 112), generator=generator)
+    return clips.to(device), True
+
+
+def compare(reference, candidate, clips):
+    """Largest softmax probability difference and label agreement of two models on `clips`."""
+    with torch.no_grad():
+        expected = torch.softmax(reference(clips)[1].float(), dim=1)
+        actual = torch.softmax(candidate(clips)[1].float(), dim=1)
+    return {
+        "max_delta": float((expected - actual).abs().max()),
+        "agreement": float((expected.argmax(1) == actual.argmax(1)).float().mean()),
+    }
+
+
+def _timed_forward(model, clips):
+    with torch.no_grad():
+        model(clips[:1])  # warm-up; the first call of a frozen graph also optimises it
+        started = time.perf_counter()
+        model(clips)
+    return round(time.perf_counter() - started, 4)
+
+
+def compile_backend(model_path, device, options, max_delta=None, eager=None):
+    """
+    Convert and validate a checkpoint for `options`, then write the sidecar
+    (and the graph artifact for trace/script). Returns `(model, info)`; the
+    model is the converted one if it passed the check, else the eager one.
+    """
+    max_delta = getattr(settings, "INFERENCE_BACKEND_MAX_DELTA", 0.02) if max_delta is None else max_delta
+    artifact_path, meta_path = _artifact_paths(model_path, options)
+    st = os.stat(model_path)
+    eager = eager if eager is not None else load_eager(model_path, device)
+
+    parsed = parse_checkpoint_name(model_path)
+    sequence_length = parsed[1] if parsed else 20
+    clips, synthetic = validation_clips(sequence_length, device)
+
+    started = time.perf_counter()
+    converted = convert(eager, options, clips[:1])
+    convert_seconds = time.perf_counter() - started
+    result = compare(eager, converted, clips)
+    accepted = result["max_delta"] <= max_delta and result["agreement"] == 1.0
+
+    info = dict(
+        result,
+        checkpoint_mtime_ns=st.st_mtime_ns,
+        checkpoint_size=st.st_size,
+        torch_version=torch.__version__,
+        backend=backend_name(options),
+        accepted=accepted,
+        max_allowed_delta=max_delta,
+        validation_clips=int(clips.shape[0]),
+        synthetic_clips=synthetic,
+        convert_seconds=round(convert_seconds, 3),
+        eager_seconds=_timed_forward(eager, clips),
+        backend_seconds=_timed_forward(converted, clips) if accepted else None,
+        compiled_at=time.time(),
+    )
+    try:
+        if accepted and set(options) & set(GRAPH_OPTIONS):
+            tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+            torch.jit.save(converted, tmp_path)
+            os.replace(tmp_path, artifact_path)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, meta_path)
+    except OSError as e:
+        # A read-only models directory still works, the conversion just isn't kept
+        print(f"Could not store the {info['backend']} artifact of {model_path}: {e}")
+    return (converted if accepted else eager), info
+
+
+def _read_meta(meta_path, model_path, options):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        st = os.stat(model_path)
+    except (OSError, ValueError):
+        return None
+    if (meta.get("checkpoint_mtime_ns") != st.st_mtime_ns or meta.get("checkpoint_size") != st.st_size
+            or meta.get("torch_version") != torch.__version__ or meta.get("backend") != backend_name(options)
+            or meta.get("max_allowed_delta") != getattr(settings, "INFERENCE_BACKEND_MAX_DELTA", 0.02)):
+        return None
+    return meta
+
+
+def load_model(model_path, device, backend=None):
+    """
+    Return `(model, info)` for a checkpoint with its configured backend,
+    reusing the stored artifact and validation result when they are current.
+    `info["active"]` is the backend actually served.
+    """
+    if torch is None:
+        raise RuntimeError("Cannot load a model: 'torch' is not installed.")
+    requested = backend_for(model_path) if backend is None else backend
+    options = parse_backend(requested)
+    if device.type != "cpu" and set(options) & set(CPU_ONLY_OPTIONS):
+        print(f"Inference backend {backend_name(options)} is CPU only; serving {model_path} eagerly on {device}")
+        options = ()
+    if not options:
+        return load_eager(model_path, device), {"requested": requested, "active": "eager"}
+
+    artifact_path, meta_path = _artifact_paths(model_path, options)
+    graph = bool(set(options) & set(GRAPH_OPTIONS))
+    # Workers starting together compile a checkpoint once; the others wait and load the result
+    with FileLock(meta_path + ".lock"):
+        meta = _read_meta(meta_path, model_path, options)
+        if meta is not None and meta["accepted"] and graph and os.path.exists(artifact_path):
+            model = torch.jit.load(artifact_path, map_location=device).eval()
+            return model, dict(meta, requested=requested, active=meta["backend"], from_artifact=True)
+        if meta is not None and not meta["accepted"]:
+            print(f"Inference backend {meta['backend']} was rejected for {model_path} "
+                  f"(max delta {meta['max_delta']:.4f}); serving it eagerly")
+            return load_eager(model_path, device), dict(meta, requested=requested, active="eager")
+        if meta is not None and not graph:
+            # Validated before; the conversion itself is cheap
+            eager = load_eager(model_path, device)
+            model = convert(eager, options, None)
+            return model, dict(meta, requested=requested, active=meta["backend"], from_artifact=False)
+
+        model, info = compile_backend(model_path, device, options)
+    if not info["accepted"]:
+        print(f"Inference backend {info['backend']} changed the outputs of {model_path} by up to "
+              f"{info['max_delta']:.4f} (agreement {info['agreement']:.0%}); serving it eagerly")
+    return model, dict(info, requested=requested, active=info["backend"] if info["accepted"] else "eager",
+                       from_artifact=False)
@@ -0,0 +1,269 @@
+"""
+Background analysis jobs backed by a local SQLite table.
+
+Uploads are recorded as `queued` rows and processed by a small pool of worker
+threads inside each web process, so the upload request returns immediately
+and the browser polls the job status instead of holding a gunicorn worker for
+the whole analysis. No broker is needed: every process that starts a pool
+claims queued rows from the same table with an immediate transaction, so a
+job enqueued by one gunicorn worker may be run by another.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the number of queued jobs reaches JOB_QUEUE_MAX_DEPTH."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    video_path TEXT NOT NULL,
+    sequence_length INTEGER NOT NULL,
+    video_hash TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection to the job database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        db_path = settings.JOB_DB_PATH
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "video_hash" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN video_hash TEXT")
+        _local.conn = conn
+    return conn
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def enqueue(video_path, sequence_length, video_hash=None):
+    """Add an analysis job and return its id."""
+    conn = _connect()
+    max_depth = getattr(settings, "JOB_QUEUE_MAX_DEPTH", 0)
+    job_id = uuid.uuid4().hex
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if max_depth:
+            depth = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if depth >= max_depth:
+                raise QueueFullError(f"Analysis queue is full ({depth} jobs waiting)")
+        conn.execute(
+            "INSERT INTO jobs (id, status, video_path, sequence_length, video_hash, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, video_path, int(sequence_length), video_hash, time.time()),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return job_id
+
+
+def get_job(job_id):
+    row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def queue_position(job):
+    """Number of queued jobs ahead of `job` (0 when it is next or already running)."""
+    if job["status"] != QUEUED:
+        return 0
+    return _connect().execute(
+        "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+    ).fetchone()[0]
+
+
+def active_video_paths():
+    """Videos of queued and running jobs, which must stay on disk."""
+    rows = _connect().execute("SELECT video_path FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING))
+    return [row["video_path"] for row in rows]
+
+
+def queue_stats():
+    """Queue depth and timing figures for monitoring."""
+    conn = _connect()
+    counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+    for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+        counts[row["status"]] = row["n"]
+
+    oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+    timing = conn.execute(
+        "SELECT AVG(started_at - created_at), AVG(finished_at - started_at) FROM jobs "
+        "WHERE status = ? AND finished_at > ?",
+        (DONE, time.time() - 3600),
+    ).fetchone()
+    return {
+        "counts": counts,
+        "queue_depth": counts[QUEUED],
+        "max_queue_depth": getattr(settings, "JOB_QUEUE_MAX_DEPTH", 0),
+        "oldest_queued_age": round(time.time() - oldest, 3) if oldest else 0,
+        "avg_wait_seconds_last_hour": round(timing[0] or 0, 3),
+        "avg_run_seconds_last_hour": round(timing[1] or 0, 3),
+        "worker_concurrency": getattr(settings, "JOB_WORKER_CONCURRENCY", 1),
+    }
+
+
+def _claim(worker_name):
+    """Atomically move the oldest queued job to `running` and return it."""
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # A job left running by a crashed process is failed rather than retried,
+        # since re-running it would likely crash again.
+        timeout = getattr(settings, "JOB_TIMEOUT_SECONDS", 0)
+        if timeout:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE status = ? AND started_at < ?",
+                (FAILED, now, "Analysis timed out", RUNNING, now - timeout),
+            )
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, worker = ? WHERE id = ?",
+                (RUNNING, now, worker_name, row["id"]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return _row_to_job(row)
+
+
+def _finish(job_id, worker_name, result=None, error=None):
+    """
+    Record the outcome of a job claimed by `worker_name`. Returns False, dropping
+    the outcome, if the job is no longer running there (it timed out meanwhile).
+    """
+    cur = _connect().execute(
+        "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? "
+        "WHERE id = ? AND status = ? AND worker = ?",
+        (FAILED if error else DONE, time.time(),
+         json.dumps(result, default=str) if result is not None else None, error,
+         job_id, RUNNING, worker_name),
+    )
+    return cur.rowcount > 0
+
+
+def purge_finished(older_than_seconds):
+    """Delete finished jobs older than the given age; returns the number removed."""
+    cur = _connect().execute(
+        "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+        (DONE, FAILED, time.time() - older_than_seconds),
+    )
+    return cur.rowcount
+
+
+class JobWorkerPool:
+    """Threads that claim queued jobs and run `handler(video_path, sequence_length, video_hash)`."""
+
+    def __init__(self, handler, concurrency=1, poll_interval=2.0):
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._last_purge = float("-inf")
+
+    def start(self):
+        for i in range(self.concurrency):
+            name = f"{os.getpid()}-{i}"
+            thread = threading.Thread(target=self._run, args=(name,), name=f"analysis-worker-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _purge_if_due(self):
+        retention = getattr(settings, "JOB_RETENTION_SECONDS", 0)
+        if not retention or time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            purge_finished(retention)
+        except sqlite3.Error:
+            pass
+
+    def _run(self, worker_name):
+        while True:
+            try:
+                job = _claim(worker_name)
+            except sqlite3.Error as e:
+                print(f"Job queue unavailable: {e}")
+                job = None
+
+            if job is None:
+                self._purge_if_due()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                result = self.handler(job["video_path"], job["sequence_length"], job["video_hash"])
+            except Exception as e:
+                _finish(job["id"], worker_name, error=str(e) or e.__class__.__name__)
+            else:
+                _finish(job["id"], worker_name, result=result)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_workers(handler):
+    """Start this process's worker pool (once) and nudge it to look for work."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = JobWorkerPool(
+                    handler,
+                    concurrency=getattr(settings, "JOB_WORKER_CONCURRENCY", 1),
+                    poll_interval=getattr(settings, "JOB_POLL_INTERVAL_SECONDS", 2.0),
+                )
+                pool.start()
+                _pool = pool
+    _pool.wake()
+    return _pool
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_app import benchmark
+
+
+def _resolution(value):
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Resolution must look like 640x360, got {value!r}")
+    return width, height
+
+
+class Command(BaseCommand):
+    help = ("Time each stage of the detection pipeline and a full request on synthetic videos, write the "
+            "results as JSON and optionally fail on regressions against a baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", default="benchmark_results.json", help="Where to write the results.")
+        parser.add_argument("--baseline", help="Results file to compare with; regressions fail the command.")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed slowdown of a stage median, as a fraction (default 0.25).")
+        parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                            help="Slowdowns smaller than this many ms are never regressions.")
+        parser.add_argument("--sequence-length", type=int, default=20)
+        parser.add_argument("--repeats", type=int, default=3)
+        parser.add_argument("--warmup", type=int, default=1)
+        parser.add_argument("--resolutions", nargs="+", default=[f"{w}x{h}" for w, h in benchmark.DEFAULT_RESOLUTIONS])
+        parser.add_argument("--lengths", nargs="+", type=int, default=list(benchmark.DEFAULT_LENGTHS),
+                            help="Clip lengths in frames.")
+        parser.add_argument("--codecs", nargs="+", default=list(benchmark.DEFAULT_CODECS),
+                            choices=sorted(benchmark.CODEC_EXTENSIONS))
+        parser.add_argument("--stages", nargs="+", default=list(benchmark.STAGES), choices=benchmark.STAGES)
+        parser.add_argument("--clips-dir", default=os.path.join(tempfile.gettempdir(), "deepfake_benchmark_clips"),
+                            help="Where the synthetic clips are written (and reused from).")
+
+    def handle(self, *args, **options):
+        try:
+            resolutions = [_resolution(value) for value in options["resolutions"]]
+            clips, unsupported = benchmark.ensure_clips(options["clips_dir"], resolutions, options["lengths"],
+                                                        options["codecs"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for codec in unsupported:
+            self.stderr.write(self.style.WARNING(f"This OpenCV build cannot write {codec}; skipped"))
+        if not clips:
+            raise CommandError("No clips to benchmark")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], "r", encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline: {e}")
+
+        document = benchmark.run(clips, options["sequence_length"], options["stages"], options["repeats"],
+                                 options["warmup"], log=self.stdout.write)
+        env = document["environment"]
+        self.stdout.write(f"Runtime {env['runtime']}, model {env['model']}, {env['cpu_count']} CPUs")
+        for line in benchmark.summary(document):
+            self.stdout.write(line)
+
+        tmp_path = options["out"] + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        os.replace(tmp_path, options["out"])
+        self.stdout.write(f"Wrote {options['out']}")
+
+        if baseline is None:
+            return
+        for key, (before, now) in benchmark.environment_differences(document, baseline).items():
+            self.stdout.write(self.style.WARNING(f"Environment differs from the baseline: {key} {before} -> {now}"))
+        rows = benchmark.compare(document, baseline, options["tolerance"], options["min_delta_ms"])
+        regressions = [row for row in rows if row["regression"]]
+        for row in rows:
+            line = (f"{row['clip']} {row['stage']}: {row['baseline_ms']:.1f} -> {row['current_ms']:.1f} ms "
+                    f"(x{row['ratio']:.2f})")
+            self.stdout.write(self.style.ERROR(line) if row["regression"] else line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} of {len(rows)} stage timings regressed by more than "
+                               f"{options['tolerance']:.0%}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} stage timings"))
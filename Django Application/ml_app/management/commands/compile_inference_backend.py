@@ -0,0 +1,85 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_app import inference_backends, ml_stack
+from ml_app.checkpoints import get_catalog
+
+
+class Command(BaseCommand):
+    help = ("Convert the served checkpoints to an inference backend, check the outputs against the eager "
+            "model and store the result next to the checkpoints.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default=None, help="Backend to compile (default: the configured one).")
+        parser.add_argument("--sequence-length", type=int, action="append", dest="sequence_lengths",
+                            help="Only the best checkpoint for this sequence length (repeatable).")
+        parser.add_argument("--videos", nargs="+", default=None,
+                            help="Build the validation clip set of each sequence length from these videos first.")
+
+    def handle(self, *args, **options):
+        if ml_stack.get_torch() is None:
+            raise CommandError("torch is not installed")
+        device = ml_stack.get_device()
+        catalog = get_catalog()
+        sequence_lengths = options["sequence_lengths"] or catalog.servable_sequence_lengths()
+        if not sequence_lengths:
+            raise CommandError(f"No servable checkpoints in {catalog.models_dir}")
+
+        for seq_len in sequence_lengths:
+            entry = catalog.best_for(seq_len)
+            if entry is None:
+                self.stderr.write(f"No checkpoint for sequence length {seq_len}")
+                continue
+            if options["videos"]:
+                self._write_validation_clips(options["videos"], seq_len)
+
+            backend = options["backend"] or inference_backends.backend_for(entry["path"])
+            try:
+                parsed = inference_backends.parse_backend(backend)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if not parsed:
+                self.stdout.write(f"{entry['filename']}: eager, nothing to compile")
+                continue
+
+            _, info = inference_backends.compile_backend(entry["path"], device, parsed)
+            verdict = self.style.SUCCESS("accepted") if info["accepted"] else self.style.ERROR("rejected")
+            self.stdout.write(
+                f"{entry['filename']}: {info['backend']} {verdict}; max delta {info['max_delta']:.5f}, "
+                f"agreement {info['agreement']:.0%} on {info['validation_clips']} "
+                f"{'synthetic' if info['synthetic_clips'] else 'validation'} clips; "
+                f"eager {info['eager_seconds']}s, backend {info['backend_seconds']}s per batch"
+            )
+
+    def _write_validation_clips(self, videos, seq_len):
+        from ml_app.views import validation_dataset
+
+        torch = ml_stack.get_torch()
+        dataset = validation_dataset(
+            videos, seq_len,
+            detection_scale=settings.FACE_DETECTION_SCALE,
+            detection_batch_size=settings.FACE_DETECTION_BATCH_SIZE,
+            detection_stride=settings.FACE_DETECTION_STRIDE,
+            detection_model=settings.FACE_DETECTION_MODEL,
+            sampling=settings.FRAME_SAMPLING_STRATEGY,
+            pipeline_workers=settings.FACE_PIPELINE_WORKERS,
+            pipeline_max_frames=settings.FACE_PIPELINE_MAX_FRAMES,
+        )
+        clips = []
+        for i in range(len(dataset)):
+            try:
+                clip = dataset[i]
+            except Exception as e:
+                self.stderr.write(f"Skipping {videos[i]}: {e}")
+                continue
+            if clip.shape[1] == seq_len:
+                clips.append(clip)
+        if not clips:
+            raise CommandError(f"None of the videos gave a {seq_len} frame clip")
+        directory = settings.INFERENCE_VALIDATION_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"validation_clips_{seq_len}.pt")
+        torch.save(torch.cat(clips), path)
+        self.stdout.write(f"Wrote {len(clips)} validation clips to {path}")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_app import onnx_export
+
+
+class Command(BaseCommand):
+    help = ("Export the served checkpoints to ONNX next to them, check the exports against the torch model "
+            "and record the result, for MODEL_RUNTIME=onnx.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sequence-length", type=int, action="append", dest="sequence_lengths",
+                            help="Only the checkpoint selected for this sequence length (repeatable).")
+        parser.add_argument("--opset", type=int, default=onnx_export.OPSET)
+        parser.add_argument("--max-delta", type=float, default=None,
+                            help="Largest allowed softmax difference (default: ONNX_PARITY_MAX_DELTA).")
+
+    def handle(self, *args, **options):
+        from ml_app.checkpoints import get_catalog
+        from ml_app.views import get_accurate_model
+
+        if onnx_export.torch is None or not onnx_export.onnx_backend.available():
+            raise CommandError("Exporting needs both torch and onnxruntime installed")
+        sequence_lengths = options["sequence_lengths"] or get_catalog().servable_sequence_lengths()
+        if not sequence_lengths:
+            raise CommandError(f"No servable checkpoints in {get_catalog().models_dir}")
+
+        failed = 0
+        for seq_len in sequence_lengths:
+            try:
+                model_path = get_accurate_model(seq_len)
+            except ValueError as e:
+                self.stderr.write(str(e))
+                failed += 1
+                continue
+            info = onnx_export.export_checkpoint(model_path, opset=options["opset"], max_delta=options["max_delta"])
+            parity = info["parity"]
+            verdict = self.style.SUCCESS("passed") if parity["passed"] else self.style.ERROR("failed")
+            self.stdout.write(
+                f"{info['source']}: parity {verdict}; max delta {parity['max_delta']:.2e}, "
+                f"agreement {parity['agreement']:.0%} over {len(parity['checks'])} checks "
+                f"({'synthetic' if parity['synthetic_clips'] else 'validation'} clips); "
+                + (f"wrote {info['path']}" if info["path"] else "export discarded")
+            )
+            failed += not parity["passed"]
+        if failed:
+            raise CommandError(f"{failed} export(s) failed")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_app import ml_stack
+
+
+class Command(BaseCommand):
+    help = ("Start a fresh process like a web worker does and report its startup time, peak memory and "
+            "the import cost of each package.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--warm", action="store_true",
+                            help="Also run the ML warm-up (imports the libraries of the served runtime).")
+        parser.add_argument("--preload", action="store_true",
+                            help="With --warm, also load the MODEL_PRELOAD_SEQUENCE_LENGTHS models.")
+        parser.add_argument("--top", type=int, default=15, help="Packages to list (default 15).")
+
+    def handle(self, *args, **options):
+        try:
+            report = ml_stack.startup_report(warm=options["warm"], preload=options["preload"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for phase, seconds in report["phases"]:
+            self.stdout.write(f"{phase}: {seconds:.2f}s")
+        self.stdout.write(f"Peak RSS {report['max_rss_mb']} MB, {report['import_seconds']:.2f}s importing "
+                          f"{sum(row['modules'] for row in report['packages'])} modules")
+        self.stdout.write(f"{'package':<24}{'seconds':>9}{'share':>8}{'modules':>9}")
+        for row in report["packages"][:options["top"]]:
+            share = row["seconds"] / report["import_seconds"] if report["import_seconds"] else 0.0
+            self.stdout.write(f"{row['package']:<24}{row['seconds']:>9.3f}{share:>8.0%}{row['modules']:>9}")
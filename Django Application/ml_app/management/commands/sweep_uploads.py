@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from ml_app import storage, uploads
+
+
+class Command(BaseCommand):
+    help = "Delete expired and over-quota uploaded videos, keeping those still in use."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting.")
+        parser.add_argument("--quota-bytes", type=int, default=None, help="Override UPLOAD_QUOTA_BYTES.")
+        parser.add_argument("--ttl-seconds", type=int, default=None, help="Override UPLOAD_TTL_SECONDS.")
+        parser.add_argument("--verbose-paths", action="store_true", help="List every deleted file.")
+
+    def handle(self, *args, **options):
+        if not options["dry_run"]:
+            uploads.cleanup_stale()
+        report = storage.sweep(
+            dry_run=options["dry_run"],
+            quota_bytes=options["quota_bytes"],
+            ttl_seconds=options["ttl_seconds"],
+        )
+        action = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            f"{action} {report['deleted']} videos ({report['freed_bytes'] / 1e6:.1f} MB); "
+            f"{report['protected']} in use; {report['remaining_bytes'] / 1e6:.1f} MB remaining"
+        )
+        if options["verbose_paths"]:
+            for path in report["deleted_paths"]:
+                self.stdout.write(f"  {path}")
+        if report["over_quota"]:
+            self.stdout.write(self.style.WARNING("Still over quota: remaining videos are in use"))
+
+        usage = storage.usage()
+        for key, value in usage.items():
+            self.stdout.write(f"{key}: {value}")
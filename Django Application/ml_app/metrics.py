@@ -0,0 +1,199 @@
+"""
+Per-stage timings and counters of the detection pipeline.
+
+Each stage of an analysis runs inside `stage(name)`, which adds its duration
+to the `deepfake_stage_seconds` histogram:
+
+    decode, face_detection, transform, forward     model path
+    model_select, model_load                       checkpoint lookup / load
+    heuristic, jpeg                                demo mode
+
+Counters record model loads and selections, result and demo image cache hits and misses,
+uploaded bytes, finished analyses and the utilisation of the frame pipeline
+stages (frame_pipeline.py). `MetricsMiddleware` times every view.
+`render` returns the Prometheus text format served at `/metrics`.
+
+With `METRICS_SERVER_TIMING` on, the middleware also adds a `Server-Timing`
+header listing the stages that ran in the request's thread. This covers
+synchronous analyses only, as queued jobs run in worker threads. With
+`METRICS_ENABLED` off, `stage` returns a shared no-op context manager and
+nothing is recorded.
+
+Like `/inference/stats/`, the numbers are those of the process serving the
+scrape; with several gunicorn workers, each worker keeps its own.
+"""
+
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    "deepfake_stage_seconds": ("histogram", "Time spent in each stage of the detection pipeline."),
+    "deepfake_request_seconds": ("histogram", "Response time per view."),
+    "deepfake_model_loads_total": ("counter", "Models loaded into the model registry."),
+    "deepfake_model_selections_total": ("counter", "Analyses by the checkpoint selected to serve them."),
+    "deepfake_cache_requests_total": ("counter", "Result and demo image cache lookups by outcome."),
+    "deepfake_upload_bytes_total": ("counter", "Bytes of uploaded video received."),
+    "deepfake_analyses_total": ("counter", "Finished analyses by mode and verdict."),
+    "deepfake_pipeline_busy_seconds_total": ("counter", "Busy time of each frame pipeline stage, over all its threads."),
+    "deepfake_pipeline_capacity_seconds_total": (
+        "counter", "Running time of each frame pipeline stage times its threads; busy / capacity is the utilisation."),
+    "deepfake_pipeline_backpressure_seconds_total": (
+        "counter", "Time the frame pipeline decoder waited for frames in flight to be assembled."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_local = threading.local()
+_NOOP = contextlib.nullcontext()
+
+
+def enabled():
+    return getattr(settings, "METRICS_ENABLED", True)
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric {name!r}")
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add `value` to a counter."""
+    if not enabled():
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one observation in a histogram."""
+    if not enabled():
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # One count per bucket, then +Inf, sum
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(BUCKETS)] += 1
+        histogram[-1] += seconds
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def stage(name):
+    """Context manager timing one pipeline stage."""
+    return _Stage(name) if enabled() else _NOOP
+
+
+def record_stage(name, seconds):
+    """Record a stage timed elsewhere, e.g. the work of a stage spread over other threads."""
+    if not enabled():
+        return
+    observe("deepfake_stage_seconds", seconds, stage=name)
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def cache_lookup(cache, hit):
+    inc("deepfake_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram[-1]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class MetricsMiddleware:
+    """Times each view and, with METRICS_SERVER_TIMING, reports the stages in a Server-Timing header."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        server_timing = getattr(settings, "METRICS_SERVER_TIMING", False)
+        if server_timing:
+            _local.timings = {}
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = _local.__dict__.pop("timings", None)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        observe("deepfake_request_seconds", elapsed, view=match.url_name if match else "unmatched")
+        if server_timing:
+            entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+            entries.append(f"total;dur={elapsed * 1000:.1f}")
+            response["Server-Timing"] = ", ".join(entries)
+        return response
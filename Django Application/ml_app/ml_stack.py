@@ -0,0 +1,245 @@
+"""
+Lazy loading of the heavy ML libraries.
+
+Importing torch and torchvision takes seconds and hundreds of MB, and cv2,
+numpy, face_recognition and onnxruntime add more. No module of ml_app imports
+them when it is itself imported: code that needs them asks for them here when
+it runs. So `manage.py` commands, the about and stats pages and processes
+serving ONNX or demo verdicts never load torch, and a worker only pays for the
+libraries of the runtime it serves, on its first analysis.
+
+* `optional_import(name)` imports a library on first use (once per process,
+  under a lock) and returns None if it cannot be imported;
+* `lazy_module(name)` stands in for a required library (cv2, numpy) and
+  imports it on first attribute access;
+* `installed(name)` tells whether a library could be imported, without
+  importing it.
+
+The time each import took is recorded (`imported`). `warm_up` imports what the
+configured runtime needs and preloads its models; with `ML_WARMUP`,
+gunicorn.conf.py runs it in the gunicorn master before the workers are forked,
+so they share those pages copy-on-write. `startup_report` measures the import
+cost of each package of a fresh process (`manage.py import_report`).
+"""
+
+import contextlib
+import importlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+
+# Libraries imported by `warm_up`, per runtime
+RUNTIME_MODULES = {
+    "torch": ("numpy", "cv2", "torch", "torchvision", "face_recognition", "ml_app.inference_backends"),
+    "onnx": ("numpy", "cv2", "onnxruntime", "face_recognition"),
+    "demo": ("numpy", "cv2"),
+}
+
+_lock = threading.RLock()
+_modules = {}
+_imports = {}
+_device = None
+
+
+def installed(name):
+    """Whether `name` can be found, without importing it."""
+    if name in _modules:
+        return _modules[name] is not None
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def optional_import(name):
+    """The module `name`, imported on first use; None if it cannot be imported."""
+    try:
+        return _modules[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _modules:
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(name)
+                error = None
+            except Exception as e:
+                module = None
+                error = f"{type(e).__name__}: {e}"
+            _imports[name] = {"seconds": time.perf_counter() - started, "error": error}
+            _modules[name] = module
+        return _modules[name]
+
+
+def require(name):
+    """Like `optional_import`, but raises ImportError when `name` is missing."""
+    module = optional_import(name)
+    if module is None:
+        raise ImportError(f"'{name}' is required but could not be imported ({_imports[name]['error']})")
+    return module
+
+
+class LazyModule:
+    """Stand-in for a required module, imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = require(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+def get_torch():
+    return optional_import("torch")
+
+
+def get_face_recognition():
+    return optional_import("face_recognition")
+
+
+def get_onnxruntime():
+    return optional_import("onnxruntime")
+
+
+def get_device():
+    """The device models run on (CUDA when available), or None without torch."""
+    global _device
+    if _device is None:
+        torch = get_torch()
+        if torch is None:
+            return None
+        with _lock:
+            if _device is None:
+                _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                print("\n🔥 Running on:", _device, "\n")
+    return _device
+
+
+def imported():
+    """Libraries imported through this module so far: name -> seconds taken and error, if any."""
+    with _lock:
+        return {name: dict(info, loaded=_modules[name] is not None) for name, info in _imports.items()}
+
+
+def preload_models():
+    """Load the models of MODEL_PRELOAD_SEQUENCE_LENGTHS into the registry of the served runtime."""
+    from .model_registry import get_registry
+    from .views import get_accurate_model, model_runtime
+
+    runtime = model_runtime()
+    if runtime == "demo":
+        return
+    for seq_len in getattr(settings, "MODEL_PRELOAD_SEQUENCE_LENGTHS", []):
+        try:
+            get_registry(runtime).get(get_accurate_model(seq_len, runtime), get_device())
+        except Exception as e:
+            print(f"Could not preload model for sequence length {seq_len}: {e}")
+
+
+@contextlib.contextmanager
+def _single_threaded(torch):
+    # A forward pass on several threads starts an OpenMP thread team, which does
+    # not survive fork: the workers would hang on their first forward pass
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(threads)
+
+
+def warm_up(preload=True):
+    """
+    Import the libraries of the served runtime and, with `preload`, load the
+    models of MODEL_PRELOAD_SEQUENCE_LENGTHS. Safe to call in a process that
+    forks afterwards: torch work runs on one thread, and models are not
+    preloaded for CUDA or ONNX Runtime, whose state does not survive fork
+    (workers load those on first use, or in gunicorn's post_fork hook).
+    Returns `imported()`.
+    """
+    from .views import model_runtime
+
+    runtime = model_runtime()
+    for name in RUNTIME_MODULES.get(runtime, ()):
+        optional_import(name)
+    if runtime == "torch" and preload and get_device() is not None and get_device().type == "cpu":
+        with _single_threaded(get_torch()):
+            preload_models()
+    return imported()
+
+
+_STARTUP_SCRIPT = """
+import json, resource, time
+started = time.perf_counter()
+import django
+from django.conf import settings
+django.setup()
+__import__(settings.ROOT_URLCONF)
+phases = [["django.setup and URLs", time.perf_counter() - started]]
+if {warm}:
+    from ml_app import ml_stack
+    started = time.perf_counter()
+    ml_stack.warm_up(preload={preload})
+    phases.append(["warm_up", time.perf_counter() - started])
+print(json.dumps({{"phases": phases, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+def parse_importtime(text):
+    """Self time (seconds) and module count per top-level package from `python -X importtime` output."""
+    packages = {}
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        package = parts[2].strip().split(".")[0]
+        seconds, modules = packages.get(package, (0.0, 0))
+        packages[package] = (seconds + int(parts[0]) / 1e6, modules + 1)
+    return packages
+
+
+def startup_report(warm=False, preload=False):
+    """
+    Start a fresh interpreter that sets up Django and imports the URLs (as a
+    gunicorn worker does) and, with `warm`, runs `warm_up`. Returns the time
+    of those phases, the peak RSS and the import cost of each top-level package.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE))
+    script = _STARTUP_SCRIPT.format(warm=bool(warm), preload=bool(preload))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=settings.BASE_DIR, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"The startup process failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    packages = parse_importtime(proc.stderr)
+    return {
+        "phases": result["phases"],
+        # ru_maxrss is in KB on Linux
+        "max_rss_mb": round(result["max_rss_kb"] / 1024, 1),
+        "import_seconds": sum(seconds for seconds, _ in packages.values()),
+        "packages": sorted(
+            ({"package": name, "seconds": seconds, "modules": modules} for name, (seconds, modules) in packages.items()),
+            key=lambda row: row["seconds"], reverse=True,
+        ),
+    }
@@ -0,0 +1,139 @@
+"""
+Process-wide registry of loaded DeepfakeModel checkpoints.
+
+Building a DeepfakeModel and running `torch.load` takes seconds, so every
+checkpoint is loaded once per process, switched to eval mode and reused by all
+later requests. At most `MODEL_REGISTRY_MAX_MODELS` checkpoints stay resident
+(least recently used ones are dropped first) and a checkpoint is only reloaded
+when its file on disk changes (modification time or size). Checkpoints are
+served with their configured inference backend (see inference_backends.py).
+ONNX exports have a registry of their own, whose models are onnxruntime
+sessions (see onnx_backend.py).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics, onnx_backend
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_checkpoint(model_path, device):
+    """Load a checkpoint with its inference backend; returns `(model, backend info)`."""
+    # Imported here, as it imports torch
+    from .inference_backends import load_model
+
+    return load_model(model_path, device)
+
+
+class ModelRegistry:
+    """
+    LRU cache of loaded models keyed by absolute checkpoint path. `loader`
+    maps `(path, device)` to `(model, backend info)`.
+    """
+
+    def __init__(self, max_models=2, loader=load_checkpoint):
+        self.max_models = max(1, int(max_models))
+        self.loader = loader
+        self.load_count = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # path -> [lock, threads using it]; kept only for resident models and loads in progress
+        self._load_locks = {}
+        self._backends = {}
+
+    def _lookup(self, path, stamp):
+        entry = self._models.get(path)
+        if entry is not None and entry[0] == stamp:
+            self._models.move_to_end(path)
+            return entry[1]
+        return None
+
+    def _drop(self, path):
+        """Forget a model and, unless a thread is using it, its load lock. Called with `_lock` held."""
+        self._models.pop(path, None)
+        self._backends.pop(path, None)
+        slot = self._load_locks.get(path)
+        if slot is not None and not slot[1]:
+            del self._load_locks[path]
+
+    def get(self, model_path, device):
+        """Return the model for `model_path`, loading it on first use or after it changed."""
+        path = os.path.abspath(model_path)
+        stamp = _file_stamp(path)
+
+        with self._lock:
+            model = self._lookup(path, stamp)
+            if model is not None:
+                return model
+            slot = self._load_locks.setdefault(path, [threading.Lock(), 0])
+            slot[1] += 1
+
+        # Only one thread loads a given checkpoint; the others wait and reuse it.
+        try:
+            with slot[0]:
+                with self._lock:
+                    model = self._lookup(path, stamp)
+                    if model is not None:
+                        return model
+
+                with metrics.stage("model_load"):
+                    model, backend = self.loader(path, device)
+                metrics.inc("deepfake_model_loads_total", model=os.path.basename(path))
+
+                with self._lock:
+                    self._models[path] = (stamp, model)
+                    self._backends[path] = backend
+                    self._models.move_to_end(path)
+                    self.load_count += 1
+                    while len(self._models) > self.max_models:
+                        self._drop(next(iter(self._models)))
+            return model
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1] and path not in self._models and self._load_locks.get(path) is slot:
+                    del self._load_locks[path]
+
+    def evict(self, model_path):
+        with self._lock:
+            self._drop(os.path.abspath(model_path))
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._models):
+                self._drop(path)
+
+    def loaded_paths(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def backends(self):
+        """Requested and active inference backend (and validation result) per loaded checkpoint."""
+        with self._lock:
+            return {os.path.basename(path): dict(info) for path, info in self._backends.items()}
+
+
+LOADERS = {"torch": load_checkpoint, "onnx": onnx_backend.load_session}
+
+_registries = {}
+_registry_lock = threading.Lock()
+
+
+def get_registry(runtime="torch"):
+    """Return the registry of a runtime ("torch" or "onnx") shared by every request handled in this process."""
+    registry = _registries.get(runtime)
+    if registry is None:
+        with _registry_lock:
+            registry = _registries.get(runtime)
+            if registry is None:
+                registry = ModelRegistry(getattr(settings, "MODEL_REGISTRY_MAX_MODELS", 2), LOADERS[runtime])
+                _registries[runtime] = registry
+    return registry
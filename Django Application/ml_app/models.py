@@ -0,0 +1,13 @@
+"""
+Models module for ml_app. Django imports it when the app registry is set up,
+by every `manage.py` command and web worker, so it must not import torch:
+`DeepfakeModel` is defined in deepfake_model.py and imported from there on
+first access (see ml_stack.py).
+"""
+
+
+def __getattr__(name):
+    if name == "DeepfakeModel":
+        from .deepfake_model import DeepfakeModel
+        return DeepfakeModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
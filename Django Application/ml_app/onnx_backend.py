@@ -0,0 +1,101 @@
+"""
+ONNX Runtime serving path for DeepfakeModel.
+
+`manage.py export_onnx` writes each served checkpoint as `<checkpoint>.onnx`
+(with dynamic batch and sequence axes) after checking it against the torch
+model. This module runs those exports with onnxruntime's CPU execution
+provider and prepares the frames with cv2 and numpy only, so a web process
+with `MODEL_RUNTIME=onnx` gives model verdicts without torch or torchvision.
+
+`ONNX_INTRA_OP_THREADS` is the number of threads one forward pass uses (0 lets
+onnxruntime use every core; with several gunicorn workers, cores / workers
+avoids oversubscription). `ONNX_INTER_OP_THREADS` above 1 also runs
+independent graph nodes in parallel.
+
+Faces are prepared by preprocessing.FacePreprocessor with numpy output, the
+same resize and normalisation as the torch path, so both see the same input.
+"""
+
+from django.conf import settings
+
+from . import metrics, ml_stack
+from .checkpoints import read_export_metadata
+from .clips import softmax
+from .frame_pipeline import collect_faces
+from .frame_sampling import sample_frames
+from .preprocessing import FacePreprocessor
+
+np = ml_stack.lazy_module("numpy")
+
+
+INPUT_NAME = "clips"
+OUTPUT_NAME = "logits"
+
+
+def available():
+    return ml_stack.installed("onnxruntime")
+
+
+def session_options(intra_op_threads=None, inter_op_threads=None):
+    if intra_op_threads is None:
+        intra_op_threads = getattr(settings, "ONNX_INTRA_OP_THREADS", 0)
+    if inter_op_threads is None:
+        inter_op_threads = getattr(settings, "ONNX_INTER_OP_THREADS", 1)
+    ort = ml_stack.get_onnxruntime()
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    if options.inter_op_num_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+class OnnxModel:
+    """An exported DeepfakeModel: `model(clips)` maps (batch, seq, 3, 112, 112) float32 to logits."""
+
+    def __init__(self, path, intra_op_threads=None, inter_op_threads=None):
+        ort = ml_stack.get_onnxruntime()
+        if ort is None:
+            raise RuntimeError("Cannot load an ONNX model: 'onnxruntime' is not installed.")
+        self.path = path
+        self.options = session_options(intra_op_threads, inter_op_threads)
+        self.session = ort.InferenceSession(path, sess_options=self.options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, clips):
+        # InferenceSession.run is thread-safe, so concurrent requests share the session
+        return self.session.run([OUTPUT_NAME], {INPUT_NAME: np.ascontiguousarray(clips, dtype=np.float32)})[0]
+
+
+def load_session(model_path, device=None):
+    """Registry loader: `(OnnxModel, info)` for an export; `device` is ignored, it always runs on the CPU."""
+    model = OnnxModel(model_path)
+    export = read_export_metadata(model_path) or {}
+    return model, {
+        "requested": "onnx",
+        "active": "onnx",
+        "providers": model.session.get_providers(),
+        "intra_op_threads": model.options.intra_op_num_threads,
+        "inter_op_threads": model.options.inter_op_num_threads,
+        "source": export.get("source"),
+        "parity": export.get("parity"),
+    }
+
+
+def read_faces(path, sequence_length, sampling="first", detection=None):
+    """The first `sequence_length` sampled frames of a video, cropped to the face (like `validation_dataset`)."""
+    faces = []
+    frames = (frame for _, frame in sample_frames(path, sequence_length, sampling))
+    collect_faces(frames, sequence_length, lambda i, face: faces.append(face), detection)
+    return faces
+
+
+def predict(model, faces):
+    """Score one clip of cropped faces; returns `(label, confidence)` like `views.predict`."""
+    with metrics.stage("transform"):
+        clip = FacePreprocessor(len(faces), backend="numpy")(faces)[None]
+    with metrics.stage("forward"):
+        logits = model(clip)
+    probs = softmax(logits, axis=1)[0]
+    label = int(np.argmax(probs))
+    return label, float(probs[label] * 100)
@@ -0,0 +1,139 @@
+"""
+Export of DeepfakeModel checkpoints to ONNX, for onnx_backend.py.
+
+The exported graph takes `clips` (batch, sequence, 3, 112, 112) and returns
+only the `logits`; the feature maps are not needed for serving. Batch and
+sequence are dynamic axes, so one export scores any number of clips.
+
+Each export is run through onnxruntime and compared with the torch model on
+the validation clips (see `inference_backends.validation_clips`), at the
+checkpoint's sequence length and a shorter one, one clip and all clips at a
+time. It is kept only if the softmax probabilities stay within
+`ONNX_PARITY_MAX_DELTA` and every predicted label agrees. The result is
+written to `<export>.onnx.json`, which the checkpoint catalog reads before it
+serves the export.
+"""
+
+import json
+import os
+import time
+import warnings
+
+from django.conf import settings
+
+from . import ml_stack, onnx_backend
+from .checkpoints import compute_sha256, parse_checkpoint_name
+from .clips import softmax
+from .inference_backends import load_eager, validation_clips
+from .preprocessing import IM_SIZE
+
+try:
+    import torch
+    from torch import nn
+except Exception:
+    torch = None
+    nn = None
+
+
+OPSET = 17
+
+
+def onnx_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".onnx"
+
+
+class _Logits(nn.Module if nn is not None else object):
+    """The served part of DeepfakeModel: clips -> logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, clips):
+        return self.model(clips)[1]
+
+
+def check_parity(model, session, sequence_length, max_delta):
+    """Compare the torch `model` with the onnxruntime `session`; returns the parity record."""
+    checks = []
+    synthetic = False
+    for seq_len in sorted({sequence_length, max(1, sequence_length // 2)}, reverse=True):
+        clips, synthetic_clips = validation_clips(seq_len, torch.device("cpu"))
+        synthetic = synthetic or synthetic_clips
+        for batch in sorted({1, int(clips.shape[0])}):
+            with torch.no_grad():
+                expected = softmax(model(clips[:batch]).numpy(), axis=1)
+            actual = softmax(session(clips[:batch].numpy()), axis=1)
+            checks.append({
+                "batch": batch,
+                "sequence_length": seq_len,
+                "max_delta": float(abs(expected - actual).max()),
+                "agreement": float((expected.argmax(1) == actual.argmax(1)).mean()),
+            })
+    worst = max(check["max_delta"] for check in checks)
+    agreement = min(check["agreement"] for check in checks)
+    return {
+        "passed": worst <= max_delta and agreement == 1.0,
+        "max_delta": worst,
+        "agreement": agreement,
+        "max_allowed_delta": max_delta,
+        "synthetic_clips": synthetic,
+        "checks": checks,
+    }
+
+
+def export_checkpoint(model_path, onnx_path=None, opset=OPSET, max_delta=None):
+    """
+    Export a checkpoint, check its parity and, if it passed, store the export
+    and its sidecar. A failed export leaves any previous one in place.
+    Returns the sidecar contents (with "path").
+    """
+    if torch is None or not onnx_backend.available():
+        raise RuntimeError("Exporting to ONNX needs both 'torch' and 'onnxruntime'.")
+    max_delta = getattr(settings, "ONNX_PARITY_MAX_DELTA", 1e-3) if max_delta is None else max_delta
+    onnx_path = onnx_path or onnx_path_for(model_path)
+    parsed = parse_checkpoint_name(model_path)
+    sequence_length = parsed[1] if parsed else 20
+
+    model = _Logits(load_eager(model_path, torch.device("cpu"))).eval()
+    example = torch.zeros((1, sequence_length, 3, IM_SIZE, IM_SIZE))
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    started = time.perf_counter()
+    try:
+        with torch.no_grad(), warnings.catch_warnings():
+            # The LSTM warns about batch sizes other than the example's; the parity check covers them
+            warnings.simplefilter("ignore", UserWarning)
+            torch.onnx.export(
+                model, (example,), tmp_path,
+                input_names=[onnx_backend.INPUT_NAME],
+                output_names=[onnx_backend.OUTPUT_NAME],
+                dynamic_axes={onnx_backend.INPUT_NAME: {0: "batch", 1: "sequence"},
+                              onnx_backend.OUTPUT_NAME: {0: "batch"}},
+                opset_version=opset,
+                dynamo=False,
+            )
+        export_seconds = time.perf_counter() - started
+        parity = check_parity(model, onnx_backend.OnnxModel(tmp_path), sequence_length, max_delta)
+        info = {
+            "source": os.path.basename(model_path),
+            "source_sha256": compute_sha256(model_path),
+            "opset": opset,
+            "torch_version": torch.__version__,
+            "onnxruntime_version": ml_stack.get_onnxruntime().__version__,
+            "export_seconds": round(export_seconds, 3),
+            "exported_at": time.time(),
+            "parity": parity,
+        }
+        if not parity["passed"]:
+            return dict(info, path=None)
+        os.replace(tmp_path, onnx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # The catalog serves an export once its sidecar records the passed check, so it goes last
+    meta_tmp = f"{onnx_path}.json.{os.getpid()}.tmp"
+    with open(meta_tmp, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    os.replace(meta_tmp, onnx_path + ".json")
+    return dict(info, path=onnx_path)
@@ -0,0 +1,245 @@
+"""
+Lifecycle management for uploaded videos.
+
+Uploads used to be kept forever under second-resolution timestamp names.
+Every stored upload is now recorded in a small SQLite index (path, size,
+content hash, created and last access time). A sweep deletes:
+
+* uploads not accessed for `UPLOAD_TTL_SECONDS`, then
+* the least recently accessed ones until the directory is under
+  `UPLOAD_QUOTA_BYTES`.
+
+Files that are still needed are never deleted: videos of queued or running
+jobs, and videos of sessions that used them within
+`UPLOAD_ACTIVE_SESSION_SECONDS`. The sweep runs after new uploads, at most
+once a minute while the quota is exceeded (every file may be in use) and
+hourly otherwise, and offline through `manage.py sweep_uploads`.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import jobs
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    video_hash TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_last_access ON uploads (last_access);
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection to the upload index."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        db_path = settings.UPLOAD_INDEX_PATH
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def upload_dir():
+    return os.path.join(settings.PROJECT_DIR, "uploaded_videos")
+
+
+def new_upload_path(extension):
+    """A fresh path in the upload directory; unique even for uploads in the same second."""
+    return os.path.join(upload_dir(), f"uploaded_{int(time.time())}_{uuid.uuid4().hex[:12]}.{extension.lower()}")
+
+
+def _is_upload(name):
+    return name.startswith("uploaded_") and not name.endswith((".part", ".lock"))
+
+
+def register(path, video_hash=None):
+    """Record a newly stored upload and sweep if the quota is exceeded."""
+    now = time.time()
+    _connect().execute(
+        "INSERT OR REPLACE INTO uploads (path, size, video_hash, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+        (path, os.path.getsize(path), video_hash, now, now),
+    )
+    # The new upload isn't referenced by its session or job yet
+    _sweep_if_due(keep={path})
+
+
+def touch(path):
+    """Mark an upload as used now, so eviction treats it as recently accessed."""
+    try:
+        _connect().execute("UPDATE uploads SET last_access = ? WHERE path = ?", (time.time(), path))
+    except sqlite3.Error:
+        pass
+
+
+def discard(path):
+    """Delete an upload that is no longer needed (e.g. a duplicate of a stored video)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    _connect().execute("DELETE FROM uploads WHERE path = ?", (path,))
+
+
+def _reconcile(conn):
+    """Bring the index in line with the directory: add untracked files, drop vanished ones."""
+    on_disk = {}
+    directory = upload_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not _is_upload(name) or not os.path.isfile(path):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        on_disk[path] = st
+
+    tracked = {row["path"] for row in conn.execute("SELECT path FROM uploads")}
+    for path in tracked - set(on_disk):
+        conn.execute("DELETE FROM uploads WHERE path = ?", (path,))
+    for path in set(on_disk) - tracked:
+        st = on_disk[path]
+        conn.execute(
+            "INSERT OR IGNORE INTO uploads (path, size, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (path, st.st_size, st.st_mtime, max(st.st_mtime, st.st_atime)),
+        )
+
+
+def _session_paths(active_since):
+    """Videos referenced by unexpired sessions that used them after `active_since`."""
+    from django.contrib.sessions.models import Session
+    from django.utils import timezone
+
+    paths = set()
+    for session in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        try:
+            path = session.get_decoded().get("file_name")
+        except Exception:
+            continue
+        if path:
+            paths.add(path)
+    # Only sessions that used their video recently count as active
+    recent = _connect().execute("SELECT path FROM uploads WHERE last_access >= ?", (active_since,))
+    return paths & {row["path"] for row in recent}
+
+
+def protected_paths():
+    """Uploads that must not be deleted: in-flight jobs and active sessions."""
+    protected = set(jobs.active_video_paths())
+    try:
+        protected |= _session_paths(time.time() - settings.UPLOAD_ACTIVE_SESSION_SECONDS)
+    except Exception as e:
+        # Without the session table we can't tell which videos are in use; keep them all
+        print(f"Could not read sessions for upload sweep: {e}")
+        protected |= {row["path"] for row in _connect().execute("SELECT path FROM uploads")}
+    return protected
+
+
+# Seconds between sweeps after uploads: while over quota, and otherwise
+SWEEP_INTERVAL_OVER_QUOTA = 60
+SWEEP_INTERVAL = 3600
+
+_last_sweep = float("-inf")
+_sweep_lock = threading.Lock()
+
+
+def sweep(dry_run=False, quota_bytes=None, ttl_seconds=None, keep=()):
+    """
+    Evict expired, then least recently used uploads over the quota; returns a report.
+    Paths in `keep` are protected in addition to those of jobs and active sessions.
+    """
+    global _last_sweep
+    quota_bytes = settings.UPLOAD_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    ttl_seconds = settings.UPLOAD_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    conn = _connect()
+    _reconcile(conn)
+    protected = protected_paths() | set(keep)
+
+    now = time.time()
+    rows = conn.execute("SELECT path, size, last_access FROM uploads ORDER BY last_access").fetchall()
+    total = sum(row["size"] for row in rows)
+    deleted, freed = [], 0
+    for row in rows:
+        if row["path"] in protected:
+            continue
+        expired = ttl_seconds and now - row["last_access"] > ttl_seconds
+        if not expired and (not quota_bytes or total <= quota_bytes):
+            continue
+        if not dry_run:
+            discard(row["path"])
+        deleted.append(row["path"])
+        freed += row["size"]
+        total -= row["size"]
+
+    _last_sweep = time.monotonic()
+    return {
+        "deleted": len(deleted),
+        "deleted_paths": deleted,
+        "freed_bytes": freed,
+        "protected": len(protected),
+        "remaining_bytes": total,
+        "over_quota": bool(quota_bytes) and total > quota_bytes,
+        "dry_run": dry_run,
+    }
+
+
+def _sweep_if_due(keep=()):
+    quota = settings.UPLOAD_QUOTA_BYTES
+    used = _connect().execute("SELECT COALESCE(SUM(size), 0) FROM uploads").fetchone()[0]
+    interval = SWEEP_INTERVAL_OVER_QUOTA if quota and used > quota else SWEEP_INTERVAL
+    if time.monotonic() - _last_sweep < interval:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        report = sweep(keep=keep)
+        if report["deleted"]:
+            print(f"Upload sweep removed {report['deleted']} videos ({report['freed_bytes']} bytes)")
+    except sqlite3.Error as e:
+        print(f"Upload sweep failed: {e}")
+    finally:
+        _sweep_lock.release()
+
+
+def usage():
+    """Disk usage figures of the upload directory for monitoring."""
+    conn = _connect()
+    row = conn.execute(
+        "SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes, MIN(last_access) AS oldest FROM uploads"
+    ).fetchone()
+    try:
+        disk = shutil.disk_usage(upload_dir())
+        disk_stats = {"disk_total_bytes": disk.total, "disk_free_bytes": disk.free}
+    except OSError:
+        disk_stats = {"disk_total_bytes": None, "disk_free_bytes": None}
+    quota = settings.UPLOAD_QUOTA_BYTES
+    return dict(
+        files=row["files"],
+        bytes=row["bytes"],
+        quota_bytes=quota,
+        quota_used=round(row["bytes"] / quota, 4) if quota else None,
+        ttl_seconds=settings.UPLOAD_TTL_SECONDS,
+        oldest_access_age=round(time.time() - row["oldest"], 3) if row["oldest"] else 0,
+        **disk_stats,
+    )
@@ -0,0 +1,330 @@
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from . import clips, frame_pipeline, jobs, ml_stack
+from .checkpoints import CheckpointCatalog, parse_checkpoint_name
+from .demo_artifacts import DemoArtifactStore, artifact_key
+from .detection_stats import DetectionStats
+from .result_cache import ResultCache
+from .uploads import UploadError, UploadSession, sniff_container
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class CheckpointCatalogTests(TempDirMixin, SimpleTestCase):
+    def test_parse_checkpoint_name(self):
+        self.assertEqual(parse_checkpoint_name("model_84_acc_10_frames_final_data.pt"), (84.0, 10))
+        self.assertEqual(parse_checkpoint_name("/models/model_97.5_acc_100_frames_x.onnx"), (97.5, 100))
+        self.assertIsNone(parse_checkpoint_name("validation_clips.pt"))
+        self.assertIsNone(parse_checkpoint_name("model_84_acc_ten_frames.pt"))
+
+    @skipUnless(ml_stack.get_torch(), "torch is not installed")
+    def test_non_checkpoint_pt_is_not_served(self):
+        torch = ml_stack.get_torch()
+        torch.save({"linear1.weight": torch.zeros(2, 4)}, os.path.join(self.tmp, "model_84_acc_10_frames_a.pt"))
+        # A well named file that is not a state dict, and one that is not even a torch file
+        torch.save([torch.zeros(3)], os.path.join(self.tmp, "model_99_acc_10_frames_b.pt"))
+        with open(os.path.join(self.tmp, "model_98_acc_10_frames_c.pt"), "wb") as f:
+            f.write(b"not a checkpoint")
+        torch.save({"clips": [1, 2]}, os.path.join(self.tmp, "validation_clips.pt"))
+
+        catalog = CheckpointCatalog(self.tmp)
+        self.assertEqual(catalog.best_for(10)["filename"], "model_84_acc_10_frames_a.pt")
+        self.assertEqual(catalog.servable_sequence_lengths(), [10])
+        entries = {entry["filename"]: entry for entry in catalog.entries()}
+        self.assertEqual(entries["model_84_acc_10_frames_a.pt"]["tensors"]["num_classes"], 2)
+        for name in ("model_99_acc_10_frames_b.pt", "model_98_acc_10_frames_c.pt", "validation_clips.pt"):
+            self.assertFalse(entries[name]["servable"], name)
+        self.assertTrue(entries["model_99_acc_10_frames_b.pt"]["error"])
+
+
+class AggregateTests(SimpleTestCase):
+    # Columns are (fake, real); the second clip is confidently fake, the others lean real
+    LOGITS = [[0.0, 1.0], [4.0, 0.0], [0.0, 0.5]]
+
+    def test_mean(self):
+        expected = clips.softmax(np.mean(self.LOGITS, axis=0))
+        np.testing.assert_allclose(clips.aggregate(self.LOGITS, "mean"), expected)
+
+    def test_max_takes_the_most_fake_clip(self):
+        np.testing.assert_allclose(clips.aggregate(self.LOGITS, "max"), clips.softmax(self.LOGITS[1]))
+
+    def test_attention_favours_confident_clips(self):
+        probs = clips.aggregate(self.LOGITS, "attention")
+        self.assertAlmostEqual(probs.sum(), 1.0)
+        self.assertGreater(probs[clips.FAKE], clips.aggregate(self.LOGITS, "mean")[clips.FAKE])
+
+    def test_single_clip_is_the_same_for_every_method(self):
+        for method in clips.AGGREGATIONS:
+            np.testing.assert_allclose(clips.aggregate([[1.0, 2.0]], method), clips.softmax([1.0, 2.0]))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            clips.aggregate(self.LOGITS, "vote")
+
+
+class UploadTests(TempDirMixin, SimpleTestCase):
+    VIDEO = b"\x00\x00\x00\x18ftypmp42" + bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.tmp, "uploaded_videos"))
+        settings = override_settings(PROJECT_DIR=self.tmp, UPLOAD_MAX_CHUNK_SIZE=4096)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_sniff_container(self):
+        self.assertEqual(sniff_container(self.VIDEO[:16]), "mp4")
+        self.assertEqual(sniff_container(b"RIFF\x00\x00\x00\x00AVI LIST"), "avi")
+        self.assertEqual(sniff_container(b"\x1a\x45\xdf\xa3" + b"\x00" * 12), "matroska")
+        self.assertIsNone(sniff_container(b"<html><body>"))
+        self.assertIsNone(sniff_container(b""))
+
+    def test_chunks_resume_and_complete(self):
+        session = UploadSession.create("clip.mp4", len(self.VIDEO), 20, "owner")
+        self.assertEqual(session.write_chunk(0, 4000, io.BytesIO(self.VIDEO[:4000])), 4000)
+
+        with self.assertRaises(UploadError) as raised:
+            session.write_chunk(0, 100, io.BytesIO(self.VIDEO[:100]))
+        self.assertEqual(raised.exception.status, 409)
+        with self.assertRaises(UploadError) as raised:
+            session.write_chunk(4000, 5000, io.BytesIO(self.VIDEO[4000:9000]))
+        self.assertEqual(raised.exception.status, 413)
+
+        # The connection drops part way through a chunk: what arrived is kept
+        self.assertEqual(session.write_chunk(4000, 4000, io.BytesIO(self.VIDEO[4000:6000])), 6000)
+
+        # Resume from another process, which has not hashed the earlier chunks
+        with mock.patch.dict("ml_app.uploads._hashers", clear=True):
+            resumed = UploadSession.load(session.upload_id, "owner")
+            self.assertEqual(resumed.offset(), 6000)
+            offset = resumed.offset()
+            while offset < len(self.VIDEO):
+                end = min(offset + 4000, len(self.VIDEO))
+                offset = resumed.write_chunk(offset, end - offset, io.BytesIO(self.VIDEO[offset:end]))
+
+        self.assertTrue(resumed.complete)
+        self.assertEqual(resumed.state["sha256"], hashlib.sha256(self.VIDEO).hexdigest())
+        with open(resumed.path, "rb") as f:
+            self.assertEqual(f.read(), self.VIDEO)
+        self.assertFalse(os.path.exists(resumed.part_path))
+        self.assertTrue(UploadSession.load(session.upload_id, "owner").complete)
+
+    def test_other_owner_cannot_resume(self):
+        session = UploadSession.create("clip.mp4", len(self.VIDEO), 20, "owner-session-key")
+        self.assertEqual(UploadSession.load(session.upload_id, "owner-session-key").path, session.path)
+        # The state is not served with the uploads and does not give the session away
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "uploaded_videos", ".uploads")))
+        with open(os.path.join(self.tmp, "cache", "uploads", session.upload_id + ".json"), encoding="utf-8") as f:
+            self.assertNotIn("owner-session-key", f.read())
+        with self.assertRaises(UploadError) as raised:
+            UploadSession.load(session.upload_id, "someone else")
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_non_video_is_rejected_on_the_first_chunk(self):
+        session = UploadSession.create("clip.mp4", 1000, 20, "owner")
+        with self.assertRaises(UploadError) as raised:
+            session.write_chunk(0, 1000, io.BytesIO(b"<html>" + b" " * 994))
+        self.assertEqual(raised.exception.status, 415)
+        self.assertFalse(os.path.exists(session.part_path))
+        with self.assertRaises(UploadError):
+            UploadSession.load(session.upload_id, "owner")
+
+
+class DemoArtifactTests(TempDirMixin, SimpleTestCase):
+    IMAGES = [("demo_frame_00.jpg", b"frame"), ("demo_face_00.jpg", b"face")]
+
+    def test_failed_spec_write_leaves_no_temp_file(self):
+        store = DemoArtifactStore(self.tmp)
+        key = artifact_key("hash", "uniform", 1)
+        with mock.patch("ml_app.demo_artifacts.json.dump", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                store.put(key, self.IMAGES, "/videos/a.mp4", [0])
+        self.assertEqual([name for name in os.listdir(self.tmp) if name.endswith(".tmp")], [])
+
+    def test_cleanup_removes_stale_temp_files_and_directories(self):
+        store = DemoArtifactStore(self.tmp)
+        stale, fresh = os.path.join(self.tmp, "a.json.1.2.tmp"), os.path.join(self.tmp, "b.json.1.2.tmp")
+        for path in (stale, fresh):
+            open(path, "w").close()
+        os.makedirs(os.path.join(self.tmp, "c.1.2.tmp"))
+        old = time.time() - 7200
+        os.utime(stale, (old, old))
+        os.utime(os.path.join(self.tmp, "c.1.2.tmp"), (old, old))
+        store.cleanup()
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["b.json.1.2.tmp"])
+
+
+@override_settings(AUDIT_LOG_MAX_BYTES=400, AUDIT_LOG_ROTATE_SECONDS=0, AUDIT_LOG_BUFFER_SIZE=0)
+class DetectionStatsTests(TempDirMixin, SimpleTestCase):
+    def entry(self, verdict, confidence):
+        return {"verdict": verdict, "confidence": confidence, "mode": "torch",
+                "model_path": "model_84_acc_10_frames_a.pt", "timestamp": "2024-05-01T10:00:00"}
+
+    def test_tails_new_lines_across_rotation(self):
+        stats = DetectionStats(os.path.join(self.tmp, "detections.jsonl"))
+        stats.log.append(self.entry("REAL", 90))
+        stats.log.append(self.entry("FAKE", 60))
+        self.assertEqual(stats.snapshot()["total"], 2)
+
+        # Enough entries to rotate the active file (including the lines already counted) away
+        for _ in range(6):
+            stats.log.append(self.entry("FAKE", 85))
+        self.assertTrue(stats.log.segments())
+        self.assertTrue(stats.log.segments()[0].endswith(".gz"))
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot["total"], snapshot["real"], snapshot["fake"]), (8, 1, 7))
+        self.assertEqual(snapshot["high_confidence_count"], 7)
+        self.assertEqual(snapshot["by_day"], {"2024-05-01": {"total": 8, "real": 1, "fake": 7}})
+
+        # A half written line is left for the next refresh
+        with open(stats.log_path, "ab") as f:
+            f.write(json.dumps(self.entry("REAL", 50)).encode("utf-8")[:20])
+        self.assertEqual(stats.snapshot()["total"], 8)
+
+        # A new process resumes from the checkpoint instead of counting everything again
+        with open(stats.log_path, "ab") as f:
+            f.write(json.dumps(self.entry("REAL", 50)).encode("utf-8")[20:] + b"\n")
+        self.assertEqual(DetectionStats(stats.log_path).snapshot()["total"], 9)
+        self.assertEqual(stats.snapshot()["total"], 9)
+
+
+class JobTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        settings = override_settings(JOB_DB_PATH=os.path.join(self.tmp, "jobs.sqlite3"), JOB_TIMEOUT_SECONDS=60)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Connections are per thread; give this test its own database
+        patcher = mock.patch.object(jobs._local, "conn", None, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: jobs._local.conn and jobs._local.conn.close())
+
+    def test_finish(self):
+        job_id = jobs.enqueue("/videos/a.mp4", 20)
+        self.assertEqual(jobs._claim("w1")["id"], job_id)
+        self.assertTrue(jobs._finish(job_id, "w1", result={"output": "REAL"}))
+        job = jobs.get_job(job_id)
+        self.assertEqual((job["status"], job["result"]), (jobs.DONE, {"output": "REAL"}))
+
+    def test_result_of_timed_out_job_is_dropped(self):
+        job_id = jobs.enqueue("/videos/a.mp4", 20)
+        jobs._claim("w1")
+        jobs._connect().execute("UPDATE jobs SET started_at = ? WHERE id = ?", (time.time() - 120, job_id))
+        self.assertIsNone(jobs._claim("w2"))
+        self.assertFalse(jobs._finish(job_id, "w1", result={"output": "REAL"}))
+        job = jobs.get_job(job_id)
+        self.assertEqual((job["status"], job["error"], job["result"]), (jobs.FAILED, "Analysis timed out", None))
+
+
+class ResultCacheTests(TempDirMixin, SimpleTestCase):
+    def test_expired_entries_are_misses(self):
+        cache = ResultCache(self.tmp, ttl_seconds=60)
+        cache.set("key", {"output": "FAKE"})
+        self.assertEqual(cache.get("key"), {"output": "FAKE"})
+        with mock.patch("ml_app.result_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("key"))
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResultCache(self.tmp, ttl_seconds=0)
+        cache.set("a", "x" * 100)
+        size = os.path.getsize(cache._path("a"))
+        cache.max_bytes = 2 * size + size // 2
+        cache.set("b", "x" * 100)
+        now = time.time()
+        os.utime(cache._path("a"), (now - 100, now - 100))
+        os.utime(cache._path("b"), (now - 50, now - 50))
+        # Reading "a" makes "b" the least recently used
+        self.assertIsNotNone(cache.get("a"))
+        cache.set("c", "x" * 100)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+class FakeFaceRecognition:
+    """Stands in for face_recognition: deterministic boxes, no face on some frames, random delays."""
+
+    @staticmethod
+    def face_locations(image, model="hog"):
+        # Random delays make the detection workers finish out of order
+        time.sleep(random.random() * 0.003)
+        height, width = image.shape[:2]
+        value = int(image[height // 2, width // 2].sum())
+        if value % 4 == 0:
+            return []
+        return [(height // 4 + value % 5, 3 * width // 4 - value % 3, 3 * height // 4, width // 4 + value % 7)]
+
+    @classmethod
+    def batch_face_locations(cls, images, batch_size=128):
+        return [cls.face_locations(image) for image in images]
+
+
+def _frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [np.full((72, 128, 3), rng.integers(0, 256, 3), dtype=np.uint8) for _ in range(count)]
+
+
+@mock.patch("ml_app.ml_stack.get_face_recognition", return_value=FakeFaceRecognition)
+class FramePipelineTests(SimpleTestCase):
+    def collect(self, frames, count, workers, **detection):
+        faces = []
+        found = frame_pipeline.collect_faces(
+            iter(frames), count, lambda i, face: faces.append((i, face.shape, int(face.sum()))),
+            detection, workers=workers, max_in_flight=4,
+        )
+        self.assertEqual([i for i, _, _ in faces], list(range(found)))
+        return faces
+
+    def test_pipeline_matches_sequential_crops(self, _):
+        frames = _frames(23)
+        for count in (1, 7, 20, 60):
+            for stride in (1, 3, 5):
+                for model in ("hog", "cnn"):
+                    for scale in (1.0, 0.5):
+                        detection = {"scale": scale, "stride": stride, "model": model, "batch_size": 3}
+                        with self.subTest(count=count, stride=stride, model=model, scale=scale):
+                            self.assertEqual(self.collect(frames, count, 3, **detection),
+                                             self.collect(frames, count, 0, **detection))
+
+    def test_stops_at_count(self, _):
+        consumed = []
+
+        def frames():
+            for frame in _frames(50):
+                consumed.append(frame)
+                yield frame
+
+        self.assertEqual(len(self.collect(frames(), 10, 2)), 10)
+        self.assertEqual(len(consumed), 10)
+
+    def test_detector_error_is_raised(self, face_recognition):
+        failing = mock.Mock()
+        failing.face_locations.side_effect = RuntimeError("detector failed")
+        face_recognition.return_value = failing
+        with self.assertRaisesMessage(RuntimeError, "detector failed"):
+            self.collect(_frames(20), 20, 2)
+        self.assertFalse([t for t in threading.enumerate() if t.name.startswith("face-pipeline")])
+
+    def test_no_frames(self, _):
+        with self.assertRaises(ValueError):
+            self.collect([], 10, 2)
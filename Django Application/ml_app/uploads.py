@@ -0,0 +1,297 @@
+"""
+Chunked, resumable video uploads.
+
+A multipart POST of the whole video ties up a worker for the full transfer
+and passes the file through Django's upload handlers and temp storage before
+anything is validated. Here the client creates an upload session first
+(filename, total size, sequence length), then sends the video as raw chunks:
+
+    POST /upload/              -> {"upload_id", "offset": 0, "chunk_size"}
+    PUT  /upload/<id>/         Upload-Offset: <n>, body = bytes n.. of the file
+    GET  /upload/<id>/         -> {"offset"} to resume after a dropped connection
+
+Each chunk is read from the request stream in small blocks and appended to
+`uploaded_videos/<name>.part`. When the last byte arrives, the file is renamed
+to its final name in the same directory, so it is never copied. The first
+chunk is checked for a known container signature, so a renamed non-video is
+rejected after a few bytes. The SHA-256 of the content is computed as the
+chunks are written. A worker process that didn't see earlier chunks reads
+just those back from disk to catch up.
+
+The state of each session is kept in `cache/uploads/<id>.json`, outside the
+served MEDIA_ROOT, and records a hash of the owner's session key rather than
+the key itself.
+"""
+
+import hashlib
+import hmac
+import json
+import shutil
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import storage
+from .audit_log import FileLock
+
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# Leading bytes of the containers accepted for upload
+_SIGNATURES = (
+    (0, b"\x1a\x45\xdf\xa3", "matroska"),               # mkv, webm
+    (0, b"FLV", "flv"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11", "asf"),    # wmv
+)
+# ISO base media (mp4, mov, 3gp) files start with a box: 4 byte size + type
+_ISO_BOXES = (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip")
+
+SNIFF_BYTES = 16
+
+
+class UploadError(Exception):
+    """Raised for an upload request that cannot be accepted; `status` is the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_container(head):
+    """Return the container type recognised from the first bytes of a file, or None."""
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if len(head) >= 8 and head[4:8] in _ISO_BOXES:
+        return "mp4"
+    for offset, magic, name in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return name
+    return None
+
+
+def _state_dir():
+    # Not under MEDIA_ROOT, which is served to clients
+    return os.path.join(settings.PROJECT_DIR, "cache", "uploads")
+
+
+def _legacy_state_dir():
+    return os.path.join(settings.PROJECT_DIR, "uploaded_videos", ".uploads")
+
+
+def _state_path(upload_id):
+    return os.path.join(_state_dir(), upload_id + ".json")
+
+
+def _owner_digest(owner):
+    """What is stored for the session key that owns an upload, so a leaked state file reveals no session."""
+    return hashlib.sha256(owner.encode("utf-8")).hexdigest()
+
+
+# Running hash per upload in this process: upload_id -> (sha256, bytes hashed)
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadSession:
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def upload_id(self):
+        return self.state["id"]
+
+    @property
+    def path(self):
+        return self.state["path"]
+
+    @property
+    def part_path(self):
+        return self.state["path"] + ".part"
+
+    @property
+    def size(self):
+        return self.state["size"]
+
+    @classmethod
+    def create(cls, filename, size, sequence_length, owner):
+        extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        if size <= 0:
+            raise UploadError("Empty upload")
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise UploadError(f"Video is larger than {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB", status=413)
+
+        cleanup_stale()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(_state_dir(), exist_ok=True)
+        state = {
+            "id": upload_id,
+            "filename": filename,
+            "path": storage.new_upload_path(extension),
+            "size": size,
+            "sequence_length": sequence_length,
+            "owner": _owner_digest(owner),
+            "created": time.time(),
+            "sha256": None,
+        }
+        open(state["path"] + ".part", "wb").close()
+        session = cls(state)
+        session._save()
+        return session
+
+    @classmethod
+    def load(cls, upload_id, owner):
+        if not upload_id.isalnum():
+            raise UploadError("Unknown upload", status=404)
+        try:
+            with open(_state_path(upload_id), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown upload", status=404)
+        if not hmac.compare_digest(state["owner"], _owner_digest(owner)):
+            raise UploadError("Unknown upload", status=404)
+        return cls(state)
+
+    def _save(self):
+        tmp_path = f"{_state_path(self.upload_id)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, _state_path(self.upload_id))
+
+    @property
+    def complete(self):
+        return self.state["sha256"] is not None
+
+    def offset(self):
+        """Number of bytes received so far."""
+        if self.complete:
+            return self.size
+        try:
+            return os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+
+    def write_chunk(self, offset, length, stream):
+        """
+        Append `length` bytes read from `stream` at `offset` and return the new
+        offset. Completes the upload when the last byte has been written.
+        """
+        if self.complete:
+            raise UploadError("Upload already complete", status=409)
+        if length <= 0:
+            raise UploadError("Empty chunk")
+        if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadError("Chunk too large", status=413)
+        if offset + length > self.size:
+            raise UploadError("Chunk extends past the declared size", status=413)
+
+        with FileLock(self.part_path + ".lock"):
+            current = self.offset()
+            if offset != current:
+                raise UploadError(f"Expected offset {current}", status=409)
+
+            with open(self.part_path, "ab") as out:
+                hasher = self._catch_up_hasher(current)
+                written = 0
+                while written < length:
+                    block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    if current + written == 0:
+                        # Make sure the signature check sees enough bytes
+                        while len(block) < min(SNIFF_BYTES, length):
+                            more = stream.read(min(SNIFF_BYTES, length) - len(block))
+                            if not more:
+                                break
+                            block += more
+                        if sniff_container(block[:SNIFF_BYTES]) is None:
+                            self.abort()
+                            raise UploadError("File is not a supported video container", status=415)
+                    out.write(block)
+                    hasher.update(block)
+                    written += len(block)
+            with _hashers_lock:
+                _hashers[self.upload_id] = (hasher, current + written)
+
+            if written < length:
+                # Client disconnected mid-chunk; the bytes that arrived are kept for resuming
+                return current + written
+            if current + written == self.size:
+                self._finish(hasher)
+            return current + written
+
+    def _catch_up_hasher(self, offset):
+        """Hash state at `offset`, re-reading from disk whatever this process hasn't hashed."""
+        with _hashers_lock:
+            hasher, hashed = _hashers.pop(self.upload_id, (None, 0))
+        if hasher is None or hashed > offset:
+            hasher, hashed = hashlib.sha256(), 0
+        if hashed < offset:
+            with open(self.part_path, "rb") as f:
+                f.seek(hashed)
+                remaining = offset - hashed
+                while remaining:
+                    block = f.read(min(1024 * 1024, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        return hasher
+
+    def _finish(self, hasher):
+        os.replace(self.part_path, self.path)
+        self.state["sha256"] = hasher.hexdigest()
+        self._save()
+        with _hashers_lock:
+            _hashers.pop(self.upload_id, None)
+        try:
+            os.remove(self.part_path + ".lock")
+        except OSError:
+            pass
+
+    def abort(self):
+        for path in (self.part_path, self.part_path + ".lock", _state_path(self.upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with _hashers_lock:
+            _hashers.pop(self.upload_id, None)
+
+    def close(self):
+        """Forget a completed upload once its video has been handed to the analysis."""
+        try:
+            os.remove(_state_path(self.upload_id))
+        except OSError:
+            pass
+
+
+def cleanup_stale(max_age=None):
+    """Remove upload sessions (and their partial files) untouched for `max_age` seconds."""
+    max_age = settings.UPLOAD_SESSION_TTL_SECONDS if max_age is None else max_age
+    now = time.time()
+    # Sessions from before the state moved out of MEDIA_ROOT hold raw session keys
+    shutil.rmtree(_legacy_state_dir(), ignore_errors=True)
+    try:
+        names = os.listdir(_state_dir())
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(_state_dir(), name), "r", encoding="utf-8") as f:
+                session = UploadSession(json.load(f))
+            last_activity = max(os.path.getmtime(os.path.join(_state_dir(), name)),
+                                os.path.getmtime(session.part_path) if os.path.exists(session.part_path) else 0)
+        except (OSError, ValueError, KeyError):
+            continue
+        if now - last_activity > max_age:
+            if session.complete:
+                session.close()
+            else:
+                session.abort()
@@ -0,0 +1,29 @@
+"""project_settings URL Configuration
+"""
+from django.contrib import admin
+from django.urls import path, include
+from . import views
+from .views import about, index, predict_page,cuda_full
+
+app_name = 'ml_app'
+handler404 = views.handler404
+
+urlpatterns = [
+    path('', index, name='home'),
+    path('about/', about, name='about'),
+    path('predict/', predict_page, name='predict'),
+    path('upload/', views.upload_create, name='upload_create'),
+    path('upload/<str:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('jobs/stats/', views.job_queue_stats, name='job_stats'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('inference/stats/', views.inference_stats, name='inference_stats'),
+    path('storage/stats/', views.storage_stats, name='storage_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('demo/<str:key>/<str:name>', views.demo_artifact, name='demo_artifact'),
+    path('report/', views.report_page, name='report_page'),
+    path('report/download/', views.download_report, name='download_report'),
+    path('feedback/', views.feedback_page, name='feedback_page'),
+    path('feedback/submit/', views.submit_feedback, name='submit_feedback'),
+    path('stats/', views.stats_page, name='stats_page'),
+    path('cuda_full/',cuda_full,name='cuda_full'),
+]
@@ -0,0 +1,782 @@
+from django.shortcuts import render, redirect
+from django.contrib import messages
+import os
+import copy
+import hashlib
+import logging
+from datetime import datetime
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .forms import VideoUploadForm
+from .clips import predict_clips
+from .frame_sampling import DEFAULT_SEEK_THRESHOLD, sample_frames
+from . import demo_analysis, frame_pipeline, jobs, metrics, ml_stack, onnx_backend, storage
+from .audit_log import get_audit_log
+from .batching import infer, scheduler_stats
+from .checkpoints import compute_sha256, get_catalog
+from .demo_artifacts import artifact_key, get_demo_artifacts, is_valid
+from .detection_stats import get_detection_stats
+from .model_registry import get_registry
+from .preprocessing import PREPROCESSING_VERSION, FacePreprocessor, resize_into
+from .result_cache import get_result_cache, make_key
+from .uploads import SNIFF_BYTES, UploadError, UploadSession, sniff_container
+
+logger = logging.getLogger(__name__)
+
+# --------------------------- CONSTANTS ------------------------------ #
+index_template_name = 'index.html'
+predict_template_name = 'predict.html'
+about_template_name = "about.html"
+processing_template_name = "processing.html"
+
+# ---------------------- DATASET LOADER CLASS ------------------------ #
+# A map-style dataset by duck typing (__len__/__getitem__), so the class can be
+# defined without importing torch
+class validation_dataset:
+    def __init__(self, video_names, sequence_length=60, transform=None,
+                 detection_scale=1.0, detection_batch_size=8, detection_stride=1, detection_model="hog",
+                 sampling="first", pipeline_workers=0, pipeline_max_frames=16):
+        if ml_stack.get_torch() is None:
+            raise RuntimeError("ML dependencies (torch/torchvision) are not installed.")
+        self.video_names = video_names
+        # A per-frame `transform` overrides the batched FacePreprocessor
+        self.transform = transform
+        self.preprocess = FacePreprocessor(sequence_length) if transform is None else None
+        self.count = sequence_length
+        # Frame sampling strategy, see frame_sampling.STRATEGIES
+        self.sampling = sampling
+        # Face detection runs on frames downscaled by `detection_scale`, on every
+        # `detection_stride`-th frame, `detection_batch_size` frames at a time
+        self.detection_scale = detection_scale
+        self.detection_batch_size = detection_batch_size
+        self.detection_stride = detection_stride
+        self.detection_model = detection_model
+        # Decode, face detection and cropping overlap on `pipeline_workers` detection
+        # threads (0 = one after the other), see frame_pipeline.collect_faces
+        self.pipeline_workers = pipeline_workers
+        self.pipeline_max_frames = pipeline_max_frames
+
+    def __len__(self):
+        return len(self.video_names)
+
+    def __getitem__(self, idx):
+        video_path = self.video_names[idx]
+
+        # Each face is resized into the preprocessing buffer as soon as it is cropped
+        if self.preprocess is not None:
+            pixels = self.preprocess.buffer(self.count)
+            on_face = lambda i, face: resize_into(face, pixels[i])
+        else:
+            faces = []
+            on_face = lambda i, face: faces.append(self.transform(face))
+
+        found = frame_pipeline.collect_faces(
+            self.frame_extract(video_path),
+            self.count,
+            on_face,
+            detection={
+                "scale": self.detection_scale,
+                "batch_size": self.detection_batch_size,
+                "stride": self.detection_stride,
+                "model": self.detection_model,
+            },
+            workers=self.pipeline_workers,
+            max_in_flight=self.pipeline_max_frames,
+        )
+
+        with metrics.stage("transform"):
+            if self.preprocess is not None:
+                frames = self.preprocess.normalize(pixels[:found])
+            else:
+                frames = ml_stack.get_torch().stack(faces)
+        return frames.unsqueeze(0)
+
+    def frame_extract(self, path):
+        for _, image in sample_frames(path, self.count, self.sampling):
+            yield image
+
+
+# ---------------------- UTILITY FUNCTIONS --------------------------- #
+def predict(model, img):
+    torch = ml_stack.get_torch()
+    if torch is None:
+        raise RuntimeError("Cannot run prediction: 'torch' is not installed.")
+
+    with metrics.stage("forward"):
+        logits = torch.softmax(infer(model, img, ml_stack.get_device()), dim=1)
+    _, pred = torch.max(logits, 1)
+    confidence = float(logits[0][pred.item()] * 100)
+    return int(pred.item()), confidence
+
+
+def model_runtime():
+    """How videos are scored in this process: "torch", "onnx" or "demo" (MODEL_RUNTIME, with "auto" resolved)."""
+    runtime = settings.MODEL_RUNTIME
+    if runtime != "auto":
+        return runtime
+    if ml_stack.installed("torch") and ml_stack.installed("torchvision"):
+        return "torch"
+    if onnx_backend.available() and get_catalog().servable_sequence_lengths("onnx"):
+        return "onnx"
+    return "demo"
+
+
+def get_accurate_model(sequence_length, runtime="torch"):
+    catalog = get_catalog()
+
+    if not os.path.isdir(catalog.models_dir):
+        raise ValueError(f"❌ Models folder missing at: {catalog.models_dir}")
+
+    with metrics.stage("model_select"):
+        entry = catalog.best_for(sequence_length, runtime)
+    if entry is None:
+        raise ValueError(f"❌ No matching model found for sequence length {sequence_length}")
+
+    metrics.inc("deepfake_model_selections_total", model=entry["filename"], runtime=runtime)
+    logger.debug("Selected model %s", entry["path"])
+    return entry['path']
+
+
+def servable_sequence_lengths():
+    """Sequence lengths that have a model, or None when any length is accepted (demo mode)."""
+    runtime = model_runtime()
+    if runtime == "demo":
+        return None
+    return get_catalog().servable_sequence_lengths(runtime)
+
+
+def allowed_video_file(filename):
+    return filename.split('.')[-1].lower() in ['mp4','gif','webm','avi','3gp','wmv','flv','mkv']
+
+
+def _append_jsonl(path, payload):
+    """Append a JSON payload to a rotating newline-delimited JSON audit log."""
+    get_audit_log(path).append(payload)
+
+
+def _get_detection_stats():
+    """Live statistics from detection logs for dashboard."""
+    return get_detection_stats().snapshot()
+
+
+def generate_demo_frames(video_path, num_frames=6, video_hash=None):
+    """
+    Analyse video characteristics using multiple features for deepfake detection.
+    Preview and cropped frame images are kept per video in the demo artifact store
+    when DEMO_RENDER_IMAGES is on; a re-upload reuses them without re-encoding.
+    Returns lists of URLs of the demo images and a prediction.
+    """
+    preprocessed_images = []
+    faces_cropped_images = []
+    try:
+        names = key = store = None
+        if settings.DEMO_RENDER_IMAGES:
+            store = get_demo_artifacts()
+            key = artifact_key(video_hash or compute_sha256(video_path),
+                               settings.DEMO_FRAME_SAMPLING_STRATEGY, num_frames)
+            names = store.get(key)
+            metrics.cache_lookup("demo_artifacts", names is not None)
+
+        with metrics.stage("heuristic"):
+            analysis = demo_analysis.analyze(
+                video_path, num_frames,
+                strategy=settings.DEMO_FRAME_SAMPLING_STRATEGY,
+                working_width=settings.DEMO_ANALYSIS_WIDTH,
+                keep_frames=store is not None and names is None,
+            )
+        if store is not None:
+            if names is None:
+                with metrics.stage("jpeg"):
+                    images = demo_analysis.render_images(analysis["frames"])
+                names = store.put(key, images, video_path, analysis["frame_indices"])
+            for name in names:
+                url = reverse("ml_app:demo_artifact", args=[key, name])
+                (preprocessed_images if name.startswith("demo_frame_") else faces_cropped_images).append(url)
+        return preprocessed_images, faces_cropped_images, analysis["is_fake"], analysis["confidence"]
+    except Exception as e:
+        logger.warning("Error generating demo frames: %s", e)
+        return preprocessed_images, faces_cropped_images, False, 50.0
+
+
+def _save_upload(upload, path):
+    """
+    Write an uploaded file to disk and return the sha256 of its content.
+    Raises UploadError (and writes nothing) if it doesn't start like a video container.
+    """
+    chunks = upload.chunks()
+    first = next(chunks, b"")
+    if sniff_container(first[:SNIFF_BYTES]) is None:
+        raise UploadError("File is not a supported video container", status=415)
+    digest = hashlib.sha256(first)
+    with open(path, 'wb') as out:
+        out.write(first)
+        for chunk in chunks:
+            digest.update(chunk)
+            out.write(chunk)
+    metrics.inc("deepfake_upload_bytes_total", upload.size, method="form")
+    return digest.hexdigest()
+
+
+def _analysis_cache_key(video_hash, seq_len):
+    """Result cache key: content hash + checkpoint + sequence length + backend + analysis settings."""
+    runtime = model_runtime()
+    if runtime == "demo":
+        model_id = "demo"
+        config = (settings.DEMO_FRAME_SAMPLING_STRATEGY, settings.DEMO_ANALYSIS_WIDTH)
+    else:
+        entry = get_catalog().best_for(seq_len, runtime)
+        if entry is None:
+            return None
+        model_id = entry["sha256"]
+        # The lookup of inference_backends.backend_for, which would import torch: int8 and bf16
+        # backends change the confidences, so their verdicts are cached apart from the eager model's
+        backend = (
+            settings.INFERENCE_BACKEND_OVERRIDES.get(entry["filename"], settings.INFERENCE_BACKEND)
+            if runtime == "torch" else runtime
+        )
+        config = (
+            backend, PREPROCESSING_VERSION,
+            settings.FRAME_SAMPLING_STRATEGY, settings.MULTI_CLIP_COUNT, settings.MULTI_CLIP_AGGREGATION,
+            settings.FACE_DETECTION_SCALE, settings.FACE_DETECTION_STRIDE, settings.FACE_DETECTION_MODEL,
+        )
+    return make_key(video_hash, model_id, seq_len, *config)
+
+
+def _cached_analysis(video_hash, seq_len, count=False):
+    """Return the cached analysis of identical content, or None. `count` records the lookup in the metrics."""
+    cache = get_result_cache()
+    if cache is None or not video_hash:
+        return None
+    key = _analysis_cache_key(video_hash, seq_len)
+    cached = cache.get(key) if key else None
+    if count:
+        metrics.cache_lookup("result", cached is not None)
+    return cached
+
+
+def _reuse_analysis(cached, video):
+    """Adapt a cached analysis to a new upload of the same content."""
+    analysis = copy.deepcopy(cached)
+    analysis.pop("video_path", None)
+    video_filename = os.path.basename(video)
+    analysis["last_result"].update(
+        video=video_filename,
+        timestamp=datetime.utcnow().isoformat() + "Z",
+        cached=True,
+    )
+    analysis["context"].update(video_name=video_filename, original_video=video_filename)
+    return analysis
+
+
+def _log_detection(last_result):
+    metrics.inc("deepfake_analyses_total", mode=last_result.get("runtime", last_result["mode"]),
+                verdict=last_result["verdict"], cached="true" if last_result.get("cached") else "false")
+    log_path = os.path.join(settings.PROJECT_DIR, "logs", "detections.jsonl")
+    _append_jsonl(log_path, last_result)
+    get_detection_stats().refresh()
+
+
+def analyze_video(video, seq_len, video_hash=None):
+    """
+    Run the full analysis of a saved video and log the verdict.
+    Returns a JSON-serialisable dict with the `last_result` kept in the session,
+    the predict page `context` and an optional info `message`.
+    Raises ValueError when no model matches the sequence length.
+    """
+    storage.touch(video)
+    cached = _cached_analysis(video_hash, seq_len)
+    if cached is not None:
+        analysis = _reuse_analysis(cached, video)
+        _log_detection(analysis["last_result"])
+        return analysis
+
+    video_filename = os.path.basename(video)
+    runtime = model_runtime()
+
+    # If ML libs are missing, use intelligent demo mode
+    if runtime == "demo":
+        # Generate frames and analyze video for deepfake indicators
+        preprocessed_images, faces_cropped_images, is_fake, confidence = generate_demo_frames(video, num_frames=6, video_hash=video_hash)
+
+        result = "FAKE" if is_fake else "REAL"
+
+        last_result = {
+            "video": video_filename,
+            "verdict": result,
+            "confidence": round(confidence, 1),
+            "mode": "demo",
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+        context = {
+            "output": result,
+            "confidence": round(confidence, 1),
+            "video_name": video_filename,
+            "preprocessed_images": preprocessed_images,
+            "faces_cropped_images": faces_cropped_images,
+            "original_video": video_filename,
+            "is_demo": True,
+        }
+        message = f"Demo mode: Video analyzed as {result} with {confidence:.1f}% confidence."
+    else:
+        model_path = get_accurate_model(seq_len, runtime)
+        onnx = runtime == "onnx"
+        # ONNX Runtime sessions always run on the CPU; looking up the device would import torch
+        device = None if onnx else ml_stack.get_device()
+        model = get_registry(runtime).get(model_path, device)
+        detection = {
+            "scale": settings.FACE_DETECTION_SCALE,
+            "batch_size": settings.FACE_DETECTION_BATCH_SIZE,
+            "stride": settings.FACE_DETECTION_STRIDE,
+            "model": settings.FACE_DETECTION_MODEL,
+        }
+        timeline = []
+
+        if settings.MULTI_CLIP_COUNT > 1:
+            # Score several windows spread over the whole video
+            clip_result = predict_clips(
+                model, video, seq_len, FacePreprocessor(seq_len, backend="numpy" if onnx else "torch"), device,
+                num_clips=settings.MULTI_CLIP_COUNT,
+                batch_size=settings.MULTI_CLIP_BATCH_SIZE,
+                aggregation=settings.MULTI_CLIP_AGGREGATION,
+                detection=detection,
+                seek_threshold=DEFAULT_SEEK_THRESHOLD,
+                score_batch=model if onnx else None,
+            )
+            label, conf, timeline = clip_result["label"], clip_result["confidence"], clip_result["clips"]
+        elif onnx:
+            faces = onnx_backend.read_faces(video, seq_len, settings.FRAME_SAMPLING_STRATEGY, detection)
+            label, conf = onnx_backend.predict(model, faces)
+        else:
+            dataset = validation_dataset(
+                [video], seq_len,
+                detection_scale=settings.FACE_DETECTION_SCALE,
+                detection_batch_size=settings.FACE_DETECTION_BATCH_SIZE,
+                detection_stride=settings.FACE_DETECTION_STRIDE,
+                detection_model=settings.FACE_DETECTION_MODEL,
+                sampling=settings.FRAME_SAMPLING_STRATEGY,
+                pipeline_workers=settings.FACE_PIPELINE_WORKERS,
+                pipeline_max_frames=settings.FACE_PIPELINE_MAX_FRAMES,
+            )
+            label, conf = predict(model, dataset[0])
+
+        result = "REAL" if label == 1 else "FAKE"
+
+        last_result = {
+            "video": video_filename,
+            "verdict": result,
+            "confidence": round(conf, 2),
+            "mode": "ml",
+            "runtime": runtime,
+            "model_path": os.path.basename(model_path),
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+        if timeline:
+            last_result["clips"] = len(timeline)
+            last_result["aggregation"] = settings.MULTI_CLIP_AGGREGATION
+        context = {
+            "output": result,
+            "confidence": round(conf, 2),
+            "video_name": video_filename,
+            "original_video": video_filename,
+            "preprocessed_images": [],
+            "faces_cropped_images": [],
+            "timeline": timeline,
+            "is_demo": False,
+        }
+        message = None
+
+    _log_detection(last_result)
+    analysis = {"last_result": last_result, "context": context, "message": message}
+
+    cache = get_result_cache()
+    key = _analysis_cache_key(video_hash, seq_len) if cache is not None and video_hash else None
+    if key:
+        cache.set(key, dict(analysis, video_path=video))
+
+    return analysis
+
+
+def _render_analysis(request, analysis):
+    """Render a finished analysis and persist it for report download."""
+    if analysis.get("message"):
+        messages.info(request, analysis["message"])
+    request.session["last_result"] = analysis["last_result"]
+    return render(request, predict_template_name, dict(analysis["context"], MEDIA_URL=settings.MEDIA_URL))
+
+
+# ---------------------------- VIEWS --------------------------------- #
+def _start_analysis(request, save_path, seq_len, video_hash):
+    """
+    Hand a saved upload to the analysis: reuse a cached verdict or queue a job.
+    Returns an error message for the user, or None on success.
+    """
+    request.session["video_hash"] = video_hash
+
+    cached = _cached_analysis(video_hash, seq_len, count=True)
+    if cached is not None:
+        # Same content was analysed before: reuse the verdict (and the stored file)
+        original = cached.get("video_path")
+        if (settings.RESULT_CACHE_DEDUPE_UPLOADS and original and original != save_path
+                and os.path.exists(original)):
+            storage.discard(save_path)
+            save_path = original
+            storage.touch(original)
+        analysis = _reuse_analysis(cached, save_path)
+        _log_detection(analysis["last_result"])
+        request.session["cached_analysis"] = analysis
+    elif settings.ANALYSIS_ASYNC:
+        try:
+            request.session["job_id"] = jobs.enqueue(save_path, seq_len, video_hash)
+        except jobs.QueueFullError as e:
+            storage.discard(save_path)
+            return f"{e}. Please try again in a few minutes."
+        jobs.start_workers(analyze_video)
+
+    request.session["file_name"] = save_path
+    request.session["sequence_length"] = seq_len
+    return None
+
+
+def _reset_analysis_session(request):
+    for key in ("file_name", "sequence_length", "job_id", "video_hash", "cached_analysis"):
+        request.session.pop(key, None)
+
+
+def index(request):
+    if request.method == "GET":
+        form = VideoUploadForm()
+        _reset_analysis_session(request)
+
+        # Get stats from audit logs
+        stats = _get_detection_stats()
+        
+        return render(request, index_template_name, {"form": form, "stats": stats})
+
+    # Reject oversized uploads before Django reads the body
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > settings.MAX_UPLOAD_SIZE:
+        form = VideoUploadForm()
+        form.add_error(None, f"Video is larger than {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB")
+        return render(request, index_template_name, {"form": form}, status=413)
+
+    form = VideoUploadForm(request.POST, request.FILES, sequence_lengths=servable_sequence_lengths())
+
+    if form.is_valid():
+        video = form.cleaned_data['upload_video_file']
+        seq_len = form.cleaned_data['sequence_length']
+
+        if not allowed_video_file(video.name):
+            form.add_error("upload_video_file", "Unsupported video type")
+            return render(request, index_template_name, {"form": form})
+
+        save_path = storage.new_upload_path(video.name.split('.')[-1])
+
+        try:
+            video_hash = _save_upload(video, save_path)
+        except UploadError as e:
+            form.add_error("upload_video_file", str(e))
+            return render(request, index_template_name, {"form": form})
+        storage.register(save_path, video_hash)
+
+        error = _start_analysis(request, save_path, seq_len, video_hash)
+        if error:
+            form.add_error(None, error)
+            return render(request, index_template_name, {"form": form})
+        return redirect('ml_app:predict')
+
+    return render(request, index_template_name, {"form": form})
+
+
+def _upload_owner(request):
+    if request.session.session_key is None:
+        request.session.save()
+    return request.session.session_key
+
+
+@require_POST
+def upload_create(request):
+    """Start a chunked upload; expects `filename`, `size` and `sequence_length`."""
+    form = VideoUploadForm(
+        {"sequence_length": request.POST.get("sequence_length")},
+        sequence_lengths=servable_sequence_lengths(),
+    )
+    form.fields["upload_video_file"].required = False
+    filename = request.POST.get("filename", "")
+    if not form.is_valid():
+        errors = [e for field_errors in form.errors.values() for e in field_errors]
+        return JsonResponse({"error": " ".join(errors)}, status=400)
+    if not allowed_video_file(filename):
+        return JsonResponse({"error": "Unsupported video type"}, status=400)
+    try:
+        size = int(request.POST.get("size", ""))
+        upload = UploadSession.create(filename, size, form.cleaned_data["sequence_length"], _upload_owner(request))
+    except ValueError:
+        return JsonResponse({"error": "Missing upload size"}, status=400)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse({
+        "upload_id": upload.upload_id,
+        "offset": 0,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+        "url": reverse("ml_app:upload_chunk", args=[upload.upload_id]),
+    }, status=201)
+
+
+def upload_chunk(request, upload_id):
+    """
+    GET reports how many bytes of the upload have arrived (to resume);
+    PUT appends the request body at the `Upload-Offset` header.
+    """
+    try:
+        upload = UploadSession.load(upload_id, _upload_owner(request))
+        if request.method == "GET":
+            return JsonResponse({"offset": upload.offset(), "size": upload.size, "complete": upload.complete})
+        if request.method != "PUT":
+            return HttpResponse(status=405)
+
+        offset = int(request.headers.get("Upload-Offset", "-1"))
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        # Read straight from the request stream so the chunk is never buffered whole
+        new_offset = upload.write_chunk(offset, length, request)
+        metrics.inc("deepfake_upload_bytes_total", new_offset - offset, method="chunked")
+    except ValueError:
+        return JsonResponse({"error": "Invalid Upload-Offset or Content-Length"}, status=400)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    if not upload.complete:
+        return JsonResponse({"offset": new_offset, "complete": False})
+
+    _reset_analysis_session(request)
+    storage.register(upload.path, upload.state["sha256"])
+    error = _start_analysis(request, upload.path, upload.state["sequence_length"], upload.state["sha256"])
+    upload.close()
+    if error:
+        return JsonResponse({"error": error}, status=503)
+    return JsonResponse({"offset": new_offset, "complete": True, "redirect": reverse("ml_app:predict")})
+
+
+def predict_page(request):
+    if 'file_name' not in request.session:
+        return redirect("ml_app:home")
+
+    video = request.session["file_name"]
+    seq_len = request.session["sequence_length"]
+    video_hash = request.session.get("video_hash")
+    storage.touch(video)
+
+    if request.session.get("cached_analysis"):
+        return _render_analysis(request, request.session["cached_analysis"])
+
+    if not settings.ANALYSIS_ASYNC:
+        try:
+            analysis = analyze_video(video, seq_len, video_hash)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect("ml_app:home")
+        return _render_analysis(request, analysis)
+
+    job = jobs.get_job(request.session.get("job_id", ""))
+    if job is None:
+        # The job was purged or the upload predates the queue; analyse it again
+        try:
+            request.session["job_id"] = jobs.enqueue(video, seq_len, video_hash)
+        except jobs.QueueFullError as e:
+            messages.error(request, f"{e}. Please try again in a few minutes.")
+            return redirect("ml_app:home")
+        job = jobs.get_job(request.session["job_id"])
+    jobs.start_workers(analyze_video)
+
+    if job["status"] == jobs.DONE:
+        return _render_analysis(request, job["result"])
+
+    if job["status"] == jobs.FAILED:
+        request.session.pop("job_id", None)
+        messages.error(request, job["error"])
+        return redirect("ml_app:home")
+
+    return render(request, processing_template_name, {
+        "job_id": job["id"],
+        "status": job["status"],
+        "position": jobs.queue_position(job),
+        "poll_interval_ms": int(settings.JOB_POLL_INTERVAL_SECONDS * 1000),
+    })
+
+
+def job_status(request, job_id):
+    """JSON status of an analysis job, polled by the processing page."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return JsonResponse({"error": "Unknown job"}, status=404)
+    return JsonResponse({
+        "id": job["id"],
+        "status": job["status"],
+        "position": jobs.queue_position(job),
+        "error": job["error"],
+    })
+
+
+def job_queue_stats(request):
+    """JSON queue depth and timing metrics for monitoring."""
+    return JsonResponse(jobs.queue_stats())
+
+
+def storage_stats(request):
+    """JSON disk usage of uploaded videos against the configured quota."""
+    return JsonResponse(storage.usage())
+
+
+def inference_stats(request):
+    """JSON micro-batching metrics, frame pipeline stage utilisation and model backends of this process."""
+    runtime = model_runtime()
+    if runtime == "demo":
+        return JsonResponse({"enabled": False, "runtime": runtime})
+    backends = get_registry(runtime).backends()
+    pipeline = frame_pipeline.stats()
+    # ONNX Runtime sessions are called directly, without the micro-batching scheduler
+    if runtime == "onnx" or not settings.INFERENCE_BATCHING:
+        return JsonResponse({"enabled": False, "runtime": runtime, "backends": backends, "frame_pipeline": pipeline})
+    return JsonResponse(dict(scheduler_stats(), enabled=True, runtime=runtime, backends=backends,
+                             frame_pipeline=pipeline))
+
+
+def metrics_view(request):
+    """Prometheus metrics of this process: stage timings, model loads, cache hit rates, upload bytes."""
+    if not metrics.enabled():
+        raise Http404("Metrics are disabled")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def demo_artifact(request, key, name):
+    """Serve one demo preview image; content-addressed, so it can be cached forever."""
+    if not is_valid(key, name):
+        raise Http404("Unknown demo image")
+    found = get_demo_artifacts().open(key, name)
+    if found is None:
+        raise Http404("Demo image expired")
+    path, data = found
+    response = FileResponse(open(path, "rb"), content_type="image/jpeg") if path else HttpResponse(data, content_type="image/jpeg")
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+def download_report(request):
+    """Download the last detection result as formatted TEXT for easy reading."""
+    last = request.session.get("last_result")
+    if not last:
+        messages.error(request, "No recent analysis found. Please analyze a video first.")
+        return redirect("ml_app:home")
+
+    # Format as readable text report
+    report_text = f"""DEEPFAKE DETECTION ANALYSIS REPORT
+=====================================
+
+Video File: {last.get('video', 'Unknown')}
+Analysis Date: {last.get('timestamp', 'N/A')}
+
+DETECTION RESULT:
+-----------------
+Verdict: {last.get('verdict', 'Unknown')}
+Confidence: {last.get('confidence', 'N/A')}%
+
+ANALYSIS MODE:
+-----------------
+Mode: {last.get('mode', 'Unknown')}
+Model: {last.get('model_path', 'Demo Frame Analysis')}
+
+INTERPRETATION:
+-----------------
+"""
+    if last.get('verdict') == 'REAL':
+        report_text += "This video appears to be AUTHENTIC.\nNo significant AI generation artifacts were detected.\n"
+    else:
+        report_text += "This video appears to be AI-GENERATED or MANIPULATED.\nThe analysis detected characteristics consistent with deepfake techniques.\n"
+    
+    report_text += f"\nConfidence Level: {last.get('confidence', 'N/A')}%\n"
+    report_text += "\n(Higher confidence = stronger evidence for the verdict)\n"
+    report_text += "\n" + "="*50 + "\n"
+    report_text += "Report Generated: " + datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC") + "\n"
+
+    filename = f"report_{last.get('video','video').split('.')[0]}.txt"
+    response = HttpResponse(report_text, content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def report_page(request):
+    """Dedicated page for viewing and downloading analysis report."""
+    last = request.session.get("last_result")
+    if not last:
+        messages.warning(request, "No recent analysis. Please analyze a video first.")
+        return redirect("ml_app:predict")
+    
+    return render(request, "report.html", {
+        "last_result": last,
+        "verdict": last.get("verdict"),
+        "confidence": last.get("confidence"),
+        "video": last.get("video"),
+        "timestamp": last.get("timestamp"),
+        "mode": last.get("mode")
+    })
+
+
+def feedback_page(request):
+    """Dedicated page for submitting feedback."""
+    last = request.session.get("last_result")
+    if not last:
+        messages.warning(request, "No recent analysis. Please analyze a video first.")
+        return redirect("ml_app:predict")
+    
+    return render(request, "feedback.html", {
+        "verdict": last.get("verdict"),
+        "confidence": last.get("confidence"),
+        "video": last.get("video")
+    })
+
+
+def stats_page(request):
+    """Display live statistics and leaderboard of detections."""
+    stats = _get_detection_stats()
+    return render(request, "stats.html", {"stats": stats})
+
+
+@require_POST
+def submit_feedback(request):
+    """Capture user feedback for auditing and future model improvements."""
+    feedback = (request.POST.get("feedback") or "").strip()
+    verdict = request.POST.get("verdict") or ""
+    video_name = request.POST.get("video_name") or ""
+    confidence = request.POST.get("confidence") or ""
+
+    if not feedback:
+        messages.error(request, "Please add some feedback before submitting.")
+        return redirect("ml_app:predict")
+
+    entry = {
+        "video": video_name,
+        "verdict": verdict,
+        "confidence": confidence,
+        "feedback": feedback,
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    }
+    log_path = os.path.join(settings.PROJECT_DIR, "logs", "feedback.jsonl")
+    _append_jsonl(log_path, entry)
+    messages.success(request, "Feedback received. Thanks for helping improve the detector!")
+    return redirect("ml_app:predict")
+
+
+def about(request):
+    return render(request, about_template_name)
+
+
+def handler404(request, exception):
+    return render(request, '404.html', status=404)
+
+
+def cuda_full(request):
+    return render(request, 'cuda_full.html')
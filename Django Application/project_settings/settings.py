@@ -0,0 +1,310 @@
+"""
+Django settings for project_settings project.
+"""
+
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Build paths inside the project like this: os.path.join(PROJECT_DIR, ...)
+PROJECT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('SECRET_KEY', '@)0qp0!&-vht7k0wyuihr+nk-b8zrvb5j^1d@vl84cd1%)f=dz')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = os.environ.get('DEBUG', 'True') == 'True'
+
+# Change and set this to correct IP/Domain
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',') if os.environ.get('ALLOWED_HOSTS') else ["*"]
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'ml_app.apps.MlAppConfig'
+]
+
+MIDDLEWARE = [
+    'ml_app.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# WhiteNoise configuration for serving static files
+STORAGES = {
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+ROOT_URLCONF = 'project_settings.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(PROJECT_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.messages.context_processors.messages',
+                'django.template.context_processors.media'
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'project_settings.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/3.0/ref/settings/#databases
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(PROJECT_DIR, 'db.sqlite3'),
+    }
+}
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/3.0/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = False
+
+USE_L10N = False
+
+USE_TZ = False
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/3.0/howto/static-files/
+
+#used in production to serve static files
+STATIC_ROOT = os.path.join(PROJECT_DIR, 'staticfiles')
+
+#url for static files
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [
+    os.path.join(PROJECT_DIR, 'uploaded_images'),
+    os.path.join(PROJECT_DIR, 'static'),
+]
+
+
+CONTENT_TYPES = ['video']
+
+# Largest accepted video, enforced for both the form post and chunked uploads
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(500 * 1024 * 1024)))
+
+# Uploaded videos are indexed in UPLOAD_INDEX_PATH and swept when they exceed UPLOAD_QUOTA_BYTES
+# or haven't been used for UPLOAD_TTL_SECONDS (0 disables either limit). Videos of queued or
+# running jobs, and of sessions that used them within UPLOAD_ACTIVE_SESSION_SECONDS, are kept
+UPLOAD_INDEX_PATH = os.environ.get('UPLOAD_INDEX_PATH', os.path.join(PROJECT_DIR, 'logs', 'uploads.sqlite3'))
+UPLOAD_QUOTA_BYTES = int(os.environ.get('UPLOAD_QUOTA_BYTES', str(10 * 1024 * 1024 * 1024)))
+UPLOAD_TTL_SECONDS = int(os.environ.get('UPLOAD_TTL_SECONDS', str(3 * 24 * 3600)))
+UPLOAD_ACTIVE_SESSION_SECONDS = int(os.environ.get('UPLOAD_ACTIVE_SESSION_SECONDS', '3600'))
+
+# Chunked uploads (POST /upload/, then PUT /upload/<id>/ per chunk): the chunk size the
+# browser is told to use, the largest chunk accepted, and how long an unfinished upload
+# is kept for resuming
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get('UPLOAD_MAX_CHUNK_SIZE', str(16 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', str(24 * 3600)))
+
+MEDIA_URL = "/media/"
+
+MEDIA_ROOT = os.path.join(PROJECT_DIR, 'uploaded_videos')
+
+# Run video analysis in background worker threads; the predict page polls for the result
+ANALYSIS_ASYNC = os.environ.get('ANALYSIS_ASYNC', 'True') == 'True'
+
+# SQLite file holding the analysis job table (shared by all worker processes)
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(PROJECT_DIR, 'logs', 'jobs.sqlite3'))
+
+# Analysis threads per worker process
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '1'))
+
+# Uploads are refused once this many jobs are waiting (0 = unlimited)
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get('JOB_QUEUE_MAX_DEPTH', '50'))
+
+# How often idle workers check for new jobs and the browser polls job status
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', '2'))
+
+# Running jobs older than this are marked as failed (0 = never)
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', '1800'))
+
+# Finished jobs are deleted from the job table after this many seconds
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Cache of analysis results keyed by uploaded content, checkpoint and settings, so an
+# identical re-upload reuses the earlier verdict; with RESULT_CACHE_DEDUPE_UPLOADS the
+# second copy of the video is deleted and the first one is reused
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True') == 'True'
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', os.path.join(PROJECT_DIR, 'cache', 'results'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+RESULT_CACHE_DEDUPE_UPLOADS = os.environ.get('RESULT_CACHE_DEDUPE_UPLOADS', 'True') == 'True'
+
+# Audit logs (logs/detections.jsonl, logs/feedback.jsonl) are rotated once they reach
+# AUDIT_LOG_MAX_BYTES or, when AUDIT_LOG_ROTATE_SECONDS is set, at the start of each period.
+# Rotated segments are gzipped and the newest AUDIT_LOG_BACKUP_COUNT kept (0 keeps all)
+AUDIT_LOG_MAX_BYTES = int(os.environ.get('AUDIT_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+AUDIT_LOG_ROTATE_SECONDS = int(os.environ.get('AUDIT_LOG_ROTATE_SECONDS', str(24 * 3600)))
+AUDIT_LOG_COMPRESS = os.environ.get('AUDIT_LOG_COMPRESS', 'True') == 'True'
+AUDIT_LOG_BACKUP_COUNT = int(os.environ.get('AUDIT_LOG_BACKUP_COUNT', '0'))
+
+# Entries are written through when AUDIT_LOG_BUFFER_SIZE is 0 or 1; larger values batch
+# that many entries (or AUDIT_LOG_FLUSH_SECONDS worth) into one write
+AUDIT_LOG_BUFFER_SIZE = int(os.environ.get('AUDIT_LOG_BUFFER_SIZE', '0'))
+AUDIT_LOG_FLUSH_SECONDS = float(os.environ.get('AUDIT_LOG_FLUSH_SECONDS', '1.0'))
+
+# Directory holding the trained `model_<acc>_acc_<seq>_frames_*.pt` checkpoints
+MODELS_DIR = os.environ.get('MODELS_DIR', os.path.join(BASE_DIR, 'ml_app', 'ml_models'))
+
+# sync_models.py manifest; expected sha256 values in it are verified by the checkpoint catalog
+MODEL_MANIFEST_PATH = os.path.join(PROJECT_DIR, 'model_manifest.json')
+
+# Seconds between full re-scans of MODELS_DIR (directory changes are picked up immediately)
+CHECKPOINT_CATALOG_REFRESH_SECONDS = int(os.environ.get('CHECKPOINT_CATALOG_REFRESH_SECONDS', '60'))
+
+# Frame sampling (see ml_app/frame_sampling.py): "first", "stride", "uniform" or "keyframe".
+# The model was trained on consecutive frames, so the model path defaults to "first".
+FRAME_SAMPLING_STRATEGY = os.environ.get('FRAME_SAMPLING_STRATEGY', 'first')
+DEMO_FRAME_SAMPLING_STRATEGY = os.environ.get('DEMO_FRAME_SAMPLING_STRATEGY', 'keyframe')
+
+# Demo mode: frames are downscaled to DEMO_ANALYSIS_WIDTH pixels wide before the heuristic
+# features are computed (0 keeps the full resolution). Downscaling is much cheaper but lowers
+# the Laplacian statistics the score thresholds were calibrated on, so verdicts can change.
+# DEMO_RENDER_IMAGES=False skips writing the preview frame images entirely
+DEMO_ANALYSIS_WIDTH = int(os.environ.get('DEMO_ANALYSIS_WIDTH', '0'))
+DEMO_RENDER_IMAGES = os.environ.get('DEMO_RENDER_IMAGES', 'True') == 'True'
+
+# Demo preview images are stored per analysis, keyed by the video's content hash.
+# With DEMO_ARTIFACTS_PERSIST=False they are only kept in memory (up to
+# DEMO_ARTIFACTS_MAX_BYTES per process) and re-rendered from the video when missing
+DEMO_ARTIFACTS_DIR = os.environ.get('DEMO_ARTIFACTS_DIR', os.path.join(PROJECT_DIR, 'cache', 'demo'))
+DEMO_ARTIFACTS_PERSIST = os.environ.get('DEMO_ARTIFACTS_PERSIST', 'True') == 'True'
+DEMO_ARTIFACTS_MAX_BYTES = int(os.environ.get('DEMO_ARTIFACTS_MAX_BYTES', str(200 * 1024 * 1024)))
+DEMO_ARTIFACTS_TTL_SECONDS = int(os.environ.get('DEMO_ARTIFACTS_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# Micro-batching: concurrent analyses in one process share forward passes. The scheduler
+# waits up to INFERENCE_BATCH_WINDOW_MS for up to INFERENCE_MAX_BATCH_SIZE clips. Off by
+# default: it only pays off with several analysis threads per process (JOB_WORKER_CONCURRENCY
+# above 1); with one, every forward pass would just wait out the window alone.
+INFERENCE_BATCHING = os.environ.get('INFERENCE_BATCHING', 'False') == 'True'
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get('INFERENCE_BATCH_WINDOW_MS', '20'))
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', '8'))
+
+# Multi-clip inference: score MULTI_CLIP_COUNT windows of `sequence_length` frames spread
+# over the whole video (1 = only the first window) and combine them with "mean", "max" or
+# "attention"; MULTI_CLIP_BATCH_SIZE clips go through the model per forward pass
+MULTI_CLIP_COUNT = int(os.environ.get('MULTI_CLIP_COUNT', '1'))
+MULTI_CLIP_AGGREGATION = os.environ.get('MULTI_CLIP_AGGREGATION', 'mean')
+MULTI_CLIP_BATCH_SIZE = int(os.environ.get('MULTI_CLIP_BATCH_SIZE', '4'))
+
+# Face detection on served videos: frames are downscaled by FACE_DETECTION_SCALE before
+# detection, only every FACE_DETECTION_STRIDE-th frame is searched (boxes in between are
+# interpolated) and FACE_DETECTION_MODEL is "hog" (CPU) or "cnn" (batched, best on GPU).
+# A scale below 1.0 (e.g. 0.5) is much faster but can miss small or distant faces
+FACE_DETECTION_SCALE = float(os.environ.get('FACE_DETECTION_SCALE', '1.0'))
+FACE_DETECTION_STRIDE = int(os.environ.get('FACE_DETECTION_STRIDE', '1'))
+FACE_DETECTION_BATCH_SIZE = int(os.environ.get('FACE_DETECTION_BATCH_SIZE', '8'))
+FACE_DETECTION_MODEL = os.environ.get('FACE_DETECTION_MODEL', 'hog')
+
+# Decoding, face detection and cropping of a clip's frames can overlap (see ml_app/frame_pipeline.py):
+# FACE_PIPELINE_WORKERS threads search the frames a decoder thread reads, with at most
+# FACE_PIPELINE_MAX_FRAMES frames decoded and not yet cropped. 0 runs the steps one after the
+# other; whether threads help depends on the detector releasing the GIL, so measure before enabling
+FACE_PIPELINE_WORKERS = int(os.environ.get('FACE_PIPELINE_WORKERS', '0'))
+FACE_PIPELINE_MAX_FRAMES = int(os.environ.get('FACE_PIPELINE_MAX_FRAMES', '16'))
+
+# Maximum number of model checkpoints kept loaded in memory per worker process
+MODEL_REGISTRY_MAX_MODELS = int(os.environ.get('MODEL_REGISTRY_MAX_MODELS', '2'))
+
+# Inference backend of the served model (see ml_app/inference_backends.py): "eager" or a
+# "+"-joined combination of trace/script, channels_last, bf16 and int8, e.g. "channels_last+int8+trace".
+# INFERENCE_BACKEND_OVERRIDES sets it per checkpoint: "model_a.pt=int8+trace,model_b.pt=eager"
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager')
+INFERENCE_BACKEND_OVERRIDES = dict(
+    item.strip().split('=', 1) for item in os.environ.get('INFERENCE_BACKEND_OVERRIDES', '').split(',') if '=' in item
+)
+
+# A converted model is only served if its softmax outputs stay within INFERENCE_BACKEND_MAX_DELTA
+# of the eager model on the validation clips (validation_clips_<seq>.pt in INFERENCE_VALIDATION_DIR,
+# kept out of MODELS_DIR so the checkpoint catalog does not index them)
+INFERENCE_BACKEND_MAX_DELTA = float(os.environ.get('INFERENCE_BACKEND_MAX_DELTA', '0.02'))
+INFERENCE_VALIDATION_DIR = os.environ.get('INFERENCE_VALIDATION_DIR', os.path.join(PROJECT_DIR, 'cache', 'validation'))
+
+# Per-stage timings and counters, served in the Prometheus format at /metrics (keep that path
+# internal, e.g. by not proxying it in nginx). METRICS_SERVER_TIMING adds a Server-Timing
+# header with the stage durations of each request
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', 'False') == 'True'
+
+# How videos are scored: "torch", "onnx" (the exports written by `manage.py export_onnx`, run with
+# onnxruntime and no torch), "demo" (heuristics) or "auto": torch if installed, else onnx if
+# onnxruntime and exports are available, else demo
+MODEL_RUNTIME = os.environ.get('MODEL_RUNTIME', 'auto')
+
+# Threads per ONNX Runtime forward pass (0 = all cores; use cores / gunicorn workers when running
+# several) and for running independent graph nodes in parallel
+ONNX_INTRA_OP_THREADS = int(os.environ.get('ONNX_INTRA_OP_THREADS', '0'))
+ONNX_INTER_OP_THREADS = int(os.environ.get('ONNX_INTER_OP_THREADS', '1'))
+
+# An ONNX export is only kept if its softmax outputs stay within ONNX_PARITY_MAX_DELTA of the torch model
+ONNX_PARITY_MAX_DELTA = float(os.environ.get('ONNX_PARITY_MAX_DELTA', '0.001'))
+
+# Comma-separated sequence lengths whose models are loaded when the app starts (e.g. "20,60")
+MODEL_PRELOAD_SEQUENCE_LENGTHS = [
+    int(s) for s in os.environ.get('MODEL_PRELOAD_SEQUENCE_LENGTHS', '').split(',') if s.strip()
+]
+
+# Load the app in the gunicorn master and import the ML libraries of the served runtime (and the
+# MODEL_PRELOAD_SEQUENCE_LENGTHS models) there before forking, so workers share them copy-on-write.
+# Read by gunicorn.conf.py; see ml_app/ml_stack.py
+ML_WARMUP = os.environ.get('ML_WARMUP', 'False') == 'True'
+
+#for extra logging in production environment
+if DEBUG == False:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {
+                'class': 'logging.StreamHandler',
+            },
+        'file': {
+            'level': 'DEBUG',
+            'class': 'logging.FileHandler',
+            'filename': 'log.django',
+        },
+        },
+        'loggers': {
+            'django': {
+                'handlers': ['console','file'],
+                'level': os.getenv('DJANGO_LOG_LEVEL', 'DEBUG'),
+            },
+        },
+    }
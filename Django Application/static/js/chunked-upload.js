@@ -0,0 +1,82 @@
+// Upload the selected video in chunks (POST /upload/, then PUT each chunk) so a
+// dropped connection resumes where it stopped instead of starting over.
+// Falls back to the plain multipart form post when Blob.slice isn't available.
+$(function () {
+    var $form = $('#video-upload');
+    var createUrl = $form.data('upload-url');
+    if (!createUrl || !window.Blob || !Blob.prototype.slice) {
+        return;
+    }
+    var csrfToken = $form.find('input[name=csrfmiddlewaretoken]').val();
+    var MAX_RETRIES = 5;
+
+    function showError(message) {
+        $('#upload-error').text(message).show();
+        $('#videoUpload').prop('disabled', false).html('<i class="fas fa-magic me-2"></i>Analyze Video');
+    }
+
+    function errorMessage(xhr) {
+        return (xhr.responseJSON && xhr.responseJSON.error) || 'Upload failed, please try again.';
+    }
+
+    function sendChunks(file, upload, offset, retries) {
+        if (offset >= file.size) {
+            return;
+        }
+        var end = Math.min(offset + upload.chunk_size, file.size);
+        $.ajax({
+            url: upload.url,
+            type: 'PUT',
+            data: file.slice(offset, end),
+            processData: false,
+            contentType: 'application/octet-stream',
+            headers: {'X-CSRFToken': csrfToken, 'Upload-Offset': offset}
+        }).done(function (data) {
+            $('#upload-progress').text(Math.floor(100 * data.offset / file.size) + '%');
+            if (data.complete) {
+                window.location = data.redirect;
+            } else {
+                sendChunks(file, upload, data.offset, MAX_RETRIES);
+            }
+        }).fail(function (xhr) {
+            if (xhr.status >= 400 && xhr.status < 500 && xhr.status !== 409) {
+                showError(errorMessage(xhr));
+            } else if (retries > 0) {
+                // Ask the server how much arrived and resume from there
+                setTimeout(function () {
+                    $.getJSON(upload.url).done(function (state) {
+                        sendChunks(file, upload, state.offset, retries - 1);
+                    }).fail(function () {
+                        sendChunks(file, upload, offset, retries - 1);
+                    });
+                }, 1000 * (MAX_RETRIES - retries + 1));
+            } else {
+                showError(errorMessage(xhr));
+            }
+        });
+    }
+
+    $form.on('submit', function (e) {
+        var file = $('#id_upload_video_file')[0].files[0];
+        if (!file) {
+            return;
+        }
+        e.preventDefault();
+        $('#upload-error').hide();
+        $.ajax({
+            url: createUrl,
+            type: 'POST',
+            data: {
+                csrfmiddlewaretoken: csrfToken,
+                filename: file.name,
+                size: file.size,
+                sequence_length: $('#id_sequence_length').val()
+            }
+        }).done(function (upload) {
+            $('#videoUpload').append(' <span id="upload-progress">0%</span>');
+            sendChunks(file, upload, 0, MAX_RETRIES);
+        }).fail(function (xhr) {
+            showError(errorMessage(xhr));
+        });
+    });
+});
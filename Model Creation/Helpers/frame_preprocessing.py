@@ -0,0 +1,82 @@
+"""
+Batched frame preprocessing for the notebook's `video_dataset`.
+
+`ToPILImage -> Resize -> ToTensor -> Normalize` converts every frame to a PIL
+image and back and allocates several tensors per frame, and `torch.stack`
+copies the whole sequence once more. `FramePreprocessor` resizes the frames
+with cv2 straight into a preallocated `(n, 112, 112, 3)` uint8 buffer, then
+scales and normalises the whole sequence in one multiply-add per channel:
+
+    x * (1 / (255 * std)) + (-mean / std)
+
+which is ToTensor's scaling and Normalize folded together. The permute of the
+buffer to `(n, 3, H, W)` is a view read by that op, so the output tensor is
+the only allocation per item.
+
+The frames keep cv2's BGR order, as the transform chain never converted them,
+so a model keeps seeing the inputs it was trained on; `swap_rb=True` converts
+to RGB. Resizing uses INTER_AREA when shrinking and INTER_LINEAR when
+enlarging: close to, but not bit-identical with, PIL's bilinear Resize. This
+is the same preprocessing as ml_app/preprocessing.py in the web app.
+
+    from frame_preprocessing import FramePreprocessor
+    preprocess = FramePreprocessor(sequence_length = 10)
+    frames = preprocess(list_of_bgr_frames)    # (10, 3, 112, 112) float32
+"""
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+IM_SIZE = 112
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+def resize_into(frame, dst):
+    """Resize a frame (H, W, 3) uint8 into `dst` (size, size, 3) without allocating."""
+    size = dst.shape[0]
+    height, width = frame.shape[:2]
+    if (height, width) == (size, size):
+        np.copyto(dst, frame)
+        return dst
+    shrinking = height > size or width > size
+    cv2.resize(frame, (size, size), dst=dst, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+    return dst
+
+
+class FramePreprocessor:
+    """
+    Maps a list of uint8 frames to a normalised float32 `(n, 3, size, size)`
+    tensor. Keeps its resize buffer between calls; each DataLoader worker gets
+    its own copy of the dataset, so one instance per dataset is enough.
+    """
+
+    def __init__(self, sequence_length=60, size=IM_SIZE, mean=MEAN, std=STD, swap_rb=False):
+        if torch is None:
+            raise ImportError("FramePreprocessor needs torch")
+        self.size = size
+        self.swap_rb = swap_rb
+        self._buffer = np.empty((max(1, sequence_length), size, size, 3), dtype=np.uint8)
+        self._scale = torch.tensor([1.0 / (255.0 * s) for s in std], dtype=torch.float32).view(3, 1, 1)
+        self._shift = torch.tensor([-m / s for m, s in zip(mean, std)], dtype=torch.float32).view(3, 1, 1)
+
+    def __call__(self, frames):
+        if not len(frames):
+            raise ValueError("No frames to preprocess")
+        if len(frames) > len(self._buffer):
+            self._buffer = np.empty((len(frames), self.size, self.size, 3), dtype=np.uint8)
+        pixels = self._buffer[:len(frames)]
+        for frame, dst in zip(frames, pixels):
+            resize_into(frame, dst)
+        chw = torch.from_numpy(pixels).permute(0, 3, 1, 2)
+        if self.swap_rb:
+            chw = chw.flip(1)
+        # The output is a new tensor, so items handed to the DataLoader never share the buffer
+        out = torch.empty((len(frames), 3, self.size, self.size), dtype=torch.float32)
+        return torch.addcmul(self._shift, chw, self._scale, out=out)
@@ -0,0 +1,238 @@
+"""
+Merge label sources into one deduplicated label store.
+
+label_json_to_csv.py converts each DFDC `metadata.json` with three pandas
+round trips, and the training notebook then scans the resulting DataFrame for
+every sample. This tool reads any number of sources in a single pass:
+
+* DFDC `metadata.json` files: `{"abc.mp4": {"label": "FAKE", ...}, ...}`
+* label CSVs: `file,label` rows like labels/Gobal_metadata.csv, or the
+  `URI,label,original,split` CSVs written by label_json_to_csv.py
+
+and writes:
+
+    <out>.csv          file,label rows (no header), in the order first seen
+    <out>.csv.idx      open-addressing hash table of file name -> label
+    <out>.conflicts.csv  names given different labels by different sources
+
+When sources disagree, the first source wins by default (`--on-conflict`).
+`open_labels` memory-maps the index, so a lookup costs one or two probes
+however many labels there are, and a DataLoader worker doesn't have to parse
+the CSV. Labels are 0 for FAKE and 1 for REAL, as in the training code.
+
+    python label_store.py --out ../labels/Gobal_metadata.csv ../labels/Gobal_metadata.csv dfdc_train_part_*/metadata.json
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+
+LABEL_VALUES = {"FAKE": 0, "REAL": 1}
+LABEL_NAMES = {value: name for name, value in LABEL_VALUES.items()}
+
+_MAGIC = b"LBLIDX01"
+# magic, slot count, label count
+_HEADER = np.dtype([("magic", "S8"), ("capacity", "<u8"), ("count", "<u8")])
+_SLOT = np.dtype([("key", "<u8"), ("label", "u1")])
+
+
+def _key(name):
+    """64-bit hash of a file name; 0 marks an empty slot so it's never used as a key."""
+    key = int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+    return key or 1
+
+
+def iter_source(path):
+    """Yield `(file name, label value)` from a metadata.json or a label CSV."""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        for name, info in metadata.items():
+            label = str(info.get("label", "")).strip().upper()
+            if label in LABEL_VALUES:
+                yield os.path.basename(name), LABEL_VALUES[label]
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.reader(f)
+        label_column = 1
+        for row in rows:
+            if len(row) <= label_column:
+                continue
+            label = row[label_column].strip().upper()
+            if label not in LABEL_VALUES:
+                # A header row tells which column holds the label
+                if "label" in row:
+                    label_column = row.index("label")
+                continue
+            yield os.path.basename(row[0].strip()), LABEL_VALUES[label]
+
+
+def ingest(sources, on_conflict="first"):
+    """
+    Merge the sources into `(labels, conflicts)`: an ordered dict of file
+    name -> label value and a list of `(name, [(source, label), ...])` for
+    names that got different labels. `on_conflict` is "first", "last" or
+    "drop" (leave conflicting names out).
+    """
+    labels, origin, conflicts = {}, {}, {}
+    for source in sources:
+        for name, label in iter_source(source):
+            if name not in labels:
+                labels[name] = label
+                origin[name] = source
+                continue
+            if labels[name] == label:
+                continue
+            conflicts.setdefault(name, [(origin[name], labels[name])]).append((source, label))
+            if on_conflict == "last":
+                labels[name] = label
+                origin[name] = source
+    if on_conflict == "drop":
+        for name in conflicts:
+            del labels[name]
+    return labels, [(name, seen) for name, seen in conflicts.items()]
+
+
+def write_index(labels, path):
+    """Write the hash table of `labels` with a load factor of at most 1/2."""
+    capacity = 1 << max(4, (2 * len(labels) - 1).bit_length())
+    mask = capacity - 1
+    slots = np.zeros(capacity, dtype=_SLOT)
+    keys = slots["key"]
+    for name, label in labels.items():
+        key = _key(name)
+        slot = key & mask
+        while keys[slot]:
+            if keys[slot] == key:
+                raise ValueError(f"Hash collision for {name!r}; rename the file or extend the key")
+            slot = (slot + 1) & mask
+        keys[slot] = key
+        slots["label"][slot] = label
+
+    header = np.array([(_MAGIC, capacity, len(labels))], dtype=_HEADER)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(slots.tobytes())
+    os.replace(tmp_path, path)
+
+
+def write_store(labels, csv_path, conflicts=()):
+    """Write the label CSV, its index and (if any) the conflict report; returns the report path or None."""
+    os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for name, label in labels.items():
+            writer.writerow((name, LABEL_NAMES[label]))
+    os.replace(tmp_path, csv_path)
+    write_index(labels, csv_path + ".idx")
+
+    report_path = os.path.splitext(csv_path)[0] + ".conflicts.csv"
+    if not conflicts:
+        if os.path.exists(report_path):
+            os.remove(report_path)
+        return None
+    with open(report_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(("file", "source", "label"))
+        for name, seen in conflicts:
+            for source, label in seen:
+                writer.writerow((name, source, LABEL_NAMES[label]))
+    return report_path
+
+
+class LabelIndex:
+    """Read-only, memory-mapped file name -> label lookup (0 = FAKE, 1 = REAL)."""
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=_HEADER, count=1)
+        if not len(header) or header["magic"][0] != _MAGIC:
+            raise ValueError(f"{path} is not a label index")
+        self._count = int(header["count"][0])
+        capacity = int(header["capacity"][0])
+        self._mask = capacity - 1
+        slots = np.memmap(path, dtype=_SLOT, mode="r", offset=_HEADER.itemsize, shape=(capacity,))
+        self._keys = slots["key"]
+        self._labels = slots["label"]
+
+    def get(self, name, default=None):
+        key = _key(os.path.basename(name))
+        slot = key & self._mask
+        while True:
+            found = int(self._keys[slot])
+            if found == key:
+                return int(self._labels[slot])
+            if not found:
+                return default
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, name):
+        label = self.get(name)
+        if label is None:
+            raise KeyError(name)
+        return label
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __reduce__(self):
+        # DataLoader workers reopen the map instead of receiving a copy of it
+        return LabelIndex, (self.path,)
+
+
+def read_labels(csv_path):
+    """The label CSV as an ordered dict of file name -> label value."""
+    return dict(iter_source(csv_path))
+
+
+def open_labels(csv_path):
+    """
+    Constant-time label lookup for a label CSV: the memory-mapped index if it
+    is up to date, otherwise it is (re)built from the CSV first.
+    """
+    index_path = csv_path + ".idx"
+    try:
+        current = os.path.getmtime(index_path) >= os.path.getmtime(csv_path)
+    except OSError:
+        current = False
+    if not current:
+        write_index(read_labels(csv_path), index_path)
+    return LabelIndex(index_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge metadata.json files and label CSVs into one label store.")
+    parser.add_argument("sources", nargs="+", help="metadata.json files, label CSVs or glob patterns")
+    parser.add_argument("--out", required=True, help="label CSV to write (the index goes next to it)")
+    parser.add_argument("--on-conflict", choices=("first", "last", "drop"), default="first",
+                        help="which label to keep when sources disagree")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for pattern in args.sources:
+        sources.extend(sorted(glob.glob(pattern)) or [pattern])
+    labels, conflicts = ingest(list(dict.fromkeys(sources)), args.on_conflict)
+    report_path = write_store(labels, args.out, conflicts)
+
+    counts = np.bincount(np.fromiter(labels.values(), dtype=np.uint8, count=len(labels)), minlength=2)
+    print(f"{len(labels)} labels from {len(sources)} sources: {counts[1]} REAL, {counts[0]} FAKE -> {args.out}")
+    if report_path:
+        print(f"{len(conflicts)} names have conflicting labels ({args.on_conflict} kept), see {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Probe videos for their metadata in parallel, with a cache.
+
+The notebooks open every video with cv2 to read its frame count, and decode
+20 frames of each one through the transforms to find corrupted files. They
+do this on every run, over tens of thousands of videos. This tool collects,
+per video:
+
+    frames, fps, width, height, codec, duration   container metadata
+    decoded, ok, error                            decode health: the first
+                                                  `check_frames` frames must decode
+
+The probes run in a process pool. Results are stored in a SQLite table keyed
+by path and checked against the file's mtime and size, so a re-run only
+probes new or changed files. `filter_videos` applies the frame-count
+thresholds and returns a new list, instead of removing items from the list
+being iterated.
+
+    python probe_videos.py --min-frames 150 --list-out usable.txt "Real videos/*.mp4"
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+
+DEFAULT_CACHE = "video_probe.sqlite3"
+CHECK_FRAMES = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    check_frames INTEGER NOT NULL,
+    frames INTEGER,
+    fps REAL,
+    width INTEGER,
+    height INTEGER,
+    codec TEXT,
+    duration REAL,
+    decoded INTEGER,
+    ok INTEGER NOT NULL,
+    error TEXT,
+    probed_at REAL NOT NULL
+)
+"""
+_COLUMNS = ("path", "mtime_ns", "size", "check_frames", "frames", "fps", "width", "height",
+            "codec", "duration", "decoded", "ok", "error", "probed_at")
+
+
+def _init_worker():
+    # One process per core already; extra OpenCV threads only oversubscribe the CPU
+    cv2.setNumThreads(1)
+
+
+def _fourcc(value):
+    value = int(value)
+    chars = "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+    return chars if value and chars.isprintable() else None
+
+
+def probe(task):
+    """Worker: probe one video. `task` is `(path, mtime_ns, size, check_frames)`."""
+    path, mtime_ns, size, check_frames = task
+    record = dict.fromkeys(_COLUMNS)
+    record.update(path=path, mtime_ns=mtime_ns, size=size, check_frames=check_frames,
+                  decoded=0, ok=0, probed_at=time.time())
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            record["error"] = "cannot open video"
+            return record
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        record.update(
+            frames=frames,
+            fps=fps,
+            width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            codec=_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+            duration=frames / fps if fps > 0 else None,
+        )
+        # grab() demuxes and decodes without converting the frame, which is all the health check needs
+        wanted = min(check_frames, frames) if frames > 0 else check_frames
+        while record["decoded"] < wanted and cap.grab():
+            record["decoded"] += 1
+        if frames <= 0:
+            record["error"] = "no frame count in container"
+        elif record["decoded"] < wanted:
+            record["error"] = f"only {record['decoded']} of the first {wanted} frames decode"
+        else:
+            record["ok"] = 1
+    except Exception as e:
+        record["error"] = f"{e.__class__.__name__}: {e}"
+    finally:
+        cap.release()
+    return record
+
+
+def _connect(cache_path):
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def probe_all(paths, cache_path=DEFAULT_CACHE, workers=None, check_frames=CHECK_FRAMES, verbose=True):
+    """
+    Return a dict of path -> probe record for `paths`. Cached records are used
+    when the file's mtime and size are unchanged and it was checked with at
+    least as many frames; the rest are probed in `workers` processes.
+    """
+    paths = list(dict.fromkeys(paths))
+    conn = _connect(cache_path)
+    records, tasks = {}, []
+    try:
+        cached = {}
+        # Looked up in chunks to stay below SQLite's limit on query parameters
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            query = f"SELECT * FROM probes WHERE path IN ({','.join('?' * len(chunk))})"
+            cached.update((row["path"], dict(row)) for row in conn.execute(query, chunk))
+
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                records[path] = dict(dict.fromkeys(_COLUMNS), path=path, ok=0, error="missing")
+                continue
+            record = cached.get(path)
+            if (record and record["mtime_ns"] == st.st_mtime_ns and record["size"] == st.st_size
+                    and record["check_frames"] >= check_frames):
+                records[path] = record
+            else:
+                tasks.append((path, st.st_mtime_ns, st.st_size, check_frames))
+
+        if verbose:
+            missing = sum(1 for record in records.values() if record["error"] == "missing")
+            print(f"{len(paths)} videos: {len(records) - missing} from the probe cache, {len(tasks)} to probe"
+                  + (f", {missing} missing" if missing else ""))
+        if tasks:
+            started = time.perf_counter()
+            insert = f"INSERT OR REPLACE INTO probes ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+            with Pool(workers or os.cpu_count(), initializer=_init_worker) as pool:
+                for i, record in enumerate(pool.imap_unordered(probe, tasks, chunksize=8), 1):
+                    records[record["path"]] = record
+                    conn.execute(insert, [record[column] for column in _COLUMNS])
+                    if i % 500 == 0:
+                        conn.commit()
+                        if verbose:
+                            print(f"probed {i}/{len(tasks)} ({time.perf_counter() - started:.0f}s)")
+            conn.commit()
+            if verbose:
+                print(f"Probed {len(tasks)} videos in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+    return records
+
+
+def filter_videos(paths, records, min_frames=0, max_frames=None, require_ok=True):
+    """The paths whose frame count is within the thresholds (and that decode, with `require_ok`)."""
+    selected = []
+    for path in paths:
+        record = records.get(path)
+        if record is None or (require_ok and not record["ok"]):
+            continue
+        frames = record["frames"] or 0
+        if frames < min_frames or (max_frames is not None and frames > max_frames):
+            continue
+        selected.append(path)
+    return selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe videos for frame count, fps, resolution, codec and decode health.")
+    parser.add_argument("videos", nargs="+", help="video files or glob patterns")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="SQLite probe cache")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--check-frames", type=int, default=CHECK_FRAMES,
+                        help="leading frames that must decode for a video to count as healthy")
+    parser.add_argument("--min-frames", type=int, default=0)
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--list-out", help="write the selected paths to this file, one per line")
+    parser.add_argument("--show-bad", action="store_true", help="list the videos that failed the health check")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.videos:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    paths = list(dict.fromkeys(paths))
+    started = time.perf_counter()
+    records = probe_all(paths, args.cache, args.workers, args.check_frames)
+    selected = filter_videos(paths, records, args.min_frames, args.max_frames)
+
+    bad = [records[p] for p in paths if not records[p]["ok"]]
+    frame_counts = np.array([records[p]["frames"] for p in selected], dtype=np.int64)
+    print(f"{len(selected)} of {len(paths)} videos selected, {len(bad)} failed the health check "
+          f"({time.perf_counter() - started:.1f}s)")
+    if len(frame_counts):
+        print(f"Frames per selected video: mean {frame_counts.mean():.1f}, "
+              f"min {frame_counts.min()}, max {frame_counts.max()}")
+    if args.show_bad:
+        for record in bad:
+            print(f"  {record['path']}: {record['error']}")
+    if args.list_out:
+        with open(args.list_out, "w", encoding="utf-8") as f:
+            f.writelines(path + "\n" for path in selected)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
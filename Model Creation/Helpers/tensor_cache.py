@@ -0,0 +1,242 @@
+"""
+Precomputed frame cache for training on the face-only clips.
+
+`video_dataset` in Model_and_train_csv.ipynb decodes every MJPG clip and runs
+`ToPILImage -> Resize -> ToTensor -> Normalize` on each frame again in every
+epoch, and finds each label with a scan of the label DataFrame. Here the clips
+are decoded once into 112x112 uint8 frames, appended to binary shard files:
+
+    <cache_dir>/shard_00000.u8     frames, (n, 112, 112, 3) uint8, row after row
+    <cache_dir>/index.json         per video: file, label, shard, start, frames
+
+`CachedVideoDataset` memory-maps the shards. An item is a slice of the map, so
+nothing is decoded and the OS page cache keeps hot shards in memory. Labels
+come from the label store (label_store.py) and are kept in the index.
+Normalisation is one vectorised op on the whole sequence, or on the whole
+batch on the GPU with `normalize_on_device=True`.
+
+Frames keep the channel order of cv2 (BGR), as the notebook transform never
+converts them, so a model trained from the cache sees the same inputs. The
+clips written by create_face_videos.py are already 112x112 and stored as
+decoded; other sizes are resized with cv2 (INTER_AREA), which is close to but
+not bit-identical with PIL's bilinear Resize.
+
+    python tensor_cache.py --labels ../labels/Gobal_metadata.csv --out-dir face_cache/ "face_only/*.mp4"
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from label_store import open_labels
+
+try:
+    import torch
+    from torch.utils.data.dataset import Dataset
+except ImportError:
+    torch = None
+    Dataset = object
+
+
+INDEX_NAME = "index.json"
+FORMAT_VERSION = 1
+IM_SIZE = 112
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+def _read_frames(path, max_frames, size):
+    """The first `max_frames` frames of a clip as a `(n, size, size, 3)` uint8 array."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            if frame.shape[:2] != (size, size):
+                frame = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+            frames.append(frame)
+    finally:
+        cap.release()
+    if not frames:
+        return np.empty((0, size, size, 3), dtype=np.uint8)
+    return np.stack(frames)
+
+
+def build_cache(video_paths, labels, out_dir, max_frames=100, min_frames=1,
+                shard_bytes=1024 ** 3, size=IM_SIZE):
+    """
+    Decode `video_paths` into the cache in `out_dir` and write its index.
+    `labels` maps file names to 0 (FAKE) / 1 (REAL), e.g. `open_labels` of
+    the label CSV, whose path can also be given directly.
+    Videos with no label or fewer than `min_frames` readable frames are
+    left out and listed under "skipped" in the index. Returns the index.
+    """
+    if isinstance(labels, str):
+        labels = open_labels(labels)
+    os.makedirs(out_dir, exist_ok=True)
+    frame_bytes = size * size * 3
+
+    videos, skipped, shards = [], [], []
+    shard, shard_frames = None, 0
+    started = time.perf_counter()
+    try:
+        for i, path in enumerate(video_paths, 1):
+            name = os.path.basename(path)
+            if name not in labels:
+                skipped.append({"file": path, "reason": "no label"})
+                continue
+            frames = _read_frames(path, max_frames, size)
+            if len(frames) < max(1, min_frames):
+                skipped.append({"file": path, "reason": f"{len(frames)} readable frames"})
+                continue
+
+            if shard is None or (shard_frames + len(frames)) * frame_bytes > shard_bytes:
+                if shard is not None:
+                    shard.close()
+                    shards.append({"name": shard_name, "frames": shard_frames})
+                shard_name = f"shard_{len(shards):05d}.u8"
+                shard = open(os.path.join(out_dir, shard_name + ".tmp"), "wb")
+                shard_frames = 0
+            shard.write(np.ascontiguousarray(frames).tobytes())
+            videos.append({"file": name, "path": path, "label": labels[name],
+                           "shard": len(shards), "start": shard_frames, "frames": len(frames)})
+            shard_frames += len(frames)
+            if i % 100 == 0:
+                print(f"{i}/{len(video_paths)} videos cached ({time.perf_counter() - started:.0f}s)")
+    finally:
+        if shard is not None:
+            shard.close()
+    if shard is not None:
+        shards.append({"name": shard_name, "frames": shard_frames})
+
+    for entry in shards:
+        path = os.path.join(out_dir, entry["name"])
+        os.replace(path + ".tmp", path)
+    index = {
+        "version": FORMAT_VERSION,
+        "size": size,
+        "channels": "BGR",
+        "max_frames": max_frames,
+        "shards": shards,
+        "videos": videos,
+        "skipped": skipped,
+    }
+    # The index is written last, so a cache with an index is always complete
+    tmp_path = os.path.join(out_dir, INDEX_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(out_dir, INDEX_NAME))
+    return index
+
+
+def load_index(cache_dir):
+    with open(os.path.join(cache_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported tensor cache version {index.get('version')} in {cache_dir}")
+    return index
+
+
+def normalize(frames, mean=MEAN, std=STD):
+    """
+    uint8 frames `(..., 3, H, W)` -> normalised float32 tensor, the same values
+    as `ToTensor()` followed by `Normalize(mean, std)`. Works on a sequence or
+    a whole batch, on any device.
+    """
+    shape = (3, 1, 1)
+    mean = torch.tensor(mean, dtype=torch.float32, device=frames.device).view(shape)
+    std = torch.tensor(std, dtype=torch.float32, device=frames.device).view(shape)
+    return (frames.float().div_(255) - mean).div_(std)
+
+
+class CachedVideoDataset(Dataset):
+    """
+    Drop-in for the notebook's `video_dataset`: returns `(frames, label)` with
+    frames `(sequence_length, 3, 112, 112)`. `videos` selects and orders the
+    clips (paths or file names, e.g. a train/validation split); by default
+    every cached video is used. With `normalize_on_device=True` the frames
+    are returned as uint8, to be normalised per batch with `normalize`
+    after moving them to the GPU.
+    """
+
+    def __init__(self, cache_dir, videos=None, sequence_length=60, mean=MEAN, std=STD,
+                 normalize_on_device=False):
+        if torch is None:
+            raise ImportError("CachedVideoDataset needs torch")
+        self.cache_dir = cache_dir
+        self.index = load_index(cache_dir)
+        self.count = sequence_length
+        self.mean, self.std = mean, std
+        self.normalize_on_device = normalize_on_device
+
+        by_name = {entry["file"]: entry for entry in self.index["videos"]}
+        if videos is None:
+            self.entries = list(self.index["videos"])
+        else:
+            names = [os.path.basename(v) for v in videos]
+            missing = [n for n in names if n not in by_name]
+            if missing:
+                print(f"{len(missing)} videos are not in the cache and are left out, e.g. {missing[:3]}")
+            self.entries = [by_name[n] for n in names if n in by_name]
+        self.labels = {entry["file"]: entry["label"] for entry in self.entries}
+        # Opened lazily so DataLoader workers map the shards themselves instead of pickling them
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _shard(self, number):
+        shard = self._shards.get(number)
+        if shard is None:
+            info = self.index["shards"][number]
+            size = self.index["size"]
+            shard = np.memmap(os.path.join(self.cache_dir, info["name"]), dtype=np.uint8, mode="r",
+                              shape=(info["frames"], size, size, 3))
+            self._shards[number] = shard
+        return shard
+
+    def __getitem__(self, idx):
+        entry = self.entries[idx]
+        start = entry["start"]
+        frames = self._shard(entry["shard"])[start:start + min(entry["frames"], self.count)]
+        # (T, H, W, C) -> (T, C, H, W); the copy detaches the item from the map
+        frames = torch.from_numpy(np.ascontiguousarray(frames.transpose(0, 3, 1, 2)))
+        if not self.normalize_on_device:
+            frames = normalize(frames, self.mean, self.std)
+        return frames, entry["label"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped frame cache of face-only clips.")
+    parser.add_argument("videos", nargs="+", help="face-only clips or glob patterns")
+    parser.add_argument("--labels", required=True, help="label CSV (file,label rows)")
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--max-frames", type=int, default=100, help="frames stored per video")
+    parser.add_argument("--min-frames", type=int, default=1, help="leave out videos with fewer readable frames")
+    parser.add_argument("--shard-mb", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.videos:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    started = time.perf_counter()
+    index = build_cache(list(dict.fromkeys(paths)), args.labels, args.out_dir, args.max_frames,
+                        args.min_frames, args.shard_mb * 1024 * 1024)
+    frames = sum(entry["frames"] for entry in index["shards"])
+    print(f"Cached {len(index['videos'])} videos ({frames} frames, {len(index['shards'])} shards) "
+          f"in {time.perf_counter() - started:.1f}s; {len(index['skipped'])} skipped")
+    for entry in index["skipped"]:
+        print(f"  skipped {entry['file']}: {entry['reason']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())